@@ -58,6 +58,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'store.context_processors.cart_processor', # We will create this
                 'store.context_processors.categories_processor',
+                'store.context_processors.catalog_cache_processor',
             ],
         },
     },
@@ -72,6 +73,34 @@ DATABASES = {
     }
 }
 
+# --- الكاش ---
+# افتراضياً ذاكرة محلية لكل عملية، وعند ضبط CACHE_DIR يُستخدم كاش ملفات مشترك بين كل عمّال WSGI
+# (رقم نسخة الكتالوج نفسه في قاعدة البيانات، فالمقاطع القديمة لا تُستخدم في أي عامل بعد التعديل)
+CACHE_DIR = os.environ.get('CACHE_DIR')
+if CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ishtar-store',
+        }
+    }
+
+# مدة بقاء مقاطع الكتالوج المخزنة (بالثواني) - الإبطال الفعلي يتم برقم النسخة
+CATALOG_CACHE_TIMEOUT = 60 * 15
+
+# عدد المنتجات في كل صفحة من صفحات المتجر والعروض
+PRODUCTS_PER_PAGE = 24
+
+# عدد التقييمات المعروضة في كل صفحة من تفاصيل المنتج
+REVIEWS_PER_PAGE = 10
+
 LANGUAGE_CODE = 'ar' # Set default language to Arabic
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -85,6 +114,26 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# ملفات التقارير المجهزة في الخلفية (خارج media حتى لا تكون متاحة للعامة)
+REPORTS_ROOT = BASE_DIR / 'reports'
+
+# عدد العمليات التي تولّد نسخ الصور المرفوعة في الخلفية (0 = التوليد داخل الطلب نفسه)
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', os.cpu_count() or 1))
+# صورة بدون نسخ مرفوعة منذ أقل من هذه المدة (بالثواني) تُعرض كصورة مؤقتة حتى يكتمل التوليد؛
+# بعدها تُعرض الصورة الأصلية (توليد فشل أو صور قديمة لم يمر عليها build_image_variants)
+IMAGE_PENDING_SECONDS = 60
+
+# --- تصغير الصور عند الطلب (store/resize.py) ---
+# المقاسات المسموحة فقط (العرض، الارتفاع): أي مقاس آخر يُرفض حتى لا يُستغل الرابط لإشغال المعالج
+RESIZE_SIZES = [
+    (96, 96), (200, 200), (400, 400), (800, 800),  # مصغرات وبطاقات وأقسام
+    (1200, 500),  # السلايدر
+    (1200, 630),  # معاينة الروابط في مواقع التواصل
+]
+# الصور المصغرة تُحفظ هنا، وعند تجاوز الحد يُحذف الأقدم استخداماً
+RESIZE_CACHE_DIR = os.environ.get('RESIZE_CACHE_DIR', BASE_DIR / 'media_cache')
+RESIZE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
@@ -109,4 +158,14 @@ DECIMAL_SEPARATOR = '.'
 AUTHENTICATION_BACKENDS = [
     'store.backends.EmailOrUsernameBackend',  # الخلفية المخصصة التي أنشأناها
     'django.contrib.auth.backends.ModelBackend',  # الخلفية الافتراضية (احتياط)
-]
\ No newline at end of file
+]
+
+# --- إشعارات تلجرام (تُرسل من طابور الإشعارات عبر: python manage.py send_notifications) ---
+TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '7846123604:AAG3hHxQMp8be71opByo6v5rKNiAqdsL7Us')
+TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID', '6656634781')
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+# حدود تلجرام: رسالة واحدة في الثانية لنفس المحادثة تقريباً، و30 رسالة في الثانية للبوت كله
+TELEGRAM_CHAT_INTERVAL = 1.0
+TELEGRAM_GLOBAL_INTERVAL = 1 / 30
+# عدد محاولات الإرسال قبل اعتبار الإشعار فاشلاً (مع تأخير متزايد بين المحاولات)
+NOTIFICATION_MAX_ATTEMPTS = 8
@@ -0,0 +1,269 @@
+import csv
+import io
+import os
+from decimal import Decimal, InvalidOperation
+
+import openpyxl
+import xlsxwriter
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_unicode_slug
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from store.catalog_cache import bump_catalog_version
+from store.models import Category, Product
+from store.search import rebuild_index
+
+# --- استيراد وتصدير المنتجات جماعياً (CSV / XLSX) ---
+# الملف يُقرأ سطراً سطراً، والأسطر تُعالج على دفعات: استعلام واحد لجلب المنتجات الموجودة
+# بالـ slug، ثم bulk_create للجديد و bulk_update لما تغير فقط، والأقسام من قاموس في الذاكرة.
+# كل دفعة في معاملة مستقلة: ملف بمئات آلاف الأسطر لا يحجز قاعدة البيانات حتى نهايته، ودفعة فاشلة
+# لا تلغي ما قبلها (تُعاد سطراً سطراً لمعرفة الأسطر التي فشلت وتسجيلها في التقرير)
+COLUMNS = [
+    'slug', 'name', 'category', 'description', 'price', 'discount_percentage',
+    'stock_quantity', 'is_active', 'is_featured', 'main_image',
+]
+# أعمدة الملف -> حقول المنتج (القسم يُكتب في الملف بالـ slug)
+FIELDS = {column: 'category_id' if column == 'category' else column for column in COLUMNS if column != 'slug'}
+REQUIRED_FOR_NEW = ('name', 'category', 'price')
+BATCH_SIZE = 1000
+MAX_DIFF_LINES = 200
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'نعم'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'لا', ''}
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = self.updated = self.unchanged = 0
+        self.errors = []  # (رقم السطر، الرسالة)
+        self.diff = []    # أول MAX_DIFF_LINES تغيير للعرض في وضع المعاينة
+        self.rows = 0
+        self.seconds = 0.0
+
+    def note(self, line):
+        if len(self.diff) < MAX_DIFF_LINES:
+            self.diff.append(line)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0
+
+
+# --- قراءة الملف ---
+def file_format(name):
+    return 'xlsx' if os.path.splitext(name)[1].lower() == '.xlsx' else 'csv'
+
+
+def read_rows(file, fmt):
+    """الأسطر كقواميس (اسم العمود -> النص) بدون تحميل الملف كاملاً في الذاكرة"""
+    if fmt == 'xlsx':
+        wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(cell or '').strip() for cell in next(rows, ())]
+        for values in rows:
+            yield {key: '' if value is None else str(value).strip() for key, value in zip(header, values)}
+        wb.close()
+    else:
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        for row in csv.DictReader(text):
+            yield {key.strip(): (value or '').strip() for key, value in row.items() if key}
+
+
+# --- التحقق من السطر ---
+def parse_bool(value):
+    value = value.lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"قيمة غير صحيحة (نعم/لا): {value}")
+
+
+def parse_int(value, low=0, high=None):
+    number = int(Decimal(value))
+    if number < low or (high is not None and number > high):
+        raise ValueError(f"رقم خارج الحدود: {value}")
+    return number
+
+
+def parse_price(value):
+    price = Decimal(value).quantize(Decimal('0.01'))
+    if price < 0 or price >= 10 ** 8:
+        raise ValueError(f"سعر غير صحيح: {value}")
+    return price
+
+
+PARSERS = {
+    'name': lambda value: value[:200],
+    'description': str,
+    'price': parse_price,
+    'discount_percentage': lambda value: parse_int(value, 0, 100),
+    'stock_quantity': parse_int,
+    'is_active': parse_bool,
+    'is_featured': parse_bool,
+    'main_image': str,
+}
+
+
+def clean_row(row, categories):
+    """قيم حقول المنتج الموجودة في السطر فقط (الأعمدة غير الموجودة في الملف لا تتغير)"""
+    slug = row.get('slug', '')
+    validate_unicode_slug(slug)
+    values = {}
+    for column, parse in PARSERS.items():
+        if column in row:
+            try:
+                values[column] = parse(row[column])
+            except (ValueError, InvalidOperation):
+                raise ValidationError(f"{column}: قيمة غير صحيحة '{row[column]}'")
+    if 'category' in row:
+        if row['category'] not in categories:
+            raise ValidationError(f"قسم غير موجود: '{row['category']}'")
+        values['category_id'] = categories[row['category']]
+    if values.get('name') == '':
+        raise ValidationError("اسم المنتج فارغ")
+    return slug, values
+
+
+# --- الاستيراد ---
+def import_products(file, fmt='csv', dry_run=False):
+    """استيراد المنتجات من ملف مفتوح (ثنائي). مع dry_run لا يُحفظ شيء ويُرجع التقرير والفروقات فقط"""
+    report = ImportReport()
+    started = timezone.now()
+    categories = dict(Category.objects.values_list('slug', 'id'))
+    seen = set()
+    batch = []
+
+    try:
+        for number, row in enumerate(read_rows(file, fmt), start=2):  # السطر 1 هو العناوين
+            report.rows += 1
+            try:
+                slug, values = clean_row(row, categories)
+            except ValidationError as e:
+                report.errors.append((number, '، '.join(e.messages)))
+                continue
+            if slug in seen:
+                report.errors.append((number, f"slug مكرر في الملف: {slug}"))
+                continue
+            seen.add(slug)
+            batch.append((number, slug, values))
+            if len(batch) >= BATCH_SIZE:
+                write_batch(batch, report, dry_run)
+                batch = []
+        write_batch(batch, report, dry_run)
+    finally:
+        if not dry_run and (report.created or report.updated):
+            # الكتابة الجماعية لا ترسل إشارات الحفظ: نحدّث فهرس البحث ونسخة الكتالوج مرة واحدة
+            # (حتى لو توقف الاستيراد في منتصفه، فالدفعات السابقة محفوظة)
+            rebuild_index()
+            bump_catalog_version()
+    report.errors.sort()
+    report.seconds = (timezone.now() - started).total_seconds()
+    return report
+
+
+def write_batch(batch, report, dry_run):
+    if not batch:
+        return
+    existing = Product.objects.in_bulk([slug for _, slug, _ in batch], field_name='slug')
+    rows = []  # (رقم السطر، المنتج، الحقول المعدلة أو None للجديد)
+
+    for number, slug, values in batch:
+        product = existing.get(slug)
+        if product is None:
+            missing = [column for column in REQUIRED_FOR_NEW if FIELDS[column] not in values]
+            if missing:
+                report.errors.append((number, f"منتج جديد بدون: {', '.join(missing)}"))
+                continue
+            rows.append((number, Product(slug=slug, **values), None))
+            report.note(f"+ {slug}")
+            continue
+
+        changes = {field: value for field, value in values.items() if getattr(product, field) != value}
+        if not changes:
+            report.unchanged += 1
+            continue
+        report.note(f"~ {slug}: " + "، ".join(
+            f"{field} {getattr(product, field)} ← {value}" for field, value in changes.items()
+        ))
+        for field, value in changes.items():
+            setattr(product, field, value)
+        product.pk = None  # يُطابق بالـ slug فقط (ON CONFLICT على id لا يُعالج)
+        rows.append((number, product, set(changes)))
+
+    if dry_run:
+        count(rows, report)
+        return
+    try:
+        save_rows(rows)
+    except DatabaseError:
+        # سطر واحد يكفي لإفشال الدفعة كلها: نعيدها سطراً سطراً ونسجل الأسطر الفاشلة فقط
+        saved = []
+        for row in rows:
+            try:
+                save_rows([row])
+            except DatabaseError as e:
+                report.errors.append((row[0], f"تعذر الحفظ: {e}"))
+            else:
+                saved.append(row)
+        rows = saved
+    count(rows, report)
+
+
+def count(rows, report):
+    updated = sum(1 for _, _, changes in rows if changes is not None)
+    report.created += len(rows) - updated
+    report.updated += updated
+
+
+def save_rows(rows):
+    if not rows:
+        return
+    products = [product for _, product, _ in rows]
+    changed_fields = set().union(*(changes for _, _, changes in rows if changes is not None))
+    # جملة INSERT ... ON CONFLICT(slug) DO UPDATE واحدة للجديد والمعدل معاً (أسرع بكثير من bulk_update
+    # الذي يبني CASE WHEN لكل حقل)؛ auto_now يضبط updated_at، والبحث التقريبي يعتمد عليه لمعرفة ما تغير
+    with transaction.atomic():
+        Product.objects.bulk_create(
+            products, batch_size=BATCH_SIZE,
+            update_conflicts=bool(changed_fields), unique_fields=['slug'] if changed_fields else None,
+            update_fields=[*changed_fields, 'updated_at'] if changed_fields else None,
+        )
+
+
+# --- التصدير ---
+def export_rows():
+    """أسطر التصدير بنفس أعمدة الاستيراد (يمكن تعديل الملف وإعادة استيراده)"""
+    products = Product.objects.order_by('id').values_list(
+        'slug', 'name', 'category__slug', 'description', 'price', 'discount_percentage',
+        'stock_quantity', 'is_active', 'is_featured', 'main_image',
+    )
+    for row in products.iterator(chunk_size=BATCH_SIZE):
+        yield [int(value) if isinstance(value, bool) else value for value in row]
+
+
+class Echo:
+    # csv.writer يكتب في "ملف" يرجع السطر نفسه، فيُرسل كل سطر مباشرة في StreamingHttpResponse
+    def write(self, value):
+        return value
+
+
+def stream_csv():
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(COLUMNS)  # BOM حتى يفتح Excel الملف العربي بشكل صحيح
+    for row in export_rows():
+        yield writer.writerow(row)
+
+
+def write_csv(target):
+    for line in stream_csv():
+        target.write(line)
+
+
+def write_xlsx(target):
+    wb = xlsxwriter.Workbook(target, {'constant_memory': True})
+    ws = wb.add_worksheet("المنتجات")
+    ws.write_row(0, 0, COLUMNS)
+    for i, row in enumerate(export_rows(), start=1):
+        ws.write_row(i, 0, row)
+    wb.close()
@@ -0,0 +1,99 @@
+import xlsxwriter
+from django.db.models import Q, Sum
+from django.utils.dateparse import parse_date
+
+from store.models import Order, Product
+
+# --- تصدير التقارير إلى Excel بذاكرة ثابتة ---
+# XlsxWriter في وضع constant_memory يكتب كل سطر إلى القرص فور اكتمال السطر التالي بدلاً من الاحتفاظ
+# بكل الخلايا، والطلبات تُقرأ على دفعات بـ iterator()، فلا يكبر استهلاك الذاكرة مع عدد الأسطر
+CHUNK_SIZE = 2000
+
+ORDER_HEADERS = ['رقم الطلب', 'العميل', 'التاريخ', 'الإجمالي', 'مبلغ التوصيل', 'الخصم']
+INVENTORY_HEADERS = ['المنتج', 'القسم', 'السعر', 'الكمية المتبقية', 'الحالة']
+STOCK_HEADERS = ['المنتج', 'القسم', 'سعر الوحدة', 'الكمية الحالية', 'إجمالي المباع', 'القيمة الإجمالية', 'الحالة']
+
+
+def parse_day(value):
+    """تاريخ بصيغة YYYY-MM-DD من الرابط، أو None إذا كان فارغاً أو غير صالح"""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def completed_orders(date_from=None, date_to=None):
+    orders = Order.objects.filter(status='completed')
+    if date_from:
+        orders = orders.filter(created_at__date__gte=date_from)
+    if date_to:
+        orders = orders.filter(created_at__date__lte=date_to)
+    return orders.order_by('-created_at')
+
+
+def inventory_products():
+    """المنتجات مع مجموع الكميات المباعة في الطلبات المكتملة، الأقل مخزوناً أولاً"""
+    return Product.objects.annotate(
+        total_sold=Sum('orderitem__quantity', filter=Q(orderitem__order__status='completed'))
+    ).order_by('stock_quantity')
+
+
+def add_sheet(wb, title, headers, color):
+    ws = wb.add_worksheet(title)
+    ws.right_to_left()
+    header = wb.add_format({'bold': True, 'font_color': '#FFFFFF', 'bg_color': color, 'align': 'center'})
+    ws.write_row(0, 0, headers, header)
+    return ws
+
+
+def report_progress(progress, done, total):
+    if progress and total and done % CHUNK_SIZE == 0:
+        progress(done, total)
+
+
+def write_reports_workbook(target, date_from=None, date_to=None, progress=None):
+    """كتابة تقرير المبيعات وجرد المخزون إلى target (مسار أو ملف مفتوح). يرجع عدد الطلبات
+
+    progress دالة اختيارية تُستدعى بـ (عدد الأسطر المكتوبة، العدد الكلي) بعد كل دفعة
+    """
+    wb = xlsxwriter.Workbook(target, {'constant_memory': True})
+    orders = completed_orders(date_from, date_to)
+    total = orders.count() + Product.objects.count() if progress else 0
+
+    ws1 = add_sheet(wb, "تقرير المبيعات", ORDER_HEADERS, '#2563EB')
+    orders = orders.values_list('id', 'full_name', 'created_at', 'total_amount', 'delivery_fee', 'discount_amount')
+    row = 0
+    for order_id, full_name, created_at, amount, delivery_fee, discount in orders.iterator(chunk_size=CHUNK_SIZE):
+        row += 1
+        ws1.write_row(row, 0, [
+            order_id, full_name, created_at.strftime("%Y-%m-%d %H:%M"), amount, delivery_fee, discount,
+        ])
+        report_progress(progress, row, total)
+
+    ws2 = add_sheet(wb, "جرد المخزون", INVENTORY_HEADERS, '#198754')
+    products = Product.objects.order_by('stock_quantity').values_list(
+        'name', 'category__name', 'effective_price', 'stock_quantity',
+    )
+    for i, (name, category, price, stock) in enumerate(products.iterator(chunk_size=CHUNK_SIZE), start=1):
+        ws2.write_row(i, 0, [name, category, price, stock, "نفذت الكمية" if stock == 0 else "متوفر"])
+        report_progress(progress, row + i, total)
+
+    wb.close()
+    return row
+
+
+def write_inventory_workbook(target, progress=None):
+    """جرد المخزون التفصيلي (نفس جدول صفحة الجرد) إلى target. يرجع عدد المنتجات"""
+    wb = xlsxwriter.Workbook(target, {'constant_memory': True})
+    total = Product.objects.count() if progress else 0
+    ws = add_sheet(wb, "جرد المخزون", STOCK_HEADERS, '#1E293B')
+    products = inventory_products().values_list('name', 'category__name', 'price', 'stock_quantity', 'total_sold')
+    row = 0
+    for name, category, price, stock, sold in products.iterator(chunk_size=CHUNK_SIZE):
+        row += 1
+        status = "نفذت الكمية" if stock == 0 else "كمية قليلة" if stock < 5 else "متوفر"
+        ws.write_row(row, 0, [name, category, price, stock, sold or 0, price * stock, status])
+        report_progress(progress, row, total)
+
+    wb.close()
+    return row
@@ -2,8 +2,12 @@ from django import forms
 from store.models import Product, Category, Coupon
 from django import forms
 from django.contrib.auth.models import User, Permission
+from django.utils import timezone
 from store.models import HomeSection
 
+from .catalog_io import file_format, read_rows
+from .models import ScheduledPriceChange
+
 
 
 # 1. فورم المنتجات
@@ -145,4 +149,64 @@ class HomeSectionForm(forms.ModelForm):
             'product_count': forms.NumberInput(attrs={'class': 'form-control'}),
             'ordering': forms.NumberInput(attrs={'class': 'form-control'}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
-        }
\ No newline at end of file
+        }
+
+class BulkPriceForm(forms.ModelForm):
+    # بدون موعد بدء وانتهاء يُطبق التغيير فوراً وبشكل دائم، ومعهما يصبح عرضاً مجدولاً يُعاد بعده السعر السابق
+    slugs_file = forms.FileField(
+        required=False, label="قائمة منتجات (CSV/XLSX بعمود slug)",
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+    # قائمة الـ slug من الملف تبقى في الصفحة بعد المعاينة حتى لا يُرفع الملف مرة ثانية عند التطبيق
+    slug_list = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    class Meta:
+        model = ScheduledPriceChange
+        fields = ['name', 'field', 'mode', 'value', 'category', 'query', 'starts_at', 'ends_at']
+        widgets = {
+            'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'مثال: عروض الجمعة'}),
+            'field': forms.Select(attrs={'class': 'form-select'}),
+            'mode': forms.Select(attrs={'class': 'form-select'}),
+            'value': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'placeholder': 'مثال: -10'}),
+            'category': forms.Select(attrs={'class': 'form-select'}),
+            'query': forms.TextInput(attrs={'class': 'form-control'}),
+            'starts_at': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
+            'ends_at': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['name'].required = False
+        self.fields['starts_at'].required = False
+        self.fields['category'].empty_label = "كل الأقسام"
+
+    def clean_slugs_file(self):
+        upload = self.cleaned_data.get('slugs_file')
+        if not upload:
+            return []
+        slugs = [row.get('slug', '') for row in read_rows(upload, file_format(upload.name))]
+        if not any(slugs):
+            raise forms.ValidationError("الملف لا يحتوي على عمود slug.")
+        return [slug for slug in slugs if slug]
+
+    def clean(self):
+        cleaned = super().clean()
+        field, mode, value = cleaned.get('field'), cleaned.get('mode'), cleaned.get('value')
+        if value is not None:
+            if mode == 'percent' and value <= -100:
+                self.add_error('value', "النسبة يجب أن تكون أكبر من -100%.")
+            if field == 'discount_percentage' and mode == 'set' and not 0 <= value <= 100:
+                self.add_error('value', "نسبة الخصم بين 0 و 100.")
+            if field == 'price' and mode == 'set' and value < 0:
+                self.add_error('value', "السعر لا يمكن أن يكون سالباً.")
+        cleaned['slugs'] = cleaned.get('slugs_file') or cleaned.get('slug_list', '').split()
+        starts_at, ends_at = cleaned.get('starts_at'), cleaned.get('ends_at')
+        if ends_at and not starts_at:
+            cleaned['starts_at'] = starts_at = timezone.now()
+        if starts_at and ends_at and ends_at <= starts_at:
+            self.add_error('ends_at', "وقت الانتهاء يجب أن يكون بعد وقت البدء.")
+        return cleaned
+
+    @property
+    def is_scheduled(self):
+        return bool(self.cleaned_data.get('starts_at'))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard.pricing import run_due_changes
+
+
+class Command(BaseCommand):
+    help = "بدء وإنهاء عروض الأسعار المجدولة في وقتها (كل دقيقة من cron مع --once، أو باستمرار)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="تنفيذ المستحق الآن ثم الخروج")
+        parser.add_argument('--interval', type=float, default=30.0, help="ثواني الانتظار بين كل فحص")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started, ended = run_due_changes()
+                if started or ended:
+                    self.stdout.write(f"started {started}, ended {ended}")
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
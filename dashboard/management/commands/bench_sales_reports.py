@@ -0,0 +1,90 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from dashboard.models import DailySales
+from dashboard.sales import rebuild_daily_sales
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = "قياس زمن التقارير ومؤشرات لوحة التحكم: التجميع من جدول الطلبات مقابل ملخص المبيعات اليومي"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--days', type=int, default=3 * 365)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        # كل شيء داخل معاملة يتم التراجع عنها، فلا تتأثر بيانات المتجر
+        with transaction.atomic():
+            self.create_orders(options['orders'], options['days'])
+
+            start = time.perf_counter()
+            rows = rebuild_daily_sales()
+            self.stdout.write(f"rebuild: {rows} rows in {time.perf_counter() - start:.1f} s")
+
+            self.run('orders', self.from_orders, options['repeat'])
+            self.run('rollup', self.from_rollup, options['repeat'])
+            transaction.set_rollback(True)
+
+    def create_orders(self, count, days):
+        start = time.perf_counter()
+        now = timezone.now()
+        statuses = ['completed'] * 6 + ['pending'] * 3 + ['cancelled']
+        batch = []
+        for i in range(count):
+            batch.append(Order(
+                full_name=f'bench-{i}', phone='-', address='-', status=random.choice(statuses),
+                total_amount=Decimal(random.randrange(10_000, 2_000_000)), delivery_fee=5000,
+            ))
+            if len(batch) == 10_000:
+                Order.objects.bulk_create(batch)
+                batch = []
+        Order.objects.bulk_create(batch)
+        # created_at حقل auto_now_add، فنوزع الطلبات على الأيام بعد الإدخال مباشرة في قاعدة البيانات (SQLite)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Order._meta.db_table} SET created_at = datetime(%s, '+' || (id %% %s) || ' days') "
+                "WHERE full_name LIKE 'bench-%%'",
+                [(now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S'), days],
+            )
+        self.stdout.write(f"orders: {count} in {time.perf_counter() - start:.1f} s")
+
+    def from_orders(self):
+        # نفس استعلامات التقارير ولوحة التحكم قبل الملخص اليومي
+        today = timezone.localdate()
+        completed = Order.objects.filter(status='completed')
+        return (
+            Order.objects.filter(created_at__date=today).count(),
+            completed.aggregate(Sum('total_amount')),
+            Order.objects.count(),
+            list(completed.annotate(period=TruncMonth('created_at')).values('period')
+                 .annotate(revenue=Sum('total_amount'), count=Count('id')).order_by('-period')),
+        )
+
+    def from_rollup(self):
+        today = timezone.localdate()
+        completed = DailySales.objects.filter(status='completed')
+        return (
+            DailySales.objects.filter(day=today).aggregate(Sum('orders')),
+            completed.aggregate(Sum('revenue')),
+            DailySales.objects.aggregate(Sum('orders')),
+            list(completed.annotate(period=TruncMonth('day')).values('period')
+                 .annotate(revenue=Sum('revenue'), count=Sum('orders')).order_by('-period')),
+        )
+
+    def run(self, label, fn, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        self.stdout.write(f"{label:>8}: best {min(timings) * 1000:.1f} ms")
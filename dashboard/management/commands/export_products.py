@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.catalog_io import file_format, write_csv, write_xlsx
+
+
+class Command(BaseCommand):
+    help = "تصدير كل المنتجات إلى CSV أو XLSX بنفس أعمدة ملف الاستيراد"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], help="الافتراضي حسب امتداد الملف")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if (options['format'] or file_format(path)) == 'xlsx':
+            write_xlsx(path)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as file:
+                write_csv(file)
+        self.stdout.write(self.style.SUCCESS(f"تم التصدير إلى {path}"))
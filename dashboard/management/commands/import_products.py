@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.catalog_io import file_format, import_products
+
+
+class Command(BaseCommand):
+    help = "استيراد/تحديث المنتجات من ملف CSV أو XLSX حسب الـ slug (مثلاً قائمة المورد الليلية)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--dry-run', action='store_true', help="عرض الفروقات فقط بدون حفظ أي تغيير")
+        parser.add_argument('--format', choices=['csv', 'xlsx'], help="الافتراضي حسب امتداد الملف")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            with open(path, 'rb') as file:
+                report = import_products(file, options['format'] or file_format(path), options['dry_run'])
+        except OSError as e:
+            raise CommandError(e)
+
+        if options['dry_run']:
+            for line in report.diff:
+                self.stdout.write(line)
+        for number, message in report.errors[:50]:
+            self.stderr.write(f"سطر {number}: {message}")
+        self.stdout.write(
+            f"rows {report.rows}: created {report.created}, updated {report.updated}, "
+            f"unchanged {report.unchanged}, errors {len(report.errors)} "
+            f"in {report.seconds:.1f}s ({report.rows_per_second:.0f} rows/s)"
+            + (" [dry run]" if options['dry_run'] else "")
+        )
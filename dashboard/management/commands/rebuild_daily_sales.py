@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.sales import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = "إعادة بناء ملخص المبيعات اليومي بالكامل من جدول الطلبات (بعد استيراد بيانات أو تعديلها مباشرة في قاعدة البيانات)"
+
+    def handle(self, *args, **options):
+        rows = rebuild_daily_sales()
+        self.stdout.write(self.style.SUCCESS(f"تم بناء {rows} سطر في ملخص المبيعات اليومي."))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard.report_jobs import claim_next_job, requeue_interrupted_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "عامل مهام التقارير: يبني التقارير المطلوبة من لوحة التحكم ويحفظ ملفاتها، باستمرار أو مرة واحدة مع --once"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="تنفيذ كل المهام المنتظرة الآن ثم الخروج")
+        parser.add_argument('--interval', type=float, default=2.0, help="ثواني الانتظار عندما لا توجد مهام")
+
+    def handle(self, *args, **options):
+        # يفترض عاملاً واحداً: أي مهمة "قيد التجهيز" عند البدء تركها عامل سابق توقف
+        requeue_interrupted_jobs()
+        try:
+            while True:
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+                start = time.monotonic()
+                status = run_job(job)
+                self.stdout.write(f"job {job.pk} ({job.kind}): {status} in {time.monotonic() - start:.1f}s")
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,59 @@
+# Generated by Django 5.1 on 2026-10-18 12:18
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_daily_sales(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    DailySales = apps.get_model('dashboard', 'DailySales')
+    units = {
+        (row['day'], row['state']): row['units']
+        for row in OrderItem.objects.order_by().values(day=TruncDate('order__created_at'), state=F('order__status'))
+        .annotate(units=Sum('quantity'))
+    }
+    orders = Order.objects.order_by().values(day=TruncDate('created_at'), state=F('status')).annotate(
+        count=Count('id'), revenue=Sum('total_amount'), fees=Sum('delivery_fee'), discounts=Sum('discount_amount'),
+    )
+    DailySales.objects.bulk_create([
+        DailySales(
+            day=row['day'], status=row['state'], orders=row['count'], revenue=row['revenue'] or 0,
+            delivery_fees=row['fees'] or 0, discounts=row['discounts'] or 0,
+            units=units.get((row['day'], row['state'])) or 0,
+        )
+        for row in orders
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('store', '0019_notification_email_channel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('status', models.CharField(max_length=20, verbose_name='حالة الطلبات')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='عدد الطلبات')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='الإيرادات')),
+                ('delivery_fees', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='مبالغ التوصيل')),
+                ('discounts', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='الخصومات')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='القطع المباعة')),
+            ],
+            options={
+                'verbose_name': 'مبيعات يوم',
+                'verbose_name_plural': 'ملخص المبيعات اليومي',
+                'indexes': [models.Index(fields=['status', 'day'], name='dashboard_d_status_a23c0a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'status'), name='unique_daily_sales_per_status')],
+            },
+        ),
+        migrations.RunPython(fill_daily_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1 on 2026-10-18 12:31
+
+import dashboard.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_daily_sales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sales', 'تقرير المبيعات'), ('inventory', 'جرد المخزون')], max_length=20, verbose_name='نوع التقرير')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='المعطيات')),
+                ('params_key', models.CharField(editable=False, max_length=64)),
+                ('data_version', models.CharField(editable=False, max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'في الانتظار'), ('running', 'قيد التجهيز'), ('done', 'جاهز'), ('failed', 'فشل')], default='pending', max_length=20, verbose_name='الحالة')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='نسبة الإنجاز')),
+                ('file', models.FileField(blank=True, storage=dashboard.models.reports_storage, upload_to='%Y/%m/', verbose_name='الملف')),
+                ('error', models.TextField(blank=True, verbose_name='الخطأ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الطلب')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='تاريخ الانتهاء')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='طلبه')),
+            ],
+            options={
+                'verbose_name': 'مهمة تقرير',
+                'verbose_name_plural': 'مهام التقارير',
+                'ordering': ('-created_at',),
+                'indexes': [models.Index(fields=['params_key', 'data_version'], name='dashboard_r_params__e67d03_idx'), models.Index(fields=['status', 'created_at'], name='dashboard_r_status_1a249d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1 on 2026-10-18 12:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_report_jobs'),
+        ('store', '0019_notification_email_channel'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledPriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='اسم العرض')),
+                ('field', models.CharField(choices=[('price', 'السعر'), ('discount_percentage', 'نسبة الخصم')], max_length=20, verbose_name='الحقل')),
+                ('mode', models.CharField(choices=[('percent', 'نسبة مئوية (+/-)'), ('amount', 'مبلغ أو نقاط (+/-)'), ('set', 'قيمة ثابتة')], max_length=10, verbose_name='نوع التغيير')),
+                ('value', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='القيمة')),
+                ('query', models.CharField(blank=True, max_length=100, verbose_name='الاسم يحتوي')),
+                ('slugs', models.JSONField(blank=True, default=list)),
+                ('starts_at', models.DateTimeField(verbose_name='يبدأ في')),
+                ('ends_at', models.DateTimeField(blank=True, null=True, verbose_name='ينتهي في')),
+                ('status', models.CharField(choices=[('scheduled', 'مجدول'), ('active', 'فعّال'), ('finished', 'انتهى'), ('cancelled', 'ملغي')], default='scheduled', max_length=10, verbose_name='الحالة')),
+                ('products_count', models.PositiveIntegerField(default=0, verbose_name='عدد المنتجات')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='store.category', verbose_name='القسم')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'تغيير أسعار مجدول',
+                'verbose_name_plural': 'تغييرات الأسعار المجدولة',
+                'ordering': ('-starts_at',),
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount_percentage', models.PositiveIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_snapshots', to='store.product')),
+                ('change', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='dashboard.scheduledpricechange')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='scheduledpricechange',
+            index=models.Index(fields=['status', 'starts_at'], name='dashboard_s_status_b763e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledpricechange',
+            index=models.Index(fields=['status', 'ends_at'], name='dashboard_s_status_a9e101_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pricesnapshot',
+            constraint=models.UniqueConstraint(fields=('change', 'product'), name='unique_price_snapshot_per_change'),
+        ),
+    ]
@@ -1,3 +1,136 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 
-# Create your models here.
+
+# --- ملخص المبيعات اليومي (Rollup) ---
+# سطر لكل (يوم، حالة طلب) يحفظ مجاميع الطلبات، ويتحدث مع كل طلب جديد أو تغيير حالة،
+# فتقرأ التقارير ولوحة التحكم بضع مئات من الأسطر بدلاً من جدول الطلبات كاملاً
+class DailySales(models.Model):
+    day = models.DateField(verbose_name="اليوم")
+    status = models.CharField(max_length=20, verbose_name="حالة الطلبات")
+    orders = models.PositiveIntegerField(default=0, verbose_name="عدد الطلبات")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="الإيرادات")
+    delivery_fees = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="مبالغ التوصيل")
+    discounts = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="الخصومات")
+    units = models.PositiveIntegerField(default=0, verbose_name="القطع المباعة")
+
+    class Meta:
+        verbose_name = "مبيعات يوم"
+        verbose_name_plural = "ملخص المبيعات اليومي"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status'], name='unique_daily_sales_per_status'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} ({self.status})"
+
+
+def reports_storage():
+    # ملفات التقارير فيها بيانات الزبائن، فتُحفظ خارج MEDIA_ROOT ولا تُنزّل إلا من لوحة التحكم
+    return FileSystemStorage(location=settings.REPORTS_ROOT)
+
+
+# --- مهام التقارير في الخلفية ---
+# الموظف يطلب التقرير، وعامل منفصل (python manage.py run_report_jobs) يبنيه ويحفظ الملف،
+# وأي طلب لاحق بنفس المعطيات يستخدم نفس الملف ما دامت نسخة البيانات لم تتغير
+class ReportJob(models.Model):
+    KIND_CHOICES = (
+        ('sales', 'تقرير المبيعات'),
+        ('inventory', 'جرد المخزون'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'في الانتظار'),
+        ('running', 'قيد التجهيز'),
+        ('done', 'جاهز'),
+        ('failed', 'فشل'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="نوع التقرير")
+    params = models.JSONField(default=dict, blank=True, verbose_name="المعطيات")
+    params_key = models.CharField(max_length=64, editable=False)
+    data_version = models.CharField(max_length=64, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="الحالة")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="نسبة الإنجاز")
+    file = models.FileField(storage=reports_storage, upload_to='%Y/%m/', blank=True, verbose_name="الملف")
+    error = models.TextField(blank=True, verbose_name="الخطأ")
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="طلبه")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الطلب")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="تاريخ الانتهاء")
+
+    class Meta:
+        verbose_name = "مهمة تقرير"
+        verbose_name_plural = "مهام التقارير"
+        ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['params_key', 'data_version']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} ({self.get_status_display()})"
+
+
+# --- تغيير الأسعار المجدول (عروض محددة المدة) ---
+# عند وقت البدء تُحفظ القيم الحالية للمنتجات المشمولة ثم يُطبق التغيير بجملة UPDATE واحدة،
+# وعند وقت الانتهاء تُعاد القيم المحفوظة بجملة UPDATE واحدة (python manage.py apply_scheduled_prices)
+class ScheduledPriceChange(models.Model):
+    FIELD_CHOICES = (
+        ('price', 'السعر'),
+        ('discount_percentage', 'نسبة الخصم'),
+    )
+    MODE_CHOICES = (
+        ('percent', 'نسبة مئوية (+/-)'),
+        ('amount', 'مبلغ أو نقاط (+/-)'),
+        ('set', 'قيمة ثابتة'),
+    )
+    STATUS_CHOICES = (
+        ('scheduled', 'مجدول'),
+        ('active', 'فعّال'),
+        ('finished', 'انتهى'),
+        ('cancelled', 'ملغي'),
+    )
+
+    name = models.CharField(max_length=100, verbose_name="اسم العرض")
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES, verbose_name="الحقل")
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, verbose_name="نوع التغيير")
+    value = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="القيمة")
+    # نطاق المنتجات: قسم مع كل أقسامه الفرعية، و/أو نص في الاسم، و/أو قائمة slug
+    category = models.ForeignKey('store.Category', on_delete=models.CASCADE, null=True, blank=True, verbose_name="القسم")
+    query = models.CharField(max_length=100, blank=True, verbose_name="الاسم يحتوي")
+    slugs = models.JSONField(default=list, blank=True)
+    starts_at = models.DateTimeField(verbose_name="يبدأ في")
+    ends_at = models.DateTimeField(null=True, blank=True, verbose_name="ينتهي في")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='scheduled', verbose_name="الحالة")
+    products_count = models.PositiveIntegerField(default=0, verbose_name="عدد المنتجات")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "تغيير أسعار مجدول"
+        verbose_name_plural = "تغييرات الأسعار المجدولة"
+        ordering = ('-starts_at',)
+        indexes = [
+            models.Index(fields=['status', 'starts_at']),
+            models.Index(fields=['status', 'ends_at']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class PriceSnapshot(models.Model):
+    # قيم المنتج قبل بدء العرض، تُعاد عند انتهائه ثم تُحذف
+    change = models.ForeignKey(ScheduledPriceChange, related_name='snapshots', on_delete=models.CASCADE)
+    product = models.ForeignKey('store.Product', related_name='price_snapshots', on_delete=models.CASCADE)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_percentage = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['change', 'product'], name='unique_price_snapshot_per_change'),
+        ]
@@ -0,0 +1,117 @@
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Greatest, Least, Round
+from django.utils import timezone
+
+from store.catalog_cache import bump_catalog_version
+from store.models import Product
+
+from .models import PriceSnapshot, ScheduledPriceChange
+
+# --- تعديل الأسعار جماعياً ---
+# كل عملية جملة UPDATE واحدة بتعبير F() تحسبه قاعدة البيانات لكل منتج، ثم رفع واحد لنسخة الكتالوج
+# (update لا يرسل إشارات الحفظ). السعر بعد الخصم عمود مولّد فيتحدث وحده
+PREVIEW_SIZE = 10
+
+
+def scoped_products(category=None, query='', slugs=None):
+    """المنتجات المشمولة: قسم مع كل أقسامه الفرعية (جدول الإغلاق)، نص في الاسم، قائمة slug"""
+    products = Product.objects.all()
+    if category is not None:
+        products = products.filter(category__ancestor_links__ancestor=category)
+    if query:
+        products = products.filter(name__icontains=query)
+    if slugs:
+        products = products.filter(slug__in=slugs)
+    return products
+
+
+def new_value_expression(field, mode, value):
+    value = Decimal(value)
+    if mode == 'set':
+        expression = Value(value)
+    elif mode == 'percent':
+        # قيمة عشرية قبل القسمة: SQLite يحفظ 999.00 كعدد صحيح فتصبح القسمة صحيحة (999 - 10% = 899)
+        expression = Cast(F(field), models.FloatField()) * (100 + value) / 100
+    else:
+        expression = F(field) + value
+
+    if field == 'price':
+        output = models.DecimalField(max_digits=10, decimal_places=2)
+        return Greatest(Round(expression, 2, output_field=output), Value(Decimal('0')), output_field=output)
+    # نسبة الخصم عدد صحيح بين 0 و 100
+    expression = Least(Greatest(Round(expression, output_field=models.DecimalField()), Value(0)), Value(100))
+    return Cast(expression, models.PositiveIntegerField())
+
+
+def preview_change(products, field, mode, value):
+    """عدد المنتجات وعينة منها بالقيمة الحالية والجديدة (محسوبة بنفس التعبير في قاعدة البيانات)"""
+    sample = products.annotate(new_value=new_value_expression(field, mode, value)).order_by('id').values(
+        'name', 'new_value', current=F(field),
+    )[:PREVIEW_SIZE]
+    return products.count(), list(sample)
+
+
+def apply_change(products, field, mode, value):
+    updated = products.update(**{field: new_value_expression(field, mode, value), 'updated_at': timezone.now()})
+    bump_catalog_version()
+    return updated
+
+
+# --- العروض المجدولة ---
+def change_products(change):
+    return scoped_products(change.category, change.query, change.slugs)
+
+
+def start_change(change):
+    with transaction.atomic():
+        # المنتج الذي يشمله عرض فعّال آخر على نفس الحقل لا يدخل هذا العرض: لو دخل لحفظ سعر العرض الأول
+        # كسعر أصلي، وعند انتهاء العرضين بترتيب مختلف يبقى المنتج بسعر مخفض للأبد
+        busy = PriceSnapshot.objects.filter(change__status='active', change__field=change.field).values('product_id')
+        products = change_products(change).exclude(pk__in=busy)
+        PriceSnapshot.objects.bulk_create([
+            PriceSnapshot(change=change, product_id=product_id, price=price, discount_percentage=discount)
+            for product_id, price, discount in products.values_list('id', 'price', 'discount_percentage').iterator()
+        ], batch_size=1000)
+        change.products_count = apply_change(
+            Product.objects.filter(price_snapshots__change=change), change.field, change.mode, change.value,
+        )
+        change.status = 'active'
+        change.save(update_fields=['status', 'products_count'])
+
+
+def end_change(change):
+    with transaction.atomic():
+        # القيمة المحفوظة لكل منتج تُعاد بجملة UPDATE واحدة (استعلام فرعي لكل سطر)
+        saved = PriceSnapshot.objects.filter(change=change, product=OuterRef('pk')).values(change.field)[:1]
+        Product.objects.filter(price_snapshots__change=change).update(
+            **{change.field: Subquery(saved), 'updated_at': timezone.now()}
+        )
+        change.snapshots.all().delete()
+        change.status = 'finished'
+        change.save(update_fields=['status'])
+        bump_catalog_version()
+
+
+def cancel_change(change):
+    if change.status == 'active':
+        end_change(change)
+    if change.status == 'scheduled':
+        change.status = 'cancelled'
+        change.save(update_fields=['status'])
+
+
+def run_due_changes(now=None):
+    """تشغيل العروض التي حان وقت بدئها وإنهاء التي انتهى وقتها. يرجع (عدد ما بدأ، عدد ما انتهى)"""
+    now = now or timezone.now()
+    started = ended = 0
+    # الإنهاء أولاً: عرض يبدأ لحظة انتهاء آخر يشمل منتجاته بعد إعادة أسعارها
+    for change in ScheduledPriceChange.objects.filter(status='active', ends_at__lte=now).order_by('ends_at'):
+        end_change(change)
+        ended += 1
+    for change in ScheduledPriceChange.objects.filter(status='scheduled', starts_at__lte=now).order_by('starts_at'):
+        start_change(change)
+        started += 1
+    return started, ended
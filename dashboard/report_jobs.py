@@ -0,0 +1,93 @@
+import hashlib
+import json
+import tempfile
+
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+
+from store.catalog_cache import get_catalog_version
+
+from .exports import write_inventory_workbook, write_reports_workbook
+from .models import ReportJob
+from .sales import get_sales_version
+
+# --- مهام التقارير ---
+# مفتاح المعطيات (نوع التقرير + الفترة) مع نسخة البيانات (الكتالوج + المبيعات) يحددان الملف:
+# إذا وُجدت مهمة بنفس المفتاح والنسخة (جاهزة أو قيد التجهيز) نعيدها بدلاً من بناء التقرير مرة أخرى
+
+
+def build_sales(target, params, progress):
+    write_reports_workbook(target, params.get('date_from'), params.get('date_to'), progress)
+
+
+def build_inventory(target, params, progress):
+    write_inventory_workbook(target, progress)
+
+
+BUILDERS = {
+    'sales': build_sales,
+    'inventory': build_inventory,
+}
+
+
+def params_key(kind, params):
+    raw = json.dumps([kind, params], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def data_version():
+    return f'{get_catalog_version()}:{get_sales_version()}'
+
+
+def request_report(kind, params, user=None):
+    """طلب تقرير: يرجع (المهمة، هل هي جديدة). المهمة الموجودة تُستخدم ما دامت البيانات لم تتغير"""
+    key, version = params_key(kind, params), data_version()
+    job = ReportJob.objects.filter(
+        params_key=key, data_version=version, status__in=['pending', 'running', 'done'],
+    ).first()
+    if job:
+        return job, False
+    return ReportJob.objects.create(
+        kind=kind, params=params, params_key=key, data_version=version, requested_by=user,
+    ), True
+
+
+def claim_next_job():
+    """أخذ أقدم مهمة منتظرة؛ التحديث المشروط يمنع عاملين من أخذ نفس المهمة"""
+    for job in ReportJob.objects.filter(status='pending').order_by('created_at', 'id')[:5]:
+        if ReportJob.objects.filter(pk=job.pk, status='pending').update(status='running', progress=0):
+            job.status = 'running'
+            return job
+    return None
+
+
+def requeue_interrupted_jobs():
+    # مهام بقيت "قيد التجهيز" لأن العامل توقف أثناءها تعود للانتظار عند تشغيله من جديد
+    return ReportJob.objects.filter(status='running').update(status='pending', progress=0)
+
+
+def run_job(job):
+    def progress(done, total):
+        ReportJob.objects.filter(pk=job.pk).update(progress=min(99, done * 100 // total))
+
+    try:
+        with tempfile.TemporaryFile() as output:
+            BUILDERS[job.kind](output, job.params, progress)
+            output.seek(0)
+            job.file.save(f'{job.kind}-{job.pk}.xlsx', File(output), save=False)
+    except Exception as e:
+        job.status, job.error = 'failed', str(e)
+    else:
+        job.status, job.progress = 'done', 100
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'progress', 'error', 'finished_at'])
+
+    if job.status == 'done':
+        # الملفات الأقدم لنفس المعطيات لم تعد مطابقة للبيانات، نحذفها مع مهامها
+        for old in ReportJob.objects.filter(params_key=job.params_key, status='done').filter(
+            ~Q(pk=job.pk), created_at__lte=job.created_at,
+        ):
+            old.file.delete(save=False)
+            old.delete()
+    return job.status
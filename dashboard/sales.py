@@ -0,0 +1,159 @@
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from store.catalog_cache import bump_version, get_version
+from store.models import Order, OrderItem
+from store.stock import order_items_created, orders_status_changed
+
+from .models import DailySales
+
+# --- تحديث ملخص المبيعات اليومي ---
+# كل طلب يساهم بسطر (يومه، حالته)؛ عند تغيير الحالة نطرح مساهمته من السطر القديم ونضيفها للجديد.
+# التحديث بـ F() داخل نفس معاملة حفظ الطلب، فلا يتعارض طلبان متزامنان على نفس اليوم
+SNAPSHOT_FIELDS = ('status', 'created_at', 'total_amount', 'delivery_fee', 'discount_amount')
+
+# رقم نسخة بيانات المبيعات (مثل رقم نسخة الكتالوج، وفي نفس الجدول): يرتفع مع كل تغيير في الطلبات،
+# وتستخدمه ملفات التقارير المخزنة لمعرفة إن كانت ما تزال مطابقة للبيانات
+SALES_VERSION = 'sales'
+
+
+def get_sales_version():
+    return get_version(SALES_VERSION)
+
+
+def bump_sales_version():
+    # داخل معاملة الطلب نفسها: التقرير لا يرى الطلب الجديد مع الرقم القديم
+    bump_version(SALES_VERSION)
+
+
+def shift(day, status, sign, orders=1, revenue=0, delivery_fees=0, discounts=0, units=0):
+    row, _ = DailySales.objects.get_or_create(day=day, status=status)
+    DailySales.objects.filter(pk=row.pk).update(
+        orders=F('orders') + sign * orders,
+        revenue=F('revenue') + sign * revenue,
+        delivery_fees=F('delivery_fees') + sign * delivery_fees,
+        discounts=F('discounts') + sign * discounts,
+        units=F('units') + sign * units,
+    )
+
+
+def apply(snapshot, sign, units=0):
+    shift(
+        timezone.localdate(snapshot['created_at']), snapshot['status'], sign, 1,
+        snapshot['total_amount'], snapshot['delivery_fee'], snapshot['discount_amount'], units,
+    )
+
+
+def add_units(order, units):
+    """أسطر طلب أُنشئت بـ bulk_create (لا ترسل إشارات الحفظ)"""
+    if units:
+        shift(timezone.localdate(order.created_at), order.status, 1, orders=0, units=units)
+
+
+def order_units(order_id):
+    return OrderItem.objects.filter(order_id=order_id).aggregate(units=Sum('quantity'))['units'] or 0
+
+
+def snapshot(order):
+    return {name: getattr(order, name) for name in SNAPSHOT_FIELDS}
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_totals(sender, instance, raw=False, **kwargs):
+    instance._sales_snapshot = None
+    if instance.pk and not raw:
+        instance._sales_snapshot = Order.objects.filter(pk=instance.pk).values(*SNAPSHOT_FIELDS).first()
+
+
+@receiver(post_save, sender=Order)
+def update_daily_sales(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old, new = getattr(instance, '_sales_snapshot', None), snapshot(instance)
+    if old == new:
+        return
+    with transaction.atomic():
+        units = 0
+        if old:
+            units = order_units(instance.pk)
+            apply(old, -1, units)
+        apply(new, 1, units)
+
+
+@receiver(pre_delete, sender=Order)
+def remember_deleted_order_units(sender, instance, **kwargs):
+    # الأسطر تُحذف قبل الطلب نفسه (CASCADE)، فنحسب قطعها الآن
+    instance._sales_units = order_units(instance.pk)
+
+
+@receiver(post_delete, sender=Order)
+def remove_daily_sales(sender, instance, **kwargs):
+    apply(snapshot(instance), -1, getattr(instance, '_sales_units', 0))
+
+
+@receiver(post_save, sender=OrderItem)
+def add_item_units(sender, instance, created, raw=False, **kwargs):
+    # إضافة سطر لطلب موجود من لوحة الإدارة
+    if created and not raw and instance.order_id:
+        add_units(instance.order, instance.quantity)
+
+
+@receiver(order_items_created)
+def add_order_items_units(sender, order, items, **kwargs):
+    add_units(order, sum(item.quantity for item in items))
+
+
+@receiver(orders_status_changed)
+def move_daily_sales(sender, moved, status, **kwargs):
+    # تغيير حالة دفعة طلبات: مجاميعها لكل يوم بنفس استعلامي إعادة البناء، ثم نقل كل يوم مرة واحدة
+    for previous, ids in moved.items():
+        units = dict(
+            OrderItem.objects.filter(order_id__in=ids).order_by().values(day=TruncDate('order__created_at'))
+            .annotate(units=Sum('quantity')).values_list('day', 'units')
+        )
+        days = Order.objects.filter(pk__in=ids).order_by().values(day=TruncDate('created_at')).annotate(
+            count=Count('id'), revenue=Sum('total_amount'), fees=Sum('delivery_fee'), discounts=Sum('discount_amount'),
+        )
+        for row in days:
+            totals = (row['count'], row['revenue'], row['fees'], row['discounts'], units.get(row['day']) or 0)
+            shift(row['day'], previous, -1, *totals)
+            shift(row['day'], status, 1, *totals)
+    bump_sales_version()
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def invalidate_sales_reports(sender, **kwargs):
+    # أي تعديل على الطلب (حتى اسم الزبون) يغير محتوى ملفات التصدير
+    bump_sales_version()
+
+
+def rebuild_daily_sales():
+    """إعادة بناء الملخص كاملاً من جدول الطلبات (استعلامان تجميعيان)"""
+    units = {
+        (row['day'], row['state']): row['units']
+        for row in OrderItem.objects.order_by().values(day=TruncDate('order__created_at'), state=F('order__status'))
+        .annotate(units=Sum('quantity'))
+    }
+    orders = Order.objects.order_by().values(day=TruncDate('created_at'), state=F('status')).annotate(
+        count=Count('id'), revenue=Sum('total_amount'), fees=Sum('delivery_fee'), discounts=Sum('discount_amount'),
+    )
+    rows = [
+        DailySales(
+            day=row['day'], status=row['state'], orders=row['count'], revenue=row['revenue'] or 0,
+            delivery_fees=row['fees'] or 0, discounts=row['discounts'] or 0,
+            units=units.get((row['day'], row['state'])) or 0,
+        )
+        for row in orders
+    ]
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        DailySales.objects.bulk_create(rows, batch_size=1000)
+    bump_sales_version()
+    return len(rows)
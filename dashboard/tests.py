@@ -1,3 +1,370 @@
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+import openpyxl
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from store.catalog_cache import get_catalog_version
+from store.models import CacheVersion, Category, Order, Product
+from store.stock import OutOfStock, change_order_status, create_order_items
+
+from . import catalog_io
+from .catalog_io import import_products, write_csv
+from .models import DailySales, ReportJob, ScheduledPriceChange
+from .pricing import apply_change, run_due_changes, scoped_products
+from .report_jobs import data_version
+from .sales import rebuild_daily_sales
+
+
+class DailySalesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='هواتف', slug='phones')
+        cls.product = Product.objects.create(
+            category=category, name='هاتف', slug='phone', description='-', price=1000, stock_quantity=10,
+        )
+
+    def place_order(self, total, quantity):
+        order = Order.objects.create(full_name='زبون', phone='-', address='-', total_amount=total, delivery_fee=5000)
+        create_order_items(order, [{'product': self.product, 'price': self.product.price, 'quantity': quantity}])
+        return order
+
+    def rollup(self):
+        return {
+            row.status: (row.orders, row.revenue, row.units)
+            for row in DailySales.objects.filter(day=timezone.localdate())
+        }
+
+    def test_rollup_follows_orders(self):
+        first = self.place_order(Decimal('6000'), 1)
+        self.place_order(Decimal('8000'), 3)
+        self.assertEqual(self.rollup(), {'pending': (2, Decimal('14000'), 4)})
+
+        first.status = 'completed'
+        first.save()
+        self.assertEqual(self.rollup(), {
+            'pending': (1, Decimal('8000'), 3),
+            'completed': (1, Decimal('6000'), 1),
+        })
+
+        first.delete()
+        self.assertEqual(self.rollup()['completed'], (0, Decimal('0'), 0))
+
+    def test_rebuild_matches_incremental_rollup(self):
+        order = self.place_order(Decimal('6000'), 2)
+        self.place_order(Decimal('7000'), 1)
+        order.status = 'cancelled'
+        order.save()
+        incremental = {k: v for k, v in self.rollup().items() if v[0]}
+        rebuild_daily_sales()
+        self.assertEqual(self.rollup(), incremental)
+
+
+class ReportExportTests(TestCase):
+    def test_export_streams_only_the_selected_range(self):
+        today = timezone.localdate()
+        for days_ago in (0, 10, 40):
+            order = Order.objects.create(
+                full_name=f'زبون {days_ago}', phone='-', address='-', total_amount=6000, status='completed',
+            )
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+        self.client.force_login(User.objects.create_user('staff', password='secret-pass', is_staff=True))
+        response = self.client.get(reverse('export_reports_excel'), {
+            'date_from': str(today - timedelta(days=30)), 'date_to': str(today),
+        })
+        self.assertTrue(response.streaming)
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+        names = [row[1] for row in wb["تقرير المبيعات"].iter_rows(min_row=2, values_only=True)]
+        self.assertEqual(names, ['زبون 0', 'زبون 10'])
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        # الملفات تُحفظ في مجلد مؤقت بدلاً من REPORTS_ROOT
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        storage = patch.object(ReportJob._meta.get_field('file'), 'storage', FileSystemStorage(location=tmp.name))
+        storage.start()
+        self.addCleanup(storage.stop)
+
+        self.staff = User.objects.create_user('staff', password='secret-pass', is_staff=True)
+        self.client.force_login(self.staff)
+        Order.objects.create(full_name='زبون', phone='-', address='-', total_amount=6000, status='completed')
+
+    def request_sales_report(self):
+        self.client.post(reverse('dashboard_report_job_create'), {'kind': 'sales', 'date_from': '2020-01-01'})
+        return ReportJob.objects.latest('id')
+
+    def test_job_is_built_by_worker_and_reused_until_data_changes(self):
+        job = self.request_sales_report()
+        self.assertEqual((job.status, job.params), ('pending', {'date_from': '2020-01-01'}))
+
+        call_command('run_report_jobs', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), ('done', 100))
+        response = self.client.get(reverse('dashboard_report_job_download', args=[job.id]))
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(wb["تقرير المبيعات"].max_row, 2)
+
+        self.assertEqual(self.request_sales_report(), job)
+
+        Order.objects.create(full_name='زبون آخر', phone='-', address='-', total_amount=7000)
+        newer = self.request_sales_report()
+        self.assertNotEqual(newer, job)
+        self.assertEqual(newer.status, 'pending')
+
+    def test_data_version_is_shared_between_workers(self):
+        version = data_version()
+        cache.clear()  # عامل آخر: كاش محلي فارغ
+        self.assertEqual(data_version(), version)
+
+        # طلب عُدّل في عملية أخرى: الرقم يصل من قاعدة البيانات مباشرة
+        CacheVersion.objects.filter(name='sales').update(value=F('value') + 1)
+        changed = data_version()
+        self.assertNotEqual(changed, version)
+        Order.objects.get().save()
+        self.assertNotEqual(data_version(), changed)
+
+
+class ProductImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name='هواتف', slug='phones')
+        Category.objects.create(name='حاسبات', slug='laptops')
+        Product.objects.create(category=cls.phones, name='هاتف', slug='phone', description='-', price=1000)
+
+    def upload(self, text, dry_run=False):
+        return import_products(BytesIO(text.encode()), 'csv', dry_run)
+
+    def test_import_creates_updates_and_reports_errors(self):
+        csv_text = (
+            "slug,name,category,price,stock_quantity\n"
+            "phone,هاتف,phones,1200,3\n"
+            "laptop,حاسبة,laptops,900000,2\n"
+            "bad,منتج,missing,10,1\n"
+            "laptop,مكرر,laptops,1,1\n"
+        )
+        preview = self.upload(csv_text, dry_run=True)
+        self.assertEqual((preview.created, preview.updated, len(preview.errors)), (1, 1, 2))
+        self.assertIn('~ phone: price 1000.00 ← 1200.00، stock_quantity 0 ← 3', preview.diff)
+        self.assertFalse(Product.objects.filter(slug='laptop').exists())
+
+        report = self.upload(csv_text)
+        self.assertEqual((report.created, report.updated), (1, 1))
+        phone = Product.objects.get(slug='phone')
+        self.assertEqual((phone.price, phone.stock_quantity, phone.description), (Decimal('1200'), 3, '-'))
+        self.assertEqual(Product.objects.get(slug='laptop').category.slug, 'laptops')
+        self.assertEqual(self.upload(csv_text).unchanged, 2)
+
+    def test_failed_batch_reports_its_rows_and_keeps_the_others(self):
+        save_rows = catalog_io.save_rows
+
+        def failing(rows):
+            if any(product.slug == 'broken' for _, product, _ in rows):
+                raise IntegrityError("CHECK constraint failed")
+            save_rows(rows)
+
+        csv_text = "slug,name,category,price\n" + "".join(
+            f"{slug},منتج,phones,10\n" for slug in ['a', 'b', 'broken', 'c', 'd']
+        )
+        with patch.object(catalog_io, 'BATCH_SIZE', 2), patch.object(catalog_io, 'save_rows', side_effect=failing):
+            report = self.upload(csv_text)
+        self.assertEqual((report.created, report.updated), (4, 0))
+        self.assertEqual([number for number, _ in report.errors], [4])
+        self.assertIn('CHECK constraint failed', report.errors[0][1])
+        self.assertEqual(
+            set(Product.objects.filter(slug__in='a b broken c d'.split()).values_list('slug', flat=True)),
+            {'a', 'b', 'c', 'd'},
+        )
+
+    def test_export_can_be_imported_back(self):
+        output = StringIO()
+        write_csv(output)
+        report = self.upload(output.getvalue())
+        self.assertEqual((report.unchanged, report.errors), (1, []))
+
+    def test_dashboard_page_previews_upload(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='secret-pass'))
+        upload = SimpleUploadedFile('products.csv', "slug,price\nphone,1500\n".encode())
+        response = self.client.post(reverse('dashboard_product_import'), {'file': upload, 'dry_run': '1'})
+        self.assertContains(response, '~ phone: price 1000.00 ← 1500.00')
+        self.assertEqual(Product.objects.get(slug='phone').price, Decimal('1000'))
+
+
+class BulkPricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.electronics = Category.objects.create(name='إلكترونيات', slug='electronics')
+        phones = Category.objects.create(name='هواتف', slug='phones', parent=cls.electronics)
+        other = Category.objects.create(name='أخرى', slug='other')
+        cls.phone = Product.objects.create(category=phones, name='هاتف', slug='phone', description='-', price=1000)
+        cls.tv = Product.objects.create(
+            category=cls.electronics, name='تلفاز', slug='tv', description='-', price=2500, discount_percentage=5,
+        )
+        cls.other = Product.objects.create(category=other, name='كتاب', slug='book', description='-', price=300)
+
+    def test_percentage_change_is_one_update_over_the_subtree(self):
+        products = scoped_products(self.electronics)
+        get_catalog_version()
+        # جملة UPDATE واحدة للمنتجات + رفع نسخة الكتالوج
+        with self.assertNumQueries(2):
+            self.assertEqual(apply_change(products, 'price', 'percent', Decimal('-10')), 2)
+        self.phone.refresh_from_db()
+        self.assertEqual((self.phone.price, self.phone.effective_price), (Decimal('900'), Decimal('900')))
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.price, Decimal('300'))
+
+        apply_change(products, 'discount_percentage', 'amount', Decimal('98'))
+        self.tv.refresh_from_db()
+        self.assertEqual(self.tv.discount_percentage, 100)
+
+    def test_scheduled_sale_starts_and_restores_previous_values(self):
+        now = timezone.now()
+        sale = ScheduledPriceChange.objects.create(
+            name='الجمعة', field='discount_percentage', mode='set', value=20, category=self.electronics,
+            starts_at=now - timedelta(minutes=1), ends_at=now + timedelta(hours=1),
+        )
+        self.assertEqual(run_due_changes(now), (1, 0))
+        self.tv.refresh_from_db()
+        self.assertEqual((self.tv.discount_percentage, self.tv.effective_price), (20, Decimal('2000')))
+
+        self.assertEqual(run_due_changes(now + timedelta(hours=2)), (0, 1))
+        self.tv.refresh_from_db()
+        self.phone.refresh_from_db()
+        self.assertEqual((self.tv.discount_percentage, self.phone.discount_percentage), (5, 0))
+        sale.refresh_from_db()
+        self.assertEqual((sale.status, sale.products_count, sale.snapshots.count()), ('finished', 2, 0))
+
+    def test_percent_change_keeps_fractions(self):
+        Product.objects.filter(pk=self.phone.pk).update(price=999)
+        apply_change(scoped_products(slugs=['phone']), 'price', 'percent', Decimal('-10'))
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.price, Decimal('899.10'))
+        apply_change(scoped_products(slugs=['tv']), 'discount_percentage', 'percent', Decimal('50'))
+        self.tv.refresh_from_db()
+        self.assertEqual(self.tv.discount_percentage, 8)  # 7.5 مقرباً
+
+    def test_overlapping_sales_restore_the_original_price(self):
+        now = timezone.now()
+        for name, value, starts, ends in [('أ', '-10', 0, 2), ('ب', '-50', 1, 3)]:
+            ScheduledPriceChange.objects.create(
+                name=name, field='price', mode='percent', value=Decimal(value), slugs=['phone'],
+                starts_at=now + timedelta(hours=starts), ends_at=now + timedelta(hours=ends),
+            )
+
+        prices = []
+        for hour in range(4):
+            run_due_changes(now + timedelta(hours=hour))
+            self.phone.refresh_from_db()
+            prices.append(self.phone.price)
+        # العرض الثاني لا يشمل منتجاً في عرض فعّال، فلا يحفظ سعر العرض الأول كسعر أصلي
+        self.assertEqual(prices, [Decimal('900'), Decimal('900'), Decimal('1000'), Decimal('1000')])
+        self.assertEqual(
+            list(ScheduledPriceChange.objects.order_by('starts_at').values_list('status', 'products_count')),
+            [('finished', 1), ('finished', 0)],
+        )
+
+    def test_dashboard_preview_then_apply(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='secret-pass'))
+        data = {'field': 'price', 'mode': 'amount', 'value': '-100', 'category': self.electronics.pk, 'query': ''}
+        response = self.client.post(reverse('dashboard_bulk_pricing'), {**data, 'action': 'preview'})
+        self.assertContains(response, 'تطبيق على 2 منتج')
+        self.client.post(reverse('dashboard_bulk_pricing'), {**data, 'action': 'apply'})
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.price, Decimal('900'))
+
+
+class OrderStatusBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='هواتف', slug='phones')
+        cls.products = [
+            Product.objects.create(category=category, name=f'هاتف {i}', slug=f'phone-{i}', description='-',
+                                   price=1000, stock_quantity=10)
+            for i in range(2)
+        ]
+
+    def place_order(self):
+        order = Order.objects.create(full_name='زبون', phone='-', address='-', total_amount=6000, delivery_fee=5000)
+        create_order_items(order, [
+            {'product': product, 'price': product.price, 'quantity': 2} for product in self.products
+        ])
+        return order
+
+    def stock(self):
+        return [p.stock_quantity for p in Product.objects.filter(pk__in=[p.pk for p in self.products]).order_by('id')]
+
+    def rollup(self):
+        return {row.status: (row.orders, row.units) for row in DailySales.objects.all() if row.orders}
+
+    def test_bulk_cancel_restores_stock_once_and_is_idempotent(self):
+        orders = [self.place_order() for _ in range(3)]
+        ids = [order.id for order in orders]
+        self.assertEqual(self.stock(), [4, 4])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(change_order_status(ids, 'cancelled'), 3)
+        product_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "store_product"')]
+        self.assertEqual(len(product_updates), 1)
+        self.assertEqual(self.stock(), [10, 10])
+        self.assertEqual(self.rollup(), {'cancelled': (3, 12)})
+
+        self.assertEqual(change_order_status(ids, 'cancelled'), 0)
+        self.assertEqual(self.stock(), [10, 10])
+
+        self.assertEqual(change_order_status(ids[:1], 'completed'), 1)
+        self.assertEqual(self.stock(), [8, 8])
+        self.assertEqual(self.rollup(), {'cancelled': (2, 8), 'completed': (1, 4)})
+
+    def test_order_moved_concurrently_is_counted_once(self):
+        orders = [self.place_order() for _ in range(3)]
+        savepoint = transaction.savepoint
+        raced = []
+
+        def racing(*args, **kwargs):
+            # مدير آخر يلغي الطلب الأول بعد أن قرأنا الأرقام وقبل جملة UPDATE
+            if not raced:
+                raced.append(True)
+                change_order_status([orders[0].id], 'cancelled')
+            return savepoint(*args, **kwargs)
+
+        with patch('store.stock.transaction.savepoint', side_effect=racing):
+            self.assertEqual(change_order_status([order.id for order in orders], 'cancelled'), 2)
+        self.assertEqual(self.stock(), [10, 10])
+        self.assertEqual(self.rollup(), {'cancelled': (3, 12)})
+
+    def test_reactivating_without_stock_changes_nothing(self):
+        order = self.place_order()
+        change_order_status([order.id], 'cancelled')
+        Product.objects.update(stock_quantity=1)
+        with self.assertRaises(OutOfStock):
+            change_order_status([order.id], 'pending')
+        order.refresh_from_db()
+        self.assertEqual((order.status, self.stock()), ('cancelled', [1, 1]))
+
+    def test_reactivating_order_with_a_deleted_product(self):
+        order = self.place_order()
+        change_order_status([order.id], 'cancelled')
+        self.products[0].delete()
 
-# Create your tests here.
+        self.client.force_login(User.objects.create_superuser('admin', password='secret-pass'))
+        response = self.client.post(reverse('dashboard_order_bulk_status'), {'orders': [order.id], 'status': 'pending'})
+        self.assertRedirects(response, reverse('dashboard_orders'), fetch_redirect_response=False)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'pending')
+        self.assertEqual(Product.objects.get(pk=self.products[1].pk).stock_quantity, 8)
+        self.assertEqual(order.items.count(), 2)
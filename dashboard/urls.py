@@ -18,7 +18,12 @@ urlpatterns = [
 
     # Orders
     path('orders/', views.order_manage, name='dashboard_orders'),
+    path('orders/status/', views.order_bulk_status, name='dashboard_order_bulk_status'),
     path('orders/<int:order_id>/', views.order_detail, name='dashboard_order_detail'),
+    path('products/import/', views.product_import, name='dashboard_product_import'),
+    path('products/export/', views.product_export, name='dashboard_product_export'),
+    path('products/pricing/', views.bulk_pricing, name='dashboard_bulk_pricing'),
+    path('products/pricing/<int:pk>/cancel/', views.bulk_pricing_cancel, name='dashboard_bulk_pricing_cancel'),
     path('products/edit/<int:pk>/', views.product_edit, name='dashboard_product_edit'),
     path('products/delete/<int:pk>/', views.delete_product, name='dashboard_product_delete'),
 
@@ -28,6 +33,9 @@ urlpatterns = [
     path('reports/', views.dashboard_reports, name='dashboard_reports'),
     path('reports/export/', views.export_reports_excel, name='export_reports_excel'),
     path('reports/inventory/', views.dashboard_inventory, name='dashboard_inventory'),
+    path('reports/jobs/', views.report_jobs, name='dashboard_report_jobs'),
+    path('reports/jobs/new/', views.report_job_create, name='dashboard_report_job_create'),
+    path('reports/jobs/<int:pk>/download/', views.report_job_download, name='dashboard_report_job_download'),
     
     #coupon
     path('coupons/', views.coupon_list, name='dashboard_coupons'),
@@ -2,21 +2,26 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import permission_required, user_passes_test
 from django.contrib import messages
-from django.db import models
-from django.db.models import Sum, Count, Q
+from django.db.models import Sum, Q
 from django.db.models.functions import TruncMonth
 from django.utils import timezone
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 from datetime import datetime
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment
+import tempfile
 
 # استيراد المودلز
 from store.models import Product, Category, Order, Coupon
+from store.stock import OutOfStock, change_order_status
 from django.contrib.auth.models import User
 from store.models import ProductImage # تأكد من وجود هذا الاستيراد
 # استيراد الفورم
-from .forms import ProductForm, CategoryForm, CouponForm, StaffUserForm
+from .forms import ProductForm, CategoryForm, CouponForm, StaffUserForm, BulkPriceForm
+from .models import DailySales, ReportJob, ScheduledPriceChange
+from .pricing import apply_change, cancel_change, preview_change, run_due_changes, scoped_products
+from .report_jobs import request_report
+from .catalog_io import file_format, import_products, stream_csv, write_xlsx
+from .exports import inventory_products, parse_day, write_reports_workbook
 
 from store.models import HomeSection
 from .forms import HomeSectionForm
@@ -32,11 +37,17 @@ from .forms import HomeSectionForm
 # --- الصفحة الرئيسية للوحة التحكم ---
 @staff_member_required
 def dashboard_home(request):
-    today = timezone.now().date()
+    today = timezone.localdate()
     total_products = Product.objects.count()
-    orders_today = Order.objects.filter(created_at__date=today).count()
-    total_sales = Order.objects.filter(status='completed').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-    total_orders = Order.objects.count()
+    # الأرقام من ملخص المبيعات اليومي بدلاً من المرور على جدول الطلبات كاملاً
+    kpis = DailySales.objects.aggregate(
+        orders_today=Sum('orders', filter=Q(day=today)),
+        total_sales=Sum('revenue', filter=Q(status='completed')),
+        total_orders=Sum('orders'),
+    )
+    orders_today = kpis['orders_today'] or 0
+    total_sales = kpis['total_sales'] or 0
+    total_orders = kpis['total_orders'] or 0
 
     context = {
         'total_products': total_products,
@@ -90,6 +101,81 @@ def product_manage(request):
     products = Product.objects.all()
     return render(request, 'dashboard/products.html', {'products': products})
 
+@permission_required(['store.add_product', 'store.change_product'], raise_exception=True)
+def product_import(request):
+    report = None
+    if request.method == 'POST' and request.FILES.get('file'):
+        upload = request.FILES['file']
+        dry_run = bool(request.POST.get('dry_run'))
+        report = import_products(upload, file_format(upload.name), dry_run)
+        if not dry_run:
+            messages.success(
+                request, f"تم الاستيراد: {report.created} منتج جديد، {report.updated} تعديل، {len(report.errors)} خطأ."
+            )
+    return render(request, 'dashboard/product_import.html', {
+        'report': report,
+        'errors': report.errors[:100] if report else [],
+    })
+
+@staff_member_required
+def product_export(request):
+    if request.GET.get('format') == 'xlsx':
+        output = tempfile.TemporaryFile()
+        write_xlsx(output)
+        output.seek(0)
+        return FileResponse(
+            output, as_attachment=True, filename='products.xlsx',
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    # CSV يُرسل سطراً سطراً أثناء القراءة من قاعدة البيانات
+    response = StreamingHttpResponse(stream_csv(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="products.csv"'
+    return response
+
+@permission_required('store.change_product', raise_exception=True)
+def bulk_pricing(request):
+    preview = None
+    form = BulkPriceForm(request.POST or None, request.FILES or None)
+    if request.method == 'POST' and form.is_valid():
+        data = form.cleaned_data
+        products = scoped_products(data['category'], data['query'], data['slugs'])
+
+        if request.POST.get('action') == 'apply':
+            if form.is_scheduled:
+                change = form.save(commit=False)
+                change.name = change.name or f"عرض {timezone.localtime(change.starts_at):%Y-%m-%d %H:%M}"
+                change.slugs = data['slugs']
+                change.starts_at = data['starts_at']
+                change.created_by = request.user
+                change.save()
+                # إذا كان وقت البدء الآن أو قبله يبدأ العرض مباشرة بدون انتظار العامل
+                run_due_changes()
+                messages.success(request, f"تم حفظ العرض \"{change.name}\".")
+            else:
+                updated = apply_change(products, data['field'], data['mode'], data['value'])
+                messages.success(request, f"تم تعديل {updated} منتج.")
+            return redirect('dashboard_bulk_pricing')
+
+        count, sample = preview_change(products, data['field'], data['mode'], data['value'])
+        preview = {'count': count, 'sample': sample}
+        if data['slugs']:
+            form.data = form.data.copy()
+            form.data['slug_list'] = '\n'.join(data['slugs'])
+
+    return render(request, 'dashboard/bulk_pricing.html', {
+        'form': form,
+        'preview': preview,
+        'changes': ScheduledPriceChange.objects.select_related('category')[:20],
+    })
+
+@permission_required('store.change_product', raise_exception=True)
+@require_POST
+def bulk_pricing_cancel(request, pk):
+    change = get_object_or_404(ScheduledPriceChange, pk=pk)
+    cancel_change(change)
+    messages.success(request, f"تم إيقاف العرض \"{change.name}\" وإعادة الأسعار السابقة.")
+    return redirect('dashboard_bulk_pricing')
+
 @permission_required('store.add_product', raise_exception=True)
 def product_add(request):
     if request.method == 'POST':
@@ -222,6 +308,23 @@ def order_manage(request):
     orders = Order.objects.all().order_by('-created_at')
     return render(request, 'dashboard/orders.html', {'orders': orders})
 
+@staff_member_required
+@require_POST
+def order_bulk_status(request):
+    status = request.POST.get('status')
+    order_ids = [int(pk) for pk in request.POST.getlist('orders') if pk.isdigit()]
+    if status not in dict(Order.STATUS_CHOICES) or not order_ids:
+        messages.error(request, "اختر الطلبات والحالة الجديدة.")
+        return redirect('dashboard_orders')
+    try:
+        changed = change_order_status(order_ids, status)
+    except OutOfStock as e:
+        messages.error(request, f"لم يتغير أي طلب. {e}")
+    else:
+        skipped = len(order_ids) - changed
+        messages.success(request, f"تم تحديث {changed} طلب." + (f" ({skipped} بنفس الحالة مسبقاً)" if skipped else ""))
+    return redirect('dashboard_orders')
+
 @staff_member_required
 def order_detail(request, order_id):
     order = get_object_or_404(Order, id=order_id)
@@ -234,8 +337,12 @@ def order_detail(request, order_id):
 
         status = request.POST.get('status')
         if status in ['pending', 'completed', 'cancelled']:
-            order.status = status
-            order.save()
+            # نفس مسار التغيير الجماعي: الإلغاء يعيد الكميات للمخزون، وإعادة التفعيل تحجزها من جديد
+            try:
+                change_order_status([order.id], status)
+            except OutOfStock as e:
+                messages.error(request, f"لا يمكن إعادة تفعيل الطلب. {e}")
+                return redirect('dashboard_order_detail', order_id=order.id)
             messages.success(request, "تم تحديث حالة الطلب.")
             return redirect('dashboard_orders')
     return render(request, 'dashboard/order_detail.html', {'order': order})
@@ -246,34 +353,33 @@ def dashboard_reports(request):
     selected_year = request.GET.get('year')
     selected_month = request.GET.get('month')
     
-    orders_query = Order.objects.filter(status='completed')
+    # التقارير تقرأ ملخص المبيعات اليومي (سطر لكل يوم) وليس الطلبات نفسها
+    sales_query = DailySales.objects.filter(status='completed')
 
     if selected_year and selected_year != 'all':
-        orders_query = orders_query.filter(created_at__year=selected_year)
+        sales_query = sales_query.filter(day__year=selected_year)
     
     if selected_month and selected_month != 'all':
-        orders_query = orders_query.filter(created_at__month=selected_month)
+        sales_query = sales_query.filter(day__month=selected_month)
 
-    totals = orders_query.aggregate(
-        total_revenue=Sum('total_amount'),
-        total_count=Count('id')
+    totals = sales_query.aggregate(
+        total_revenue=Sum('revenue'),
+        total_count=Sum('orders')
     )
 
     if selected_month and selected_month != 'all':
-        sales_data = orders_query.extra(select={'day': "date(created_at)"}).values('day')\
-            .annotate(revenue=Sum('total_amount'), count=Count('id')).order_by('-day')
+        sales_data = sales_query.values('day')\
+            .annotate(revenue=Sum('revenue'), count=Sum('orders')).order_by('-day')
         report_type = 'daily'
     else:
-        sales_data = orders_query.annotate(period=TruncMonth('created_at'))\
+        sales_data = sales_query.annotate(period=TruncMonth('day'))\
             .values('period')\
-            .annotate(revenue=Sum('total_amount'), count=Count('id')).order_by('-period')
+            .annotate(revenue=Sum('revenue'), count=Sum('orders')).order_by('-period')
         report_type = 'monthly'
 
-    products_inventory = Product.objects.all().annotate(
-        total_sold=Sum('orderitem__quantity', filter=models.Q(orderitem__order__status='completed'))
-    ).order_by('stock_quantity')
+    products_inventory = inventory_products()
 
-    available_years = Order.objects.dates('created_at', 'year')
+    available_years = DailySales.objects.dates('day', 'year')
 
     context = {
         'sales_data': sales_data,
@@ -289,71 +395,77 @@ def dashboard_reports(request):
 
 @staff_member_required
 def dashboard_inventory(request):
-    products = Product.objects.all().annotate(
-        total_sold=Sum('orderitem__quantity', filter=models.Q(orderitem__order__status='completed'))
-    ).order_by('stock_quantity')
+    products = inventory_products()
 
     context = {
         'products': products,
         'current_date': timezone.now(),
         'total_products_count': products.count(),
-        'total_stock_value': sum((p.stock_quantity * p.price) for p in products)
+        'total_stock_value': Product.objects.stock_value(),
     }
     return render(request, 'dashboard/inventory.html', context)
 
 @staff_member_required
 def export_reports_excel(request):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename=Reports-{datetime.now().strftime("%Y-%m-%d")}.xlsx'
+    # فترة اختيارية (من - إلى) لتصدير جزء من الطلبات فقط
+    date_from = parse_day(request.GET.get('date_from'))
+    date_to = parse_day(request.GET.get('date_to'))
+
+    # الملف يُكتب إلى ملف مؤقت على القرص ثم يُرسل على أجزاء، فلا يبقى التقرير كاملاً في الذاكرة
+    output = tempfile.TemporaryFile()
+    write_reports_workbook(output, date_from, date_to)
+    output.seek(0)
+
+    name = f'Reports-{datetime.now().strftime("%Y-%m-%d")}'
+    if date_from or date_to:
+        name += f'_{date_from or ""}_{date_to or ""}'
+    return FileResponse(
+        output, as_attachment=True, filename=f'{name}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
 
-    wb = openpyxl.Workbook()
-    ws1 = wb.active
-    ws1.title = "تقرير المبيعات"
-    ws1.sheet_view.rightToLeft = True
 
-    headers = ['رقم الطلب', 'العميل', 'التاريخ', 'الإجمالي', 'مبلغ التوصيل', 'الخصم']
-    ws1.append(headers)
-    
-    for cell in ws1[1]:
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="2563EB", end_color="2563EB", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center")
-
-    orders = Order.objects.filter(status='completed').order_by('-created_at')
-    for order in orders:
-        ws1.append([
-            order.id,
-            order.full_name,
-            order.created_at.strftime("%Y-%m-%d %H:%M"),
-            order.total_amount,
-            order.delivery_fee,
-            order.discount_amount
-        ])
-
-    ws2 = wb.create_sheet(title="جرد المخزون")
-    ws2.sheet_view.rightToLeft = True
-
-    headers_inv = ['المنتج', 'القسم', 'السعر', 'الكمية المتبقية', 'الحالة']
-    ws2.append(headers_inv)
-
-    for cell in ws2[1]:
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="198754", end_color="198754", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center")
-
-    products = Product.objects.all().order_by('stock_quantity')
-    for p in products:
-        status = "نفذت الكمية" if p.stock_quantity == 0 else "متوفر"
-        ws2.append([
-            p.name,
-            p.category.name,
-            p.final_price,
-            p.stock_quantity,
-            status
-        ])
-
-    wb.save(response)
-    return response
+
+
+# --- التقارير في الخلفية ---
+@staff_member_required
+def report_jobs(request):
+    jobs = ReportJob.objects.select_related('requested_by')[:30]
+    context = {
+        'jobs': jobs,
+        # الصفحة تتحدث تلقائياً ما دام هناك تقرير قيد التجهيز لعرض نسبة الإنجاز
+        'has_active': any(job.status in ('pending', 'running') for job in jobs),
+    }
+    return render(request, 'dashboard/report_jobs.html', context)
+
+@staff_member_required
+@require_POST
+def report_job_create(request):
+    kind = request.POST.get('kind')
+    if kind not in dict(ReportJob.KIND_CHOICES):
+        messages.error(request, "نوع التقرير غير معروف.")
+        return redirect('dashboard_report_jobs')
+
+    params = {}
+    if kind == 'sales':
+        for name in ('date_from', 'date_to'):
+            day = parse_day(request.POST.get(name))
+            if day:
+                params[name] = day.isoformat()
+
+    job, created = request_report(kind, params, request.user)
+    if created:
+        messages.success(request, "تمت إضافة التقرير لقائمة التجهيز، سيظهر رابط التحميل عند اكتماله.")
+    else:
+        messages.info(request, "هذا التقرير مطلوب مسبقاً ولم تتغير البيانات بعده، يمكنك استخدامه مباشرة.")
+    return redirect('dashboard_report_jobs')
+
+@staff_member_required
+def report_job_download(request, pk):
+    job = get_object_or_404(ReportJob, pk=pk, status='done')
+    if not job.file:
+        raise Http404
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=f'{job.kind}-{job.created_at:%Y-%m-%d}.xlsx')
 
 
 
@@ -377,10 +489,10 @@ def delete_product_image(request, image_id):
 def delete_main_image(request, pk):
     product = get_object_or_404(Product, pk=pk)
     
-    # حذف الصورة من الملفات إذا كانت موجودة
+    # تفريغ الحقل فقط (الحقل لا يقبل NULL): الملف يُحذف عند عدم استخدامه من أي سجل آخر
+    # (عدّ المراجع في store/media_refs.py، والصور القديمة عبر collect_media)
     if product.main_image:
-        product.main_image.delete(save=False)
-        product.main_image = None # تفريغ الحقل في قاعدة البيانات
+        product.main_image = ''
         product.save()
         messages.success(request, "تم حذف الصورة الرئيسية للمنتج.")
     
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, Order, OrderItem, Coupon, Review, Profile
+from .models import Category, Product, Order, OrderItem, Coupon, Review, Profile, Notification
 
 # تسجيل الفئات
 @admin.register(Category)
@@ -40,4 +40,13 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ('rating', 'created_at')
 
 # تسجيل البروفايل
-admin.site.register(Profile)
\ No newline at end of file
+admin.site.register(Profile)
+
+# طابور الإشعارات (للمتابعة فقط، الإرسال يتم عبر send_notifications)
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'channel', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('channel', 'status')
+    # المحتوى (العناوين ونص الرسائل) لا يظهر للموظفين
+    fields = ('channel', 'status', 'attempts', 'next_attempt_at', 'last_error', 'created_at', 'sent_at')
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'sent_at')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        # تسجيل إشارات إبطال كاش الكتالوج وتحديث فهرس البحث ودمج السلة عند تسجيل الدخول وتوليد نسخ الصور وعدّ مراجع الملفات
+        from . import cart, catalog_cache, images, media_refs, search  # noqa: F401
@@ -1,35 +1,45 @@
+from collections import namedtuple
 from decimal import Decimal
 from django.conf import settings
+from django.db import models
+from django.utils.functional import cached_property
 from .models import Product, CartItem, Coupon
-import copy
 from django.utils import timezone
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+CartSummary = namedtuple('CartSummary', ['count', 'subtotal', 'coupon', 'discount', 'total'])
+
 
 class Cart:
-    def __init__(self, request):
+    def __init__(self, request, user=None):
         self.session = request.session
         self.request = request
-        cart = self.session.get('cart_session_id')
-        if not cart:
-            cart = self.session['cart_session_id'] = {}
-        self.cart = cart
+        # المستخدم يمرر صراحة عند تسجيل الدخول (قبل أن يُربط بالطلب في بعض الحالات)
+        self.user = user if user is not None else request.user
+        # لا نضيف مفتاح السلة للجلسة إلا عند أول تعديل، حتى لا تُكتب الجلسة في كل صفحة
+        self.cart = self.session.get('cart_session_id', {})
         
         # كود الكوبون
         self.coupon_id = self.session.get('coupon_id')
 
-        # إذا كان المستخدم مسجلاً، قم بجلب السلة من قاعدة البيانات ودمجها
-        if self.request.user.is_authenticated:
-            self.merge_db_cart()
-
     def merge_db_cart(self):
-        db_items = CartItem.objects.filter(user=self.request.user)
+        """دمج السلة المحفوظة في قاعدة البيانات مع سلة الجلسة (مرة واحدة عند تسجيل الدخول)"""
+        db_items = CartItem.objects.filter(user=self.user).select_related('product')
+        db_product_ids = set()
         for item in db_items:
-            product_id = str(item.product.id)
+            product_id = str(item.product_id)
+            db_product_ids.add(product_id)
             if product_id not in self.cart:
                 self.cart[product_id] = {
                     'quantity': item.quantity, 
                     'price': str(item.product.final_price)
                 }
-        self.save_session()
+        if self.cart:
+            self.save_session()
+        # منتجات أضيفت قبل تسجيل الدخول تُحفظ في حساب المستخدم أيضاً
+        if set(self.cart) - db_product_ids:
+            self.sync_db()
 
     def add(self, product, quantity=1, update_quantity=False):
         product_id = str(product.id)
@@ -50,77 +60,115 @@ class Cart:
             self.save()
 
     def save(self):
+        self.reset()
         self.save_session()
-        if self.request.user.is_authenticated:
+        if self.user.is_authenticated:
             self.sync_db()
 
     def save_session(self):
+        self.session['cart_session_id'] = self.cart
         self.session.modified = True
 
     def sync_db(self):
-        user = self.request.user
-        current_product_ids = []
-        for product_id, item_data in self.cart.items():
-            current_product_ids.append(product_id)
-            product = Product.objects.get(id=product_id)
-            cart_item, created = CartItem.objects.get_or_create(
-                user=user, 
-                product=product
+        """حفظ السلة في حساب المستخدم بعدد ثابت من الاستعلامات مهما كان عدد المنتجات"""
+        user = self.user
+        saved = CartItem.objects.filter(user=user, product=models.OuterRef('pk')).values('quantity')[:1]
+        # استعلام واحد يعطينا المنتجات الموجودة فعلاً والكمية المحفوظة لكل منها
+        products = Product.objects.filter(id__in=self.cart.keys()).annotate(saved_quantity=models.Subquery(saved))
+        changed = [
+            CartItem(user=user, product_id=product_id, quantity=self.cart[str(product_id)]['quantity'])
+            for product_id, saved_quantity in products.values_list('id', 'saved_quantity')
+            if saved_quantity != self.cart[str(product_id)]['quantity']
+        ]
+        if changed:
+            CartItem.objects.bulk_create(
+                changed, update_conflicts=True, unique_fields=['user', 'product'], update_fields=['quantity'],
             )
-            cart_item.quantity = item_data['quantity']
-            cart_item.save()
-        CartItem.objects.filter(user=user).exclude(product__id__in=current_product_ids).delete()
+        CartItem.objects.filter(user=user).exclude(product_id__in=self.cart.keys()).delete()
+
+    @cached_property
+    def items(self):
+        """أسطر السلة مع منتجاتها، تُحمّل مرة واحدة في الطلب وتُستخدم في كل تكرار"""
+        products = Product.objects.in_bulk(self.cart.keys())
+        items, stale = [], []
+        for product_id, data in self.cart.items():
+            product = products.get(int(product_id))
+            if product is None:
+                # منتج حُذف بعد إضافته للسلة
+                stale.append(product_id)
+                continue
+            price = Decimal(data['price'])
+            items.append({
+                'product': product,
+                'quantity': data['quantity'],
+                'price': price,
+                'total_price': price * data['quantity'],
+            })
+        if stale:
+            # نحذفه من الجلسة أيضاً حتى لا يبقى في عدد القطع (سطر السلة المحفوظ حُذف مع المنتج)
+            for product_id in stale:
+                del self.cart[product_id]
+            self.save_session()
+        return items
 
     def __iter__(self):
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        # نستخدم deepcopy لتجنب خطأ JSON
-        cart_copy = copy.deepcopy(self.cart)
-
-        for product in products:
-            cart_copy[str(product.id)]['product'] = product
-        
-        for item in cart_copy.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        return iter(self.items)
 
     def __len__(self):
         return sum(item['quantity'] for item in self.cart.values())
 
     # --- الدوال الحسابية (تأكد من وجودها) ---
 
-    def get_total_price(self):
-        """حساب مجموع المنتجات قبل الخصم"""
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
-
-    @property
+    @cached_property
     def coupon(self):
-        """جلب الكوبون الحالي"""
+        """جلب الكوبون الحالي (استعلام واحد في الطلب مهما تكرر الاستخدام)"""
         if self.coupon_id:
-            try:
-                return Coupon.objects.get(id=self.coupon_id)
-            except Coupon.DoesNotExist:
-                pass
+            return Coupon.objects.filter(id=self.coupon_id).first()
         return None
 
+    @cached_property
+    def summary(self):
+        """ملخص السلة محسوب مرة واحدة: عدد القطع، المجموع، الخصم، المجموع بعد الخصم"""
+        # من نفس الأسطر المعروضة (items) وليس من الجلسة مباشرة، فالمنتج المحذوف لا يدخل المجموع
+        items = self.items
+        subtotal = sum((item['total_price'] for item in items), Decimal(0))
+        coupon = self.coupon
+        discount = (coupon.discount / Decimal(100)) * subtotal if coupon else Decimal(0)
+        count = sum(item['quantity'] for item in items)
+        return CartSummary(count, subtotal, coupon, discount, subtotal - discount)
+
+    def get_total_price(self):
+        """حساب مجموع المنتجات قبل الخصم"""
+        return self.summary.subtotal
+
     def get_discount(self):
         """حساب قيمة الخصم"""
-        if self.coupon:
-            return (self.coupon.discount / Decimal(100)) * self.get_total_price()
-        return Decimal(0)
+        return self.summary.discount
 
     def get_total_price_after_discount(self):
         """حساب المجموع النهائي بعد الخصم"""
-        return self.get_total_price() - self.get_discount()
-        
+        return self.summary.total
+
+    def reset(self):
+        # بعد أي تعديل على السلة نحذف القيم المحسوبة لتُعاد عند أول استخدام
+        for name in ('items', 'coupon', 'summary'):
+            self.__dict__.pop(name, None)
+
     def clear(self):
         """تفريغ السلة تماماً"""
         if 'coupon_id' in self.session:
             del self.session['coupon_id']
             
-        del self.session['cart_session_id']
-        self.save_session()
+        self.session.pop('cart_session_id', None)
+        self.cart = {}
+        self.coupon_id = None
+        self.reset()
         
-        if self.request.user.is_authenticated:
-            CartItem.objects.filter(user=self.request.user).delete()
\ No newline at end of file
+        if self.user.is_authenticated:
+            CartItem.objects.filter(user=self.user).delete()
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        Cart(request, user).merge_db_cart()
@@ -0,0 +1,74 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import CacheVersion, Product, Category, HomeSection, ProductImage, Review
+
+# --- رقم نسخة الكتالوج ---
+# كل مقاطع القوالب المخزنة (شبكات المنتجات، سكشنات الرئيسية...) تدخل هذا الرقم في مفتاحها،
+# فأي تعديل على المنتجات أو الفئات يرفع الرقم وتصبح كل المقاطع القديمة غير مستخدمة تلقائياً.
+# الرقم في جدول CacheVersion حتى يصل لكل عمّال WSGI (المقاطع نفسها يمكن أن تبقى في كاش محلي لكل عامل)
+CATALOG_VERSION = 'catalog'
+
+
+def get_version(name):
+    version = CacheVersion.objects.filter(name=name).values_list('value', flat=True).first()
+    if version is None:
+        # نبدأ من الوقت الحالي (وليس 1) حتى لا نعود لرقم قديم إذا حُذف السطر والمقاطع القديمة ما زالت في الكاش
+        version = CacheVersion.objects.get_or_create(name=name, defaults={'value': time.time_ns() // 1000})[0].value
+    return version
+
+
+def bump_version(name):
+    if not CacheVersion.objects.filter(name=name).update(value=F('value') + 1):
+        get_version(name)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION)
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=HomeSection)
+@receiver(post_delete, sender=HomeSection)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+def cached_count(queryset):
+    # عدد نتائج الاستعلام مخزن حسب نص الاستعلام ونسخة الكتالوج (يتجدد تلقائياً عند أي تعديل)
+    signature = hashlib.md5(str(queryset.query).encode()).hexdigest()
+    key = f'catalog:count:{get_catalog_version()}:{signature}'
+    return cache.get_or_set(key, queryset.count, settings.CATALOG_CACHE_TIMEOUT)
+
+
+def catalog_cache_context():
+    # دالة تُمرر للقالب (وليس نتيجتها)، فلا يُقرأ الرقم إلا في الصفحات التي تستخدم المقاطع المخزنة،
+    # ومرة واحدة فقط في الطلب مهما كان عدد المقاطع
+    version = []
+
+    def catalog_version():
+        if not version:
+            version.append(get_catalog_version())
+        return version[0]
+
+    return {
+        'catalog_version': catalog_version,
+        'catalog_cache_timeout': settings.CATALOG_CACHE_TIMEOUT,
+    }
@@ -1,13 +1,22 @@
+from django.utils.functional import SimpleLazyObject
+
 from .cart import Cart
 from .models import Category
+from .catalog_cache import catalog_cache_context
 
 
 def cart_processor(request):
-    return {'cart': Cart(request)}
+    # السلة تُنشأ فقط إذا استخدمها القالب فعلاً (صفحات لوحة التحكم مثلاً لا تلمسها)
+    return {'cart': SimpleLazyObject(lambda: Cart(request))}
 
 
 def categories_processor(request):
     # نجلب فقط الفئات الرئيسية (التي ليس لها أب)
     # ونستخدم prefetch_related لجلب الأبناء معها لتسريع الموقع
-    main_categories = Category.objects.filter(parent=None).prefetch_related('children')
-    return {'nav_categories': main_categories}
\ No newline at end of file
+    main_categories = Category.objects.filter(parent=None).prefetch_related('children__children')
+    return {'nav_categories': main_categories}
+
+
+def catalog_cache_processor(request):
+    # رقم نسخة الكتالوج ومدة التخزين لمقاطع {% cache %} في القوالب
+    return catalog_cache_context()
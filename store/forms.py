@@ -45,7 +45,7 @@ class UserRegisterForm(UserCreationForm):
         
         # --- هذا الكود هو الحل الجذري ---
         # نحدد قائمة الحقول التي نريدها فقط
-        allowed_fields = ['username', 'first_name', 'last_name', 'email', 'phone', 'password_1', 'password_2']
+        allowed_fields = ['username', 'first_name', 'last_name', 'email', 'phone', 'password1', 'password2']
         
         # نقوم بحذف أي حقل موجود في النموذج ولكنه غير موجود في قائمتنا
         # هذا سيحذف الحقل المزعج "Password-based authentication" أياً كان مصدره
@@ -55,15 +55,15 @@ class UserRegisterForm(UserCreationForm):
         # -------------------------------
 
         # تحسين مظهر حقول كلمة المرور (لأنها تأتي من UserCreationForm)
-        if 'password_1' in self.fields:
-            self.fields['password_1'].widget.attrs.update({'class': 'form-control'})
-            self.fields['password_1'].label = "كلمة المرور"
-            self.fields['password_1'].help_text = None # حذف نصوص المساعدة المزعجة
+        if 'password1' in self.fields:
+            self.fields['password1'].widget.attrs.update({'class': 'form-control'})
+            self.fields['password1'].label = "كلمة المرور"
+            self.fields['password1'].help_text = None # حذف نصوص المساعدة المزعجة
             
-        if 'password_2' in self.fields:
-            self.fields['password_2'].widget.attrs.update({'class': 'form-control'})
-            self.fields['password_2'].label = "تأكيد كلمة المرور"
-            self.fields['password_2'].help_text = None
+        if 'password2' in self.fields:
+            self.fields['password2'].widget.attrs.update({'class': 'form-control'})
+            self.fields['password2'].label = "تأكيد كلمة المرور"
+            self.fields['password2'].help_text = None
 
     # التحقق من الإيميل
     def clean_email(self):
@@ -0,0 +1,263 @@
+import bisect
+import re
+import sys
+import threading
+from array import array
+from datetime import timedelta
+
+from django.utils import timezone
+from rapidfuzz import fuzz, process
+
+from .catalog_cache import get_catalog_version
+from .models import Product
+from .search import WORD, normalize_arabic, strip_article
+
+# --- فهرس الأسماء في الذاكرة (الإكمال التلقائي + البحث المتسامح مع الأخطاء) ---
+# كل عامل WSGI يحمل نسخته الخاصة، ويتحقق قبل كل استخدام من رقم نسخة الكتالوج المشترك
+# (catalog_cache)؛ إذا تغير الرقم يجلب فقط المنتجات التي تعدلت منذ آخر مزامنة.
+# المقارنة التقريبية تتم على مفردات الأسماء (بضعة آلاف كلمة) وليس على كل المنتجات.
+# القراءة والمزامنة تحت نفس القفل: المزامنة تعدّل القوائم في مكانها، وقراءة متزامنة معها قد ترى
+# مفردات بدون مواقعها أو موقعاً أعيد استخدامه لمنتج آخر
+# الحذف لا يترك أثراً في updated_at، فيُكتشف بمقارنة كل الأرقام النشطة، وهذه المقارنة لا تتكرر مع كل
+# رفع لنسخة الكتالوج (كل طلب يرفعها) بل مرة كل RECONCILE_SECONDS. المنتج المحذوف يبقى في الفهرس حتى
+# ذلك الحين بلا ضرر: النتائج تُجلب من قاعدة البيانات بأرقامها فلا يظهر منها إلا الموجود
+RECONCILE_SECONDS = 300
+
+# تقريب صوتي للحروف العربية بالحروف اللاتينية، لمقارنة "سامسونج" مع "samsung"
+ARABIC_TO_LATIN = str.maketrans({
+    'ا': 'a', 'ب': 'b', 'ت': 't', 'ث': 's', 'ج': 'g', 'ح': 'h', 'خ': 'k', 'د': 'd', 'ذ': 'z',
+    'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 's', 'ص': 's', 'ض': 'd', 'ط': 't', 'ظ': 'z', 'ع': 'a',
+    'غ': 'g', 'ف': 'f', 'ق': 'k', 'ك': 'k', 'ل': 'l', 'م': 'm', 'ن': 'n', 'ه': 'h', 'و': 'w',
+    'ي': 'y', 'پ': 'p', 'چ': 'c', 'ڤ': 'v', 'گ': 'g',
+})
+LATIN_SOUNDS = (
+    ('ph', 'f'), ('sh', 's'), ('ch', 's'), ('ck', 'k'), ('c', 'k'), ('q', 'k'),
+    ('x', 'ks'), ('v', 'f'), ('j', 'g'), ('p', 'b'),
+)
+VOWELS = str.maketrans('', '', 'aeiouwy')
+DOUBLED = re.compile(r'(.)\1+')
+DIGIT = re.compile(r'\d')
+
+
+def skeleton(word):
+    """الهيكل الساكن للكلمة بحروف لاتينية: iphone و ايفون كلاهما fn، و dell و ديل كلاهما dl"""
+    word = word.translate(ARABIC_TO_LATIN)
+    for sound, replacement in LATIN_SOUNDS:
+        word = word.replace(sound, replacement)
+    return DOUBLED.sub(r'\1', word.translate(VOWELS))
+
+
+def is_spelled(word):
+    # أرقام الموديلات والمقاسات لا معنى لمقارنتها تقريبياً ("128" ليست خطأً إملائياً لـ "126")
+    return not DIGIT.search(word)
+
+
+def name_words(key):
+    # كلمات الاسم الموحّد، والكلمة المعرّفة تُضاف بصيغتيها ("الالعاب" و "العاب")
+    words = set()
+    for word in WORD.findall(key):
+        words.add(word)
+        words.add(strip_article(word))
+    return words
+
+
+class ProductNameIndex:
+    # فهرس مقلوب (كلمة -> مواقع المنتجات) بمصفوفات أرقام بدلاً من كائن لكل منتج لتقليل الذاكرة.
+    # أسماء العرض والروابط لا تُحفظ هنا، بل تُجلب من قاعدة البيانات للنتائج الظاهرة فقط
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.synced_at = None
+        self.reconciled_at = None
+        self.ids = array('q')  # موقع -> رقم المنتج (0 = محذوف)
+        self.keys = []         # موقع -> الاسم الموحّد
+        self.positions = {}    # رقم المنتج -> موقعه
+        self.free = []         # مواقع محذوفة يعاد استخدامها
+        self.postings = {}     # كلمة -> مواقع المنتجات التي تحتويها
+        self.vocab = []        # المفردات مرتبة للبحث بالبادئة
+        self.spelling = []     # المفردات بدون أرقام، وهي فقط ما تتم مقارنته تقريبياً
+        self.skeletons = {}    # هيكل لاتيني -> المفردات التي تطابقه
+
+    # --- المزامنة مع قاعدة البيانات ---
+    def sync(self):
+        version = get_catalog_version()
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            started = timezone.now()
+            if self.synced_at is None:
+                self.load()
+                self.reconciled_at = started
+            else:
+                self.refresh()
+                if started - self.reconciled_at >= timedelta(seconds=RECONCILE_SECONDS):
+                    self.reconcile()
+                    self.reconciled_at = started
+            self.synced_at = started
+            self.version = version
+
+    def load(self):
+        # التحميل الأول: نرتب المفردات مرة واحدة في النهاية بدلاً من إدراج كل كلمة في مكانها
+        for product_id, name in Product.objects.filter(is_active=True).values_list('id', 'name'):
+            self.put(product_id, name, ordered=False)
+        self.vocab = sorted(self.postings)
+        self.spelling = [word for word in self.vocab if is_spelled(word)]
+
+    def refresh(self):
+        # المنتجات المعدلة منذ آخر مزامنة (مع هامش بسيط لاختلاف الساعات بين العمليات)
+        since = self.synced_at - timedelta(seconds=5)
+        changed = Product.objects.filter(updated_at__gte=since).values_list('id', 'name', 'is_active')
+        for product_id, name, is_active in changed:
+            if is_active:
+                self.put(product_id, name)
+            else:
+                self.drop(product_id)
+
+    def reconcile(self):
+        # إسقاط المنتجات المحذوفة: مقارنة قائمة الأرقام فقط
+        active_ids = set(Product.objects.filter(is_active=True).values_list('id', flat=True))
+        for product_id in set(self.positions) - active_ids:
+            self.drop(product_id)
+
+    def put(self, product_id, name, ordered=True):
+        key = normalize_arabic(name)
+        position = self.positions.get(product_id)
+        if position is not None:
+            if self.keys[position] == key:
+                return
+            self.unlink(position)
+        elif self.free:
+            position = self.free.pop()
+            self.ids[position] = product_id
+        else:
+            position = len(self.ids)
+            self.ids.append(product_id)
+            self.keys.append(None)
+        self.positions[product_id] = position
+        self.keys[position] = key
+        for word in name_words(key):
+            postings = self.postings.get(word)
+            if postings is None:
+                # نفس الكلمة تتكرر في آلاف الأسماء، فنحفظ نسخة واحدة منها
+                word = sys.intern(word)
+                postings = self.postings[word] = array('l')
+                if ordered:
+                    bisect.insort(self.vocab, word)
+                if is_spelled(word):
+                    if ordered:
+                        bisect.insort(self.spelling, word)
+                    self.skeletons.setdefault(skeleton(word), set()).add(word)
+            postings.append(position)
+
+    def drop(self, product_id):
+        position = self.positions.pop(product_id, None)
+        if position is not None:
+            self.unlink(position)
+            self.ids[position] = 0
+            self.keys[position] = None
+            self.free.append(position)
+
+    def unlink(self, position):
+        for word in name_words(self.keys[position]):
+            postings = self.postings[word]
+            postings.remove(position)
+            if postings:
+                continue
+            del self.postings[word]
+            del self.vocab[bisect.bisect_left(self.vocab, word)]
+            if not is_spelled(word):
+                continue
+            del self.spelling[bisect.bisect_left(self.spelling, word)]
+            similar = self.skeletons[skeleton(word)]
+            similar.discard(word)
+            if not similar:
+                del self.skeletons[skeleton(word)]
+
+    # --- البحث ---
+    def containing(self, words):
+        # مواقع المنتجات التي تحتوي كل الكلمات (بأي من صيغتيها)
+        result = None
+        for word in words:
+            found = set(self.postings.get(word, ())).union(self.postings.get(strip_article(word), ()))
+            result = found if result is None else result & found
+            if not result:
+                break
+        return result
+
+    def prefix(self, query, limit):
+        # الكلمات المكتملة يجب أن توجد في الاسم، وآخر كلمة (التي ما زالت تُكتب) تطابق بداية كلمة
+        words = WORD.findall(normalize_arabic(query))
+        if not words:
+            return []
+        required = self.containing(words[:-1]) if len(words) > 1 else None
+        if required is not None and not required:
+            return []
+        found = {}
+        for last in dict.fromkeys((words[-1], strip_article(words[-1]))):
+            for i in range(bisect.bisect_left(self.vocab, last), len(self.vocab)):
+                word = self.vocab[i]
+                if not word.startswith(last):
+                    break
+                for position in self.postings[word]:
+                    if required is None or position in required:
+                        found[position] = True
+                        if len(found) >= limit:
+                            return list(found)
+        return list(found)
+
+    def similar_words(self, word):
+        # مفردات قريبة إملائياً، أو بنفس الهيكل الصوتي بالحرف الآخر (عربي/لاتيني)
+        scores = {}
+        if len(word) >= 3:
+            for match, score, _ in process.extract(word, self.spelling, scorer=fuzz.ratio, score_cutoff=75, limit=10):
+                scores[match] = score
+        word_skeleton = skeleton(word)
+        if len(word_skeleton) >= 2:
+            for match in self.skeletons.get(word_skeleton, ()):
+                scores[match] = max(scores.get(match, 0), 90)
+        if len(word_skeleton) >= 4:
+            # هيكل طويل يتحمل حرفاً زائداً أو ناقصاً ("سامسنغ" مقابل samsung)
+            for similar, score, _ in process.extract(word_skeleton, list(self.skeletons), scorer=fuzz.ratio, score_cutoff=80, limit=5):
+                for match in self.skeletons[similar]:
+                    scores[match] = max(scores.get(match, 0), score * 0.9)
+        return scores
+
+    def fuzzy(self, query, limit):
+        # كل كلمة في البحث يجب أن تقارب كلمة في الاسم، والترتيب حسب مجموع درجات التشابه
+        totals = None
+        for word in WORD.findall(normalize_arabic(query)):
+            scores = {}
+            for match, score in self.similar_words(word).items():
+                for position in self.postings.get(match, ()):
+                    if score > scores.get(position, 0):
+                        scores[position] = score
+            if totals is not None:
+                scores = {position: totals[position] + score for position, score in scores.items() if position in totals}
+            totals = scores
+            if not totals:
+                return []
+        if not totals:
+            return []
+        return sorted(totals, key=lambda position: (-totals[position], -self.ids[position]))[:limit]
+
+    def autocomplete(self, query, limit=8):
+        """أسماء وروابط أقرب المنتجات لما كُتب حتى الآن"""
+        self.sync()
+        with self.lock:
+            positions = self.prefix(query, limit)
+            if len(positions) < limit:
+                positions += [p for p in self.fuzzy(query, limit) if p not in positions][:limit - len(positions)]
+            ids = [self.ids[p] for p in positions]
+        products = {p['id']: p for p in Product.objects.filter(id__in=ids).values('id', 'name', 'slug')}
+        return [products[product_id] for product_id in ids if product_id in products]
+
+    def suggest_ids(self, query, limit=48):
+        """أرقام أقرب المنتجات لبحث لم يطابق شيئاً"""
+        self.sync()
+        with self.lock:
+            return [self.ids[p] for p in self.fuzzy(query, limit)]
+
+
+product_names = ProductNameIndex()
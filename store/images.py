@@ -0,0 +1,199 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.db.models.signals import post_save
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .catalog_cache import bump_catalog_version
+from .models import Category, Product, ProductImage
+
+try:
+    # دعم AVIF اختياري (pillow-avif-plugin)، بدونه نولّد WebP فقط
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# --- نسخ الصور المصغرة ---
+# عند حفظ صورة منتج أو قسم نولّد منها نسخاً بمقاسات ثابتة (WebP، و AVIF إن توفر، و JPEG للمتصفحات القديمة)
+# في مسار محسوب من اسم الأصل: variants/<مسار الصورة بدون الامتداد>/<المقاس>.<الصيغة>
+# فيعرف القالب روابطها بدون أي استعلام، والوسم {% picture %} يختار منها حسب عرض العنصر
+VARIANTS_DIR = 'variants'
+PRESETS = {  # الاسم -> أقصى عرض/ارتفاع بالبكسل (مع الحفاظ على النسبة)
+    'thumb': 96,
+    'card': 400,
+    'large': 1000,
+}
+QUALITY = {'avif': 55, 'webp': 78, 'jpg': 82}
+CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpg': 'image/jpeg'}
+IMAGE_FIELDS = (
+    (Product, 'main_image'),
+    (ProductImage, 'image'),
+    (Category, 'image'),
+)
+
+
+def modern_formats():
+    extensions = Image.registered_extensions()
+    return [fmt for fmt in ('avif', 'webp') if f'.{fmt}' in extensions]
+
+
+def variant_name(name, preset, fmt):
+    return f"{VARIANTS_DIR}/{os.path.splitext(name)[0]}/{preset}.{fmt}"
+
+
+def marker_name(name):
+    # JPEG لأكبر مقاس يُكتب آخر ملف (generate_variants)، فوجوده يعني اكتمال كل النسخ
+    return variant_name(name, 'large', 'jpg')
+
+
+def has_variants(name):
+    return default_storage.exists(marker_name(name))
+
+
+def flatten(image):
+    """صورة RGB جاهزة لـ JPEG: الشفافية تُدمج على خلفية بيضاء (مثل خلفية بطاقات المتجر)"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def encode(image, fmt):
+    # لا نمرر exif ولا icc_profile للحفظ، فالنسخ تخرج بدون بيانات الكاميرا والموقع
+    buffer = BytesIO()
+    if fmt == 'jpg':
+        flatten(image).save(buffer, 'JPEG', quality=QUALITY['jpg'], optimize=True, progressive=True)
+    elif fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=QUALITY['webp'], method=4)
+    else:
+        image.save(buffer, fmt.upper(), quality=QUALITY[fmt])
+    return buffer.getvalue()
+
+
+def load_image(name):
+    """فتح صورة من التخزين جاهزة للتصغير (RGB أو RGBA)، أو None إذا كانت غير موجودة أو تالفة"""
+    try:
+        with default_storage.open(name, 'rb') as file:
+            image = Image.open(file)
+            image = ImageOps.exif_transpose(image)  # صور الهاتف: تطبيق اتجاه EXIF قبل التصغير
+            image.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return None
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+    return image
+
+
+def generate_variants(name, force=False):
+    """توليد كل النسخ لصورة محفوظة في التخزين. يرجع عدد الملفات المكتوبة (0 إذا كانت موجودة مسبقاً)"""
+    if not name or (not force and has_variants(name)):
+        return 0
+    original = load_image(name)
+    if original is None:
+        return 0
+
+    marker = marker_name(name)
+    if default_storage.exists(marker):
+        # إعادة التوليد: الصورة غير جاهزة حتى يُكتب الملف الأخير من جديد
+        default_storage.delete(marker)
+
+    files = []
+    # من الأكبر للأصغر: كل مقاس يُصغّر من السابق بدلاً من الأصل (أسرع بكثير للصور الكبيرة)
+    source = original
+    for preset, size in sorted(PRESETS.items(), key=lambda item: -item[1]):
+        resized = source.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        source = resized
+        for fmt in modern_formats() + ['jpg']:
+            files.append((variant_name(name, preset, fmt), encode(resized, fmt)))
+
+    # الكتابة بعد ترميز كل المقاسات، وملف العلامة آخرها: توليد جارٍ أو فشل في منتصفه لا يجعل
+    # الوسم {% picture %} يشير لمقاسات لم تُكتب بعد
+    files.sort(key=lambda item: item[0] == marker)
+    for path, data in files:
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        default_storage.save(path, ContentFile(data))
+    return len(files)
+
+
+# --- التوليد في الخلفية ---
+# فك الصورة وتصغيرها وترميزها عمل على المعالج، فيتم في مجموعة عمليات محدودة بـ IMAGE_WORKERS
+# بدلاً من داخل طلب الرفع؛ وحتى تجهز النسخ يعرض الوسم {% picture %} صورة مؤقتة
+_pool = None
+
+
+def setup_worker():
+    # مع طريقة spawn (ويندوز/ماك) تبدأ العملية بدون إعداد Django
+    if not apps.ready:
+        django.setup()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS, initializer=setup_worker)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def variants_ready(future):
+    # يُستدعى في خيط المجمّع داخل العملية الرئيسية: المقاطع المخزنة ما زالت تعرض الصورة المؤقتة
+    # لا أحد ينتظر هذا الخيط، فالخطأ يُسجل ولا يُرفع، واتصال القاعدة الذي فتحه الخيط يُغلق بعده
+    if future.cancelled() or future.exception() is not None or not future.result():
+        return
+    try:
+        bump_catalog_version()
+    except Exception:
+        logger.exception("variants ready but catalog version bump failed")
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(name):
+    """توليد نسخ صورة محفوظة: في الخلفية إن كان IMAGE_WORKERS أكبر من صفر، وإلا فوراً"""
+    if not name or has_variants(name) or not default_storage.exists(name):
+        return None
+    if not settings.IMAGE_WORKERS:
+        return generate_variants(name)
+    future = get_pool().submit(generate_variants, name)
+    future.add_done_callback(variants_ready)
+    return future
+
+
+def generate_all(names, workers, force=False):
+    """توليد نسخ عدة صور بعدد عمليات محدد (للأوامر). يرجع عدد الصور التي كُتبت نسخها"""
+    if workers < 1:
+        return sum(1 for name in names if generate_variants(name, force))
+    with ProcessPoolExecutor(max_workers=workers, initializer=setup_worker) as pool:
+        return sum(1 for written in pool.map(generate_variants, names, [force] * len(names)) if written)
+
+
+def variants_on_save(field_name):
+    def handler(sender, instance, raw=False, **kwargs):
+        if not raw:
+            schedule_variants(getattr(instance, field_name).name)
+    return handler
+
+
+for model, field_name in IMAGE_FIELDS:
+    post_save.connect(variants_on_save(field_name), sender=model, weak=False,
+                      dispatch_uid=f'image_variants_save_{model.__name__}')
@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from store.models import Category, Product
+
+
+# نفس الدالة التكرارية القديمة (قبل جدول الإغلاق) للمقارنة فقط
+def recursive_children(category):
+    categories = [category]
+    for child in category.children.all():
+        categories.extend(recursive_children(child))
+    return categories
+
+
+class Command(BaseCommand):
+    help = "قياس عدد الاستعلامات والزمن لجلب منتجات فئة مع كل أبنائها (تكرار مقابل جدول الإغلاق)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=2000)
+        parser.add_argument('--levels', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # كل شيء داخل معاملة يتم التراجع عنها، فلا تتأثر بيانات المتجر
+        with transaction.atomic():
+            root = self.build_tree(options['nodes'], options['levels'])
+            self.run('recursive', lambda: self.list_products(recursive_children(root)), options['repeat'])
+            self.run('closure', lambda: self.list_products(root.get_descendants()), options['repeat'])
+            transaction.set_rollback(True)
+
+    def build_tree(self, nodes, levels):
+        # توزيع العقد على المستويات بحيث يتضاعف العرض في كل مستوى
+        weights = [4 ** level for level in range(levels - 1)]
+        sizes = [1] + [max(1, (nodes - 1) * w // sum(weights)) for w in weights]
+        sizes[-1] += nodes - sum(sizes)
+
+        root = Category.objects.create(name='bench-root', slug='bench-root-0')
+        previous, counter = [root], 1
+        for size in sizes[1:]:
+            current = []
+            for i in range(size):
+                current.append(Category.objects.create(
+                    name=f'bench-{counter}', slug=f'bench-node-{counter}', parent=previous[i % len(previous)]
+                ))
+                counter += 1
+            previous = current
+
+        Product.objects.bulk_create([
+            Product(category=c, name=f'bench-product-{c.pk}', slug=f'bench-product-{c.pk}',
+                    description='-', price=1000, main_image='products/bench.jpg')
+            for c in previous
+        ])
+        self.stdout.write(f"tree: {counter} nodes, levels: {' / '.join(str(s) for s in sizes)}")
+        return root
+
+    def list_products(self, categories):
+        return list(Product.objects.filter(is_active=True, category__in=categories).values_list('id', flat=True))
+
+    def run(self, label, fn, repeat):
+        timings, queries = [], []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        for _ in range(repeat):
+            queries.clear()
+            with connection.execute_wrapper(count_query):
+                start = time.perf_counter()
+                count = len(fn())
+                timings.append(time.perf_counter() - start)
+        self.stdout.write(
+            f"{label:>10}: {len(queries):>5} queries, "
+            f"best {min(timings) * 1000:.1f} ms, products {count}"
+        )
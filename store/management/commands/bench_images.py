@@ -0,0 +1,58 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image, ImageDraw, ImageFilter
+
+from store.images import VARIANTS_DIR, generate_all
+
+
+def photo(rng, width, height):
+    """صورة تشبه صور المنتجات من الهاتف: تدرج وأشكال وضوضاء (حتى لا يكون الترميز سهلاً بشكل غير واقعي)"""
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for _ in range(30):
+        x, y = rng.randrange(width), rng.randrange(height)
+        r = rng.randrange(50, 600)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    noise = Image.effect_noise((width, height), 40).convert('RGB')
+    return Image.blend(image.filter(ImageFilter.GaussianBlur(2)), noise, 0.15)
+
+
+class Command(BaseCommand):
+    help = "قياس سرعة توليد نسخ الصور (صورة/ثانية) بعدد عمليات 1 و 4 وعدد أنوية الجهاز"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=48)
+        parser.add_argument('--size', default='3000x2000', help="أبعاد الصور الأصلية")
+
+    def handle(self, *args, **options):
+        width, height = map(int, options['size'].split('x'))
+        media = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media):
+                names = self.build_images(options['images'], width, height)
+                for workers in sorted({1, 4, os.cpu_count() or 1}):
+                    shutil.rmtree(os.path.join(media, VARIANTS_DIR), ignore_errors=True)
+                    start = time.perf_counter()
+                    generate_all(names, workers)
+                    seconds = time.perf_counter() - start
+                    self.stdout.write(f"workers={workers:<3} {len(names) / seconds:6.1f} images/s ({seconds:.1f}s)")
+        finally:
+            shutil.rmtree(media, ignore_errors=True)
+
+    def build_images(self, count, width, height):
+        rng = random.Random(42)
+        buffer = BytesIO()
+        photo(rng, width, height).save(buffer, 'JPEG', quality=90)
+        # نفس المحتوى بأسماء مختلفة: الترميز هو ما نقيسه وليس توليد الصور
+        names = [default_storage.save(f'products/bench-{i}.jpg', ContentFile(buffer.getvalue())) for i in range(count)]
+        self.stdout.write(f"{count} images {width}x{height}, {len(buffer.getvalue()) // 1024} KB each, cpus={os.cpu_count()}")
+        return names
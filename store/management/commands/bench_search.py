@@ -0,0 +1,73 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Category, Product
+from store.pagination import KeysetPage
+from store.search import rebuild_index, search_products
+
+TYPES = ['لابتوب', 'هاتف', 'شاشة', 'سماعة', 'شاحن', 'كاميرا', 'طابعة', 'راوتر', 'ذاكرة', 'معالج',
+         'ماوس', 'كيبورد', 'تابلت', 'ساعة', 'مكبر', 'قرص', 'بطارية', 'كابل', 'حقيبة', 'مروحة']
+ADJECTIVES = ['أسود', 'أبيض', 'ذكية', 'لاسلكية', 'محمولة', 'إضافية', 'سريعة', 'ألعاب', 'مكتبية', 'منزلية']
+BRANDS = ['samsung', 'apple', 'lenovo', 'dell', 'hp', 'xiaomi', 'huawei', 'asus', 'sony', 'anker']
+MODELS = ['pro', 'max', 'ultra', 'mini', 'plus', 'lite', 'air', 'neo', 'x', 's', 'gaming', 'wireless', 'usb', 'hdmi', '5g']
+# مفردات عامة للوصف حتى لا تطابق كلمات البحث نصف الكتالوج
+FILLER = [f'وصف{i}' for i in range(3000)]
+# صيغ بحث يكتبها الزبائن بإملاء مختلف عن المخزن (همزات، ياء/ألف مقصورة، تاء مربوطة، تشكيل)
+QUERIES = ['لابتوب', 'اسود', 'ذكيه', 'لاسلكيه', 'سَمّاعة', 'العاب', 'samsung', 'apple pro', 'شاشة ألعاب', 'راوتر 5g']
+
+
+class Command(BaseCommand):
+    help = "مقارنة زمن البحث (p95) بين name__icontains وفهرس FTS5 على كتالوج كبير"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--runs', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.build_catalog(options['products'])
+            self.run('icontains', self.icontains_page, options['runs'])
+            self.run('fts5', self.fts_page, options['runs'])
+            transaction.set_rollback(True)
+
+    def build_catalog(self, count):
+        rng = random.Random(42)
+        categories = [Category.objects.create(name=f'قسم {i}', slug=f'bench-search-{i}') for i in range(20)]
+        start = time.perf_counter()
+        Product.objects.bulk_create((
+            Product(
+                category=rng.choice(categories),
+                name=f'{rng.choice(TYPES)} {rng.choice(BRANDS)} {rng.choice(MODELS)} {rng.choice(ADJECTIVES)}',
+                slug=f'bench-search-product-{i}',
+                description=' '.join(rng.choices(FILLER, k=28) + [rng.choice(TYPES), rng.choice(ADJECTIVES)]),
+                price=rng.randint(10, 2000) * 1000,
+                main_image='products/bench.jpg',
+            ) for i in range(count)
+        ), batch_size=2000)
+        rebuild_index()
+        self.stdout.write(f"catalog: {count} products indexed in {time.perf_counter() - start:.1f}s")
+
+    def icontains_page(self, query):
+        products = Product.objects.filter(is_active=True, name__icontains=query)
+        return KeysetPage(products, ('-created_at', '-id')).object_list
+
+    def fts_page(self, query):
+        products, ordering = search_products(Product.objects.filter(is_active=True), query)
+        return KeysetPage(products, ordering or ('-created_at', '-id')).object_list
+
+    def run(self, label, fn, runs):
+        timings, hits = [], 0
+        for _ in range(runs):
+            for query in QUERIES:
+                start = time.perf_counter()
+                hits += bool(fn(query))
+                timings.append((time.perf_counter() - start) * 1000)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        self.stdout.write(
+            f"{label:>10}: p50 {statistics.median(timings):.1f} ms, p95 {p95:.1f} ms, "
+            f"queries with results {hits // runs}/{len(QUERIES)}"
+        )
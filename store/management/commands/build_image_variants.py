@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from store.catalog_cache import bump_catalog_version
+from store.images import IMAGE_FIELDS, generate_all, modern_formats, variant_name
+
+
+def image_names():
+    names = set()
+    for model, field_name in IMAGE_FIELDS:
+        names.update(model.objects.exclude(**{field_name: ''}).values_list(field_name, flat=True))
+    return sorted(names)
+
+
+class Command(BaseCommand):
+    help = "توليد نسخ الصور (المقاسات والصيغ الحديثة) للصور الموجودة مسبقاً في media"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="إعادة توليد النسخ الموجودة")
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_WORKERS, help="عدد العمليات المتوازية")
+
+    def handle(self, *args, **options):
+        names = image_names()
+        stored = [name for name in names if default_storage.exists(name)]
+        missing = len(names) - len(stored)
+        generated = generate_all(stored, options['workers'], force=options['force'])
+
+        # مقارنة حجم الأصل بنسخة البطاقة التي تُحمّل فعلاً في صفحات القوائم
+        original_bytes = variant_bytes = 0
+        fmt = (modern_formats() or ['jpg'])[0]
+        for name in stored:
+            card = variant_name(name, 'card', fmt)
+            if default_storage.exists(card):
+                original_bytes += default_storage.size(name)
+                variant_bytes += default_storage.size(card)
+
+        if generated:
+            # المقاطع المخزنة تحتوي وسوم الصور القديمة
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"تم توليد نسخ {generated} صورة ({missing} صورة غير موجودة في التخزين)."))
+        if original_bytes:
+            self.stdout.write(
+                f"حجم الأصل {original_bytes / 1024:.0f} ك.ب ← نسخة البطاقة ({fmt}) {variant_bytes / 1024:.0f} ك.ب "
+                f"(توفير {100 - variant_bytes * 100 / original_bytes:.0f}%)"
+            )
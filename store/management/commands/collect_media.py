@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.media_gc import collect_media
+
+
+class Command(BaseCommand):
+    help = "البحث عن ملفات الصور التي لا يشير إليها أي منتج أو قسم (ونسخها) وحذفها مع --delete"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help="تجاهل الملفات الأحدث من هذه المدة (رفع لم يُحفظ سجله بعد)")
+        parser.add_argument('--delete', action='store_true', help="حذف الملفات اليتيمة (بدونه تقرير فقط)")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = collect_media(options['grace_hours'] * 3600, delete=options['delete'])
+        self.stdout.write(
+            f"صور يتيمة: {stats['orphans']} ({stats['orphan_bytes'] / 1024:.0f} ك.ب)، "
+            f"مجلدات نسخ يتيمة: {stats['variant_dirs']} ({stats['variant_bytes'] / 1024:.0f} ك.ب) "
+            f"في {time.perf_counter() - start:.1f} ثانية"
+        )
+        if options['delete']:
+            self.stdout.write(self.style.SUCCESS(f"تم حذف {stats['removed']}."))
+        elif stats['orphans'] or stats['variant_dirs']:
+            self.stdout.write("للحذف أعد التشغيل مع --delete")
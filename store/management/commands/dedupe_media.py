@@ -0,0 +1,70 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.catalog_cache import bump_catalog_version
+from store.images import IMAGE_FIELDS, generate_all
+from store.media_refs import rebuild_references
+from store.models import media_storage
+from store.storage import BLOB_DIR, blob_name, content_digest
+
+
+def legacy_names():
+    # الصور المرفوعة قبل التخزين حسب المحتوى (products/..., categories/...)
+    names = set()
+    for model, field_name in IMAGE_FIELDS:
+        names.update(
+            model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__startswith': f'{BLOB_DIR}/'})
+            .values_list(field_name, flat=True).distinct()
+        )
+    return sorted(names)
+
+
+class Command(BaseCommand):
+    help = "نقل الصور القديمة إلى التخزين حسب المحتوى (الملفات المتطابقة تصبح ملفاً واحداً) وإعادة حساب المراجع"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="عرض التوفير المتوقع بدون نقل أي ملف")
+
+    def handle(self, *args, **options):
+        storage = media_storage()
+        dry_run = options['dry_run']
+        moved, missing, before = 0, 0, 0
+        blobs = {}  # الاسم الجديد -> الحجم
+
+        for name in legacy_names():
+            if not storage.exists(name):
+                missing += 1
+                continue
+            size = storage.size(name)
+            with storage.open(name, 'rb') as file:
+                if dry_run:
+                    new_name = blob_name(content_digest(file), os.path.splitext(name)[1])
+                else:
+                    new_name = storage.save(name, file)
+            before += size
+            blobs[new_name] = size
+            moved += 1
+            if dry_run:
+                continue
+            with transaction.atomic():
+                for model, field_name in IMAGE_FIELDS:
+                    model.objects.filter(**{field_name: name}).update(**{field_name: new_name})
+            storage.remove(name)  # لم يعد أي سجل يشير للاسم القديم
+
+        after = sum(blobs.values())
+        self.stdout.write(
+            f"{moved} صورة ({before / 1024:.0f} ك.ب) ← {len(blobs)} ملف ({after / 1024:.0f} ك.ب)، "
+            f"{missing} صورة غير موجودة في التخزين"
+        )
+        if dry_run:
+            return
+
+        used = rebuild_references()
+        if moved:
+            # الروابط تغيرت: نسخ الصور للأسماء الجديدة وإبطال المقاطع المخزنة
+            generate_all(list(blobs), settings.IMAGE_WORKERS)
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"تم. عدد الملفات المستخدمة: {used}."))
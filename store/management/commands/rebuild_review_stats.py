@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.catalog_cache import bump_catalog_version
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "إعادة حساب مجموع وعدد تقييمات كل المنتجات من جدول التقييمات"
+
+    def handle(self, *args, **options):
+        updated = Product.rebuild_ratings()
+        # التحديث الجماعي لا يرسل إشارات الحفظ، فنرفع نسخة الكتالوج يدوياً لتتجدد المقاطع المخزنة
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"تم تحديث تقييمات {updated} منتج."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Product
+from store.search import is_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "إعادة بناء فهرس البحث النصي للمنتجات بالكامل (بعد الاستيراد الجماعي مثلاً)"
+
+    def handle(self, *args, **options):
+        if not is_available():
+            self.stderr.write("فهرس FTS5 متاح فقط مع SQLite، البحث يعمل بالمطابقة البسيطة.")
+            return
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"تمت فهرسة {Product.objects.count()} منتج."))
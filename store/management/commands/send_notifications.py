@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.notifications import backlog, default_senders, process_batch
+
+
+class Command(BaseCommand):
+    help = "عامل إرسال طابور الإشعارات (تلجرام والبريد): يعمل باستمرار، أو دفعة واحدة مع --once"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="إرسال المستحق الآن ثم الخروج")
+        parser.add_argument('--channel', action='append', choices=['telegram', 'email'],
+                            help="قناة محددة فقط (يمكن تكرارها)، الافتراضي كل القنوات")
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--interval', type=float, default=2.0, help="ثواني الانتظار عندما لا يوجد ما يُرسل")
+        parser.add_argument('--report-every', type=float, default=60.0, help="كل كم ثانية يُطبع حجم الطابور")
+
+    def handle(self, *args, **options):
+        senders = default_senders()
+        if options['channel']:
+            senders = {channel: senders[channel] for channel in options['channel']}
+        last_report = 0.0
+        try:
+            while True:
+                results = process_batch(senders, options['batch_size'])
+                if any(results.values()):
+                    self.stdout.write(
+                        f"sent {results['sent']}, retry later {results['pending']}, failed {results['failed']}"
+                    )
+
+                now = time.monotonic()
+                if options['once'] or now - last_report >= options['report_every']:
+                    count, age = backlog()
+                    self.stdout.write(f"backlog: {count} pending, oldest {age:.0f}s")
+                    last_report = now
+
+                if options['once']:
+                    break
+                if not any(results.values()):
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for sender in senders.values():
+                sender.close()
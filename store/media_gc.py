@@ -0,0 +1,145 @@
+import os
+import time
+
+from django.conf import settings
+
+from .images import IMAGE_FIELDS, VARIANTS_DIR
+from .media_refs import collect, referenced
+from .models import media_storage
+from .storage import BLOB_DIR, is_blob
+
+# --- تنظيف ملفات الصور اليتيمة ---
+# حذف المنتجات والأقسام وصور المعرض يترك على القرص الصور القديمة (قبل التخزين حسب المحتوى) وما فات عدّ المراجع
+# (الكتابة الجماعية، الأخطاء)، ونسخها المصغرة. هنا نمر على مجلدات الصور بشكل متدفق (os.scandir بدون تحميل
+# القائمة كاملة)، ونفحص كل دفعة من الأسماء بجملة IN واحدة لكل حقل صورة (الحقول مفهرسة)، فالذاكرة لا تتجاوز
+# دفعة واحدة مهما كان عدد الملفات. الملفات الأحدث من فترة السماح لا تُلمس (رفع لم يُحفظ سجله بعد)
+BATCH_SIZE = 500  # أقل من حد معاملات SQLite في الإصدارات القديمة (999)
+
+
+def source_dirs():
+    # مجلدات الصور الأصلية (بدون المتداخلة: products/gallery داخل products)
+    dirs = {BLOB_DIR} | {
+        model._meta.get_field(field_name).upload_to.strip('/').split('/')[0] for model, field_name in IMAGE_FIELDS
+    }
+    return sorted(dirs)
+
+
+def walk(prefix):
+    """ملفات المجلد وما تحته بشكل متدفق: (الاسم النسبي، وقت التعديل، الحجم). ملفات كل مجلد متتالية"""
+    try:
+        entries = os.scandir(os.path.join(settings.MEDIA_ROOT, prefix))
+    except FileNotFoundError:
+        return
+    subdirs = []
+    with entries:
+        for entry in entries:
+            name = f'{prefix}/{entry.name}'
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(name)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                yield name, stat.st_mtime, stat.st_size
+    for name in subdirs:
+        yield from walk(name)
+
+
+def referenced_names(names):
+    found = set()
+    for model, field_name in IMAGE_FIELDS:
+        found.update(model._base_manager.filter(**{f'{field_name}__in': names}).values_list(field_name, flat=True))
+    return found
+
+
+def find_orphans(cutoff):
+    """الصور الأصلية الأقدم من cutoff التي لا يشير إليها أي سجل: (الاسم، الحجم)"""
+    batch = []
+    for prefix in source_dirs():
+        for name, modified, size in walk(prefix):
+            if modified > cutoff:
+                continue
+            batch.append((name, size))
+            if len(batch) >= BATCH_SIZE:
+                yield from orphans_in(batch)
+                batch = []
+    yield from orphans_in(batch)
+
+
+def orphans_in(batch):
+    used = referenced_names([name for name, _ in batch])
+    for name, size in batch:
+        if name not in used:
+            yield name, size
+
+
+def variants_dir(name):
+    return f'{VARIANTS_DIR}/{os.path.splitext(name)[0]}'
+
+
+def remove_variants(folder):
+    # ملفات المجلد فقط: قد يحتوي مجلدات نسخ صور أخرى (products/gallery.png و products/gallery/...)
+    path = os.path.join(settings.MEDIA_ROOT, folder)
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    os.remove(entry.path)
+        os.rmdir(path)
+    except OSError:  # غير موجود، أو ما زال فيه مجلدات أخرى
+        pass
+
+
+def find_orphan_variants(cutoff):
+    """مجلدات نسخ الصور التي لم يعد أصلها موجوداً (حُذف الأصل قبل إضافة هذا التنظيف): (المسار، الحجم)"""
+    folder, size, newest = None, 0, 0
+    for name, modified, file_size in walk(VARIANTS_DIR):
+        parent = os.path.dirname(name)
+        if parent != folder:
+            if folder and newest <= cutoff and not original_exists(folder):
+                yield folder, size
+            folder, size, newest = parent, 0, 0
+        size += file_size
+        newest = max(newest, modified)
+    if folder and newest <= cutoff and not original_exists(folder):
+        yield folder, size
+
+
+def original_exists(folder):
+    # variants/<مسار الأصل بدون الامتداد>: نبحث في مجلد الأصل عن ملف بنفس الاسم وأي امتداد
+    base = os.path.relpath(folder, VARIANTS_DIR)
+    directory, stem = os.path.split(os.path.join(settings.MEDIA_ROOT, base))
+    try:
+        with os.scandir(directory) as entries:
+            return any(os.path.splitext(entry.name)[0] == stem and entry.is_file() for entry in entries)
+    except FileNotFoundError:
+        return False
+
+
+def remove_orphan(name):
+    """حذف الأصل مع نسخه بعد التأكد مرة أخرى أنه غير مستخدم. يرجع True إذا حُذف"""
+    if is_blob(name):
+        if not collect(name):
+            return False
+    elif referenced(name):
+        return False
+    else:
+        media_storage().remove(name)
+    remove_variants(variants_dir(name))
+    return True
+
+
+def collect_media(grace_seconds, delete=False):
+    """يرجع إحصائيات: عدد وحجم الأصول اليتيمة ومجلدات النسخ اليتيمة، وما حُذف منها"""
+    cutoff = time.time() - grace_seconds
+    stats = {'orphans': 0, 'orphan_bytes': 0, 'variant_dirs': 0, 'variant_bytes': 0, 'removed': 0}
+    for name, size in find_orphans(cutoff):
+        stats['orphans'] += 1
+        stats['orphan_bytes'] += size
+        if delete and remove_orphan(name):
+            stats['removed'] += 1
+    for folder, size in find_orphan_variants(cutoff):
+        stats['variant_dirs'] += 1
+        stats['variant_bytes'] += size
+        if delete:
+            remove_variants(folder)
+            stats['removed'] += 1
+    return stats
@@ -0,0 +1,114 @@
+import os
+import time
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .images import IMAGE_FIELDS
+from .models import MediaFile, media_storage
+from .storage import BLOB_DIR, is_blob
+
+# --- عدّ المراجع لملفات التخزين حسب المحتوى ---
+# كل سجل يشير لملف يزيد عدده عند الحفظ وينقصه عند تغيير الصورة أو حذف السجل، وعند الوصول للصفر
+# يُحذف الملف بعد نجاح المعاملة. قبل الحذف نتأكد من قاعدة البيانات أن لا سجل يشير إليه فعلاً
+# (الكتابة الجماعية مثل الاستيراد لا ترسل إشارات)، والأمر dedupe_media يعيد حساب الأعداد كلها.
+# الملف الذي كُتب أو أعيد استخدامه خلال فترة السماح لا يُحذف هنا، ويتركه collect_media لتشغيل لاحق
+UPLOAD_GRACE_SECONDS = 10 * 60
+
+
+def stored_name(instance, field_name):
+    # القيمة الخام بدون المرور على واصف الحقل (الحقل المؤجل لا يسبب استعلاماً)
+    value = instance.__dict__.get(field_name)
+    return getattr(value, 'name', value) or ''
+
+
+def add_reference(name):
+    if not is_blob(name):
+        return
+    if MediaFile.objects.filter(name=name).update(references=F('references') + 1):
+        return
+    try:
+        with transaction.atomic():
+            MediaFile.objects.create(name=name, references=1)
+    except IntegrityError:  # أنشأه طلب متزامن
+        MediaFile.objects.filter(name=name).update(references=F('references') + 1)
+
+
+def release(name):
+    if not is_blob(name):
+        return
+    MediaFile.objects.filter(name=name, references__gt=0).update(references=F('references') - 1)
+    transaction.on_commit(lambda: collect(name))
+
+
+def referenced(name):
+    return any(model._base_manager.filter(**{field_name: name}).exists() for model, field_name in IMAGE_FIELDS)
+
+
+def recently_written(name):
+    try:
+        modified = os.path.getmtime(media_storage().path(name))
+    except FileNotFoundError:
+        return False
+    return time.time() - modified < UPLOAD_GRACE_SECONDS
+
+
+def collect(name):
+    """حذف الملف من القرص إذا لم يعد أي سجل يشير إليه. يرجع True إذا حُذف"""
+    with transaction.atomic():
+        # فترة السماح مع فحص المراجع في نفس المعاملة: رفع جارٍ أعاد استخدام الملف (حدّث وقته)
+        # ولم يُحفظ سجله بعد لا يفقد ملفه
+        if recently_written(name):
+            return False
+        if MediaFile.objects.filter(name=name, references__gt=0).exists() or referenced(name):
+            return False
+        MediaFile.objects.filter(name=name).delete()
+        media_storage().remove(name)
+    return True
+
+
+def rebuild_references():
+    """إعادة حساب أعداد المراجع من الجداول (GROUP BY لكل حقل صورة). يرجع عدد الملفات المستخدمة"""
+    counts = Counter()
+    for model, field_name in IMAGE_FIELDS:
+        rows = model.objects.filter(**{f'{field_name}__startswith': f'{BLOB_DIR}/'}).values_list(field_name)
+        for name, references in rows.annotate(references=Count('pk')).order_by():
+            counts[name] += references
+    with transaction.atomic():
+        MediaFile.objects.update(references=0)
+        MediaFile.objects.bulk_create(
+            [MediaFile(name=name, references=references) for name, references in counts.items()],
+            batch_size=1000, update_conflicts=True, unique_fields=['name'], update_fields=['references'],
+        )
+    return len(counts)
+
+
+def track_references(field_name):
+    attr = f'_stored_{field_name}'
+
+    def remember(sender, instance, **kwargs):
+        setattr(instance, attr, stored_name(instance, field_name))
+
+    def on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+        if raw or (update_fields is not None and field_name not in update_fields):
+            return
+        old, new = ('' if created else getattr(instance, attr, '')), stored_name(instance, field_name)
+        if old != new:
+            add_reference(new)
+            release(old)
+            setattr(instance, attr, new)
+
+    def on_delete(sender, instance, **kwargs):
+        release(getattr(instance, attr, '') or stored_name(instance, field_name))
+
+    return remember, on_save, on_delete
+
+
+for model, field_name in IMAGE_FIELDS:
+    remember, on_save, on_delete = track_references(field_name)
+    uid = f'media_refs_{model.__name__}'
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(on_save, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=uid)
@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-18 11:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    CategoryClosure = apps.get_model('store', 'CategoryClosure')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    links = []
+    for category_id in parents:
+        node, depth = category_id, 0
+        while node is not None:
+            links.append(CategoryClosure(ancestor_id=node, descendant_id=category_id, depth=depth))
+            node, depth = parents[node], depth + 1
+    CategoryClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_homesection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='store.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='store.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'ancestor'], name='store_categ_descend_b5a294_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
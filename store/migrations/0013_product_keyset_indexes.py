@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_category_closure'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'created_at', 'id'], name='store_produ_is_acti_277141_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'discount_percentage', 'id'], name='store_produ_is_acti_5a72e8_idx'),
+        ),
+    ]
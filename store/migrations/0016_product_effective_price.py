@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-18 12:11
+
+import django.db.models.expressions
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_product_rating_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('price'), '*', django.db.models.expressions.CombinedExpression(models.Value(100), '-', models.F('discount_percentage'))), '/', models.Value(100)), 2), output_field=models.DecimalField(decimal_places=2, max_digits=10), verbose_name='السعر بعد الخصم'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'effective_price', 'id'], name='store_produ_is_acti_c894c0_idx'),
+        ),
+    ]
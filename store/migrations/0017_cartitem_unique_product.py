@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-18 12:13
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_items(apps, schema_editor):
+    # قبل القيد: نبقي أحدث سطر لكل (مستخدم، منتج) ونحذف التكرارات القديمة
+    CartItem = apps.get_model('store', 'CartItem')
+    latest = CartItem.objects.values('user', 'product').annotate(latest=Max('id')).values('latest')
+    CartItem.objects.exclude(id__in=list(latest)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_product_effective_price'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_cart_item_per_user'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1 on 2026-10-18 12:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_cartitem_unique_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('telegram', 'تلجرام')], default='telegram', max_length=20, verbose_name='القناة')),
+                ('payload', models.JSONField(verbose_name='محتوى الإشعار')),
+                ('status', models.CharField(choices=[('pending', 'بانتظار الإرسال'), ('sent', 'تم الإرسال'), ('failed', 'فشل الإرسال')], default='pending', max_length=10, verbose_name='الحالة')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='عدد المحاولات')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='المحاولة التالية')),
+                ('last_error', models.TextField(blank=True, verbose_name='آخر خطأ')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'إشعار',
+                'verbose_name_plural': 'طابور الإشعارات',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='store_notif_status_508f92_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='channel',
+            field=models.CharField(choices=[('telegram', 'تلجرام'), ('email', 'بريد إلكتروني')], default='telegram', max_length=20, verbose_name='القناة'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1 on 2026-10-18 12:51
+
+import store.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_notification_email_channel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=store.models.media_storage, upload_to='categories/', verbose_name='صورة الفئة'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='main_image',
+            field=models.ImageField(storage=store.models.media_storage, upload_to='products/', verbose_name='الصورة الرئيسية'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=store.models.media_storage, upload_to='products/gallery/', verbose_name='الصورة'),
+        ),
+    ]
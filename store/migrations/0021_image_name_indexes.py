@@ -0,0 +1,29 @@
+# Generated by Django 5.1 on 2026-10-18 12:55
+
+import store.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_media_files'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=store.models.media_storage, upload_to='categories/', verbose_name='صورة الفئة'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='main_image',
+            field=models.ImageField(db_index=True, storage=store.models.media_storage, upload_to='products/', verbose_name='الصورة الرئيسية'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(db_index=True, storage=store.models.media_storage, upload_to='products/gallery/', verbose_name='الصورة'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1 on 2026-10-18 13:10
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_cache_versions'),
+    ]
+
+    # لا يمكن تعديل تعبير عمود مولّد: نحذفه (مع فهرسه) ونضيفه من جديد فتُحسب القيم كلها مرة أخرى
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='store_produ_is_acti_c894c0_idx',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='effective_price',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('price', models.FloatField()), '*', django.db.models.expressions.CombinedExpression(models.Value(100), '-', models.F('discount_percentage'))), '/', models.Value(100)), 2), output_field=models.DecimalField(decimal_places=2, max_digits=10), verbose_name='السعر بعد الخصم'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'effective_price', 'id'], name='store_produ_is_acti_c894c0_idx'),
+        ),
+    ]
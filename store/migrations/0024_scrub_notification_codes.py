@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def scrub_sent_emails(apps, schema_editor):
+    # رسائل البريد القديمة (كود التفعيل واستعادة الحساب) كانت تُحفظ بنصها الكامل؛ ما أُرسل أو فشل لم يعد يحتاجه
+    Notification = apps.get_model('store', 'Notification')
+    for notification in Notification.objects.filter(channel='email').exclude(status='pending').iterator():
+        if notification.payload.pop('message', None) is not None:
+            notification.save(update_fields=['payload'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0023_effective_price_float_division'),
+    ]
+
+    operations = [
+        migrations.RunPython(scrub_sent_emails, migrations.RunPython.noop),
+    ]
@@ -1,19 +1,25 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models.functions import Cast, Coalesce, Round
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .storage import ContentAddressedStorage
 
 
+def media_storage():
+    # صور المنتجات والأقسام تُخزن حسب المحتوى: الصورة المكررة تُحفظ مرة واحدة (store/storage.py)
+    return ContentAddressedStorage()
+
 
 
 
 class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name="اسم الفئة")
     slug = models.SlugField(unique=True, allow_unicode=True)
-    image = models.ImageField(upload_to='categories/', blank=True, null=True, verbose_name="صورة الفئة")
+    image = models.ImageField(upload_to='categories/', storage=media_storage, db_index=True, blank=True, null=True, verbose_name="صورة الفئة")
     
     # --- الإضافة الجديدة: الأب (Parent) ---
     parent = models.ForeignKey('self', null=True, blank=True, related_name='children', on_delete=models.CASCADE, verbose_name="الفئة الرئيسية (الأب)")
@@ -32,6 +38,81 @@ class Category(models.Model):
             k = k.parent
         return ' -> '.join(full_path[::-1])
 
+    def clean(self):
+        # منع جعل الفئة أباً لنفسها أو نقلها تحت أحد أبنائها (يسبب حلقة في الشجرة)
+        from django.core.exceptions import ValidationError
+        if self.pk and self.parent_id and CategoryClosure.objects.filter(ancestor_id=self.pk, descendant_id=self.parent_id).exists():
+            raise ValidationError({'parent': "لا يمكن نقل الفئة تحت نفسها أو تحت أحد أقسامها الفرعية."})
+
+    def save(self, *args, **kwargs):
+        # نحتفظ بالأب القديم لنعرف إن كانت الفئة قد نُقلت إلى مكان آخر في الشجرة
+        is_new = self._state.adding
+        old_parent_id = None
+        # حفظ السطر وتحديث جدول الإغلاق معاً: أي خطأ في المنتصف يلغي الاثنين
+        with transaction.atomic():
+            if not is_new:
+                old_parent_id = Category.objects.filter(pk=self.pk).values_list('parent_id', flat=True).first()
+            super().save(*args, **kwargs)
+            if is_new:
+                CategoryClosure.insert_node(self)
+            elif old_parent_id != self.parent_id:
+                CategoryClosure.move_subtree(self)
+
+    def get_descendants(self, include_self=True):
+        """جميع الفئات الفرعية بكل المستويات (استعلام واحد عبر جدول الإغلاق)"""
+        # الشرطان في filter واحد حتى يطبقا على نفس سطر الإغلاق (وليس على أي جد آخر للفئة)
+        if include_self:
+            return Category.objects.filter(ancestor_links__ancestor=self)
+        return Category.objects.filter(ancestor_links__ancestor=self, ancestor_links__depth__gt=0)
+
+
+# --- جدول الإغلاق (Closure Table) لشجرة الفئات ---
+# يحفظ سطراً لكل زوج (جد، حفيد) مع المسافة بينهما، بما في ذلك الفئة مع نفسها (depth=0)
+# بهذا يصبح جلب "الفئة وكل أبنائها" استعلاماً واحداً مهما كان عمق الشجرة
+class CategoryClosure(models.Model):
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'ancestor']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+    @classmethod
+    def insert_node(cls, category):
+        """إضافة فئة جديدة: نسخ روابط أجداد الأب + رابط الفئة مع نفسها"""
+        links = [cls(ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+        if category.parent_id:
+            for ancestor_id, depth in cls.objects.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth'):
+                links.append(cls(ancestor_id=ancestor_id, descendant_id=category.pk, depth=depth + 1))
+        cls.objects.bulk_create(links)
+
+    @classmethod
+    def move_subtree(cls, category):
+        """نقل فئة (مع كل أبنائها) تحت أب جديد"""
+        subtree = list(cls.objects.filter(ancestor_id=category.pk).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+
+        # 1. فصل الشجرة الفرعية عن أجدادها القدامى
+        cls.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+
+        # 2. ربطها بأجداد الأب الجديد
+        if category.parent_id:
+            new_ancestors = cls.objects.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth')
+            cls.objects.bulk_create([
+                cls(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+                for ancestor_id, ancestor_depth in new_ancestors
+                for descendant_id, depth in subtree
+            ])
+
+
+
+
 
 
 
@@ -41,6 +122,31 @@ class Category(models.Model):
 
 
 
+class ProductQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(is_active=True)
+
+    def price_between(self, low=None, high=None):
+        """فلترة حسب السعر الفعلي (أي حد يمكن تركه فارغاً)"""
+        qs = self
+        if low is not None:
+            qs = qs.filter(effective_price__gte=low)
+        if high is not None:
+            qs = qs.filter(effective_price__lte=high)
+        return qs
+
+    def by_price(self, descending=False):
+        if descending:
+            return self.order_by('-effective_price', '-id')
+        return self.order_by('effective_price', 'id')
+
+    def stock_value(self):
+        """قيمة المخزون (الكمية × السعر) محسوبة في قاعدة البيانات"""
+        total = self.aggregate(total=models.Sum(
+            models.F('stock_quantity') * models.F('price'),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ))['total']
+        return total or 0
 
 
 class Product(models.Model):
@@ -50,24 +156,64 @@ class Product(models.Model):
     description = models.TextField(verbose_name="وصف المنتج")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="السعر الأصلي")
     discount_percentage = models.PositiveIntegerField(default=0, verbose_name="نسبة الخصم %")
+    # السعر الذي يدفعه الزبون، تحسبه قاعدة البيانات نفسها وتحفظه (عمود مولّد) فيبقى صحيحاً
+    # مع save و update و bulk_create، ويمكن فهرسته والفلترة والترتيب حسبه.
+    # السعر يُحوّل لعدد عشري قبل القسمة: SQLite يحفظ السعر 999.00 كعدد صحيح فتصبح القسمة صحيحة
+    # (999 بخصم 15% = 849 بدلاً من 849.15)، والتقريب لخانتين يعيده مبلغاً دقيقاً
+    effective_price = models.GeneratedField(
+        expression=Round(Cast('price', models.FloatField()) * (100 - models.F('discount_percentage')) / 100, 2),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+        verbose_name="السعر بعد الخصم",
+    )
     stock_quantity = models.PositiveIntegerField(default=0, verbose_name="الكمية المتوفرة")
-    main_image = models.ImageField(upload_to='products/', verbose_name="الصورة الرئيسية")
+    main_image = models.ImageField(upload_to='products/', storage=media_storage, db_index=True, verbose_name="الصورة الرئيسية")
     is_active = models.BooleanField(default=True, verbose_name="نشط")
     
     # This is the new field you added
     is_featured = models.BooleanField(default=False, verbose_name="منتج مميز (يظهر في السلايدر)")
+
+    # مجموع وعدد التقييمات محفوظة مع المنتج (تتحدث مع كل تقييم) لعرض النجوم بدون استعلام إضافي
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="عدد التقييمات")
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = "منتج"
         verbose_name_plural = "المنتجات"
         ordering = ('-created_at',)
+        indexes = [
+            # فهارس الترقيم بالمؤشر لصفحة المتجر والعروض
+            models.Index(fields=['is_active', 'created_at', 'id']),
+            models.Index(fields=['is_active', 'discount_percentage', 'id']),
+            # فلترة وترتيب المتجر حسب السعر الفعلي
+            models.Index(fields=['is_active', 'effective_price', 'id']),
+        ]
 
     def __str__(self):
         return self.name
 
+
+    @classmethod
+    def add_rating(cls, product_id, rating, count):
+        cls.objects.filter(pk=product_id).update(
+            rating_sum=models.F('rating_sum') + rating,
+            rating_count=models.F('rating_count') + count,
+        )
+
+    @classmethod
+    def rebuild_ratings(cls):
+        """إعادة حساب مجموع وعدد التقييمات لكل المنتجات من جدول التقييمات (جملة UPDATE واحدة)"""
+        reviews = Review.objects.filter(product=models.OuterRef('pk')).order_by().values('product')
+        return cls.objects.update(
+            rating_sum=Coalesce(models.Subquery(reviews.annotate(total=models.Sum('rating')).values('total')), 0),
+            rating_count=Coalesce(models.Subquery(reviews.annotate(total=models.Count('id')).values('total')), 0),
+        )
+
     @property
     def final_price(self):
         if self.discount_percentage > 0:
@@ -75,6 +221,12 @@ class Product(models.Model):
             return self.price - discount_amount
         return self.price
 
+    @property
+    def average_rating(self):
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 1)
+        return 0
+
     @property
     def is_in_stock(self):
         return self.stock_quantity > 0
@@ -138,6 +290,12 @@ class CartItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart_items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            # سطر واحد لكل منتج في سلة المستخدم (يسمح بالحفظ الجماعي بـ upsert)
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_item_per_user'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
@@ -181,6 +339,24 @@ class Review(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+    def save(self, *args, **kwargs):
+        # تحديث مجموع وعدد تقييمات المنتج بجملة UPDATE ذرية (بدون قراءة القيم ثم كتابتها)
+        self.rating = int(self.rating)
+        with transaction.atomic():
+            old = None
+            if not self._state.adding:
+                old = Review.objects.filter(pk=self.pk).values_list('product_id', 'rating').first()
+            super().save(*args, **kwargs)
+            if old:
+                Product.add_rating(old[0], -old[1], -1)
+            Product.add_rating(self.product_id, self.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    # يعمل أيضاً مع الحذف الجماعي من لوحة الإدارة (queryset.delete يرسل الإشارة لكل تقييم)
+    Product.add_rating(instance.product_id, -instance.rating, -1)
+
 
 
 
@@ -188,13 +364,34 @@ class Review(models.Model):
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images', verbose_name="المنتج")
-    image = models.ImageField(upload_to='products/gallery/', verbose_name="الصورة")
+    image = models.ImageField(upload_to='products/gallery/', storage=media_storage, db_index=True, verbose_name="الصورة")
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"صورة لـ {self.product.name}"
     
 
+class CacheVersion(models.Model):
+    # أرقام نسخ البيانات (الكتالوج، المبيعات) تُحفظ في قاعدة البيانات وليس في الكاش:
+    # الكاش الافتراضي محلي لكل عملية، ورفع الرقم في عامل واحد يجب أن يراه كل العمّال وعامل التقارير
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class MediaFile(models.Model):
+    # عدد السجلات (منتجات، صور معرض، أقسام) التي تشير لكل ملف في التخزين حسب المحتوى،
+    # والملف يُحذف من القرص فقط عندما يصل العدد للصفر (store/media_refs.py)
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+
+
 class Wishlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wishlist')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -227,3 +424,37 @@ class HomeSection(models.Model):
 
     def __str__(self):
         return self.title
+
+
+# --- طابور الإشعارات (Outbox) ---
+# الإشعار يُكتب في نفس معاملة الطلب، فلا يضيع إذا توقفت العملية قبل إرساله،
+# ويرسله عامل منفصل (python manage.py send_notifications) مع إعادة المحاولة عند الفشل
+class Notification(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'بانتظار الإرسال'),
+        ('sent', 'تم الإرسال'),
+        ('failed', 'فشل الإرسال'),
+    )
+    CHANNEL_CHOICES = (
+        ('telegram', 'تلجرام'),
+        ('email', 'بريد إلكتروني'),
+    )
+
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES, default='telegram', verbose_name="القناة")
+    payload = models.JSONField(verbose_name="محتوى الإشعار")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="الحالة")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="عدد المحاولات")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="المحاولة التالية")
+    last_error = models.TextField(blank=True, verbose_name="آخر خطأ")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "إشعار"
+        verbose_name_plural = "طابور الإشعارات"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} #{self.id} ({self.get_status_display()})"
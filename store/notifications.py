@@ -0,0 +1,213 @@
+import smtplib
+import time
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, Min
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import Notification, Profile
+
+# --- عامل إرسال الإشعارات ---
+# يسحب الإشعارات المستحقة من الطابور على دفعات ويرسلها عبر اتصال واحد محفوظ لكل قناة
+# (جلسة HTTP لتلجرام، واتصال SMTP للبريد)، مع إعادة المحاولة بتأخير متزايد عند الفشل
+
+TIMEOUT = (3, 10)  # (الاتصال، القراءة) بالثواني
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 60 * 60
+# الإشعار المحجوز لعامل يختفي من الطابور لهذه المدة؛ إذا توقف العامل قبل الإرسال يعود تلقائياً بعدها
+CLAIM_SECONDS = 5 * 60
+
+
+class RetryLater(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PermanentFailure(Exception):
+    pass
+
+
+class TelegramSender:
+    def __init__(self, session=None):
+        self.session = session or requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.last_sent = 0.0
+        self.last_sent_to = {}  # المحادثة -> وقت آخر رسالة
+        self.blocked_until = 0.0  # بعد رد 429 يتوقف البوت كله حتى انتهاء المدة المطلوبة
+
+    def throttle(self, chat_id):
+        now = time.monotonic()
+        wait = max(
+            self.last_sent + settings.TELEGRAM_GLOBAL_INTERVAL - now,
+            self.last_sent_to.get(chat_id, 0.0) + settings.TELEGRAM_CHAT_INTERVAL - now,
+        )
+        if wait > 0:
+            time.sleep(wait)
+        self.last_sent = self.last_sent_to[chat_id] = time.monotonic()
+
+    def send(self, payload):
+        self.throttle(payload.get('chat_id'))
+        url = f"{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+        try:
+            response = self.session.post(url, data=payload, timeout=TIMEOUT)
+        except requests.RequestException as e:
+            raise RetryLater(f"network: {e}")
+
+        if response.status_code == 429:
+            # تلجرام يحدد مدة الانتظار المطلوبة في parameters.retry_after
+            try:
+                retry_after = response.json()['parameters']['retry_after']
+            except (ValueError, KeyError, TypeError):
+                retry_after = None
+            self.blocked_until = time.monotonic() + (retry_after or RETRY_BASE_SECONDS)
+            raise RetryLater("429 too many requests", retry_after)
+        if response.status_code >= 500:
+            raise RetryLater(f"{response.status_code} {response.text[:200]}")
+        if response.status_code >= 400:
+            # خطأ في الطلب نفسه (محادثة غير موجودة، نص غير صالح...) لا تفيد إعادته
+            raise PermanentFailure(f"{response.status_code} {response.text[:200]}")
+
+    def close(self):
+        self.session.close()
+
+
+class EmailSender:
+    # اتصال SMTP واحد يُفتح عند أول رسالة ويُستخدم لكل رسائل الدفعة وما بعدها
+    blocked_until = 0.0
+
+    def __init__(self):
+        self.connection = None
+
+    def send(self, payload):
+        payload = render_code(payload)
+        try:
+            # فتح الاتصال داخل نفس الحماية: خادم بريد غير متاح يؤجل الإشعار بدلاً من إيقاف العامل
+            if self.connection is None:
+                self.connection = get_connection(fail_silently=False)
+                self.connection.open()
+            message = EmailMessage(
+                payload['subject'], payload['message'], payload.get('from_email') or settings.EMAIL_HOST_USER,
+                payload['to'], connection=self.connection,
+            )
+            message.send()
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentFailure(f"recipients refused: {e}")
+        except (smtplib.SMTPException, OSError) as e:
+            # الاتصال قد يكون انقطع، نفتح اتصالاً جديداً في المحاولة القادمة
+            self.close()
+            raise RetryLater(f"smtp: {e}")
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+
+def default_senders():
+    return {'telegram': TelegramSender(), 'email': EmailSender()}
+
+
+def queue_email(subject, message, to, on_failure=None, code_user_id=None, **extra):
+    """إضافة رسالة بريد للطابور، on_failure إجراء يُنفذ إذا فشل الإرسال نهائياً.
+    رسالة كود التحقق تحتوي {code} مع code_user_id، والكود نفسه لا يُحفظ في الطابور"""
+    return Notification.objects.create(channel='email', payload={
+        'subject': subject, 'message': message, 'to': list(to), 'on_failure': on_failure,
+        'code_user_id': code_user_id, **extra,
+    })
+
+
+def render_code(payload):
+    # كود التحقق يُقرأ من حساب الزبون لحظة الإرسال (آخر كود طلبه)، فلا يبقى في جدول الإشعارات
+    # ولا يظهر لموظفي لوحة الإدارة
+    user_id = payload.get('code_user_id')
+    if user_id is None:
+        return payload
+    code = Profile.objects.filter(user_id=user_id).values_list('otp_code', flat=True).first()
+    if not code:
+        raise PermanentFailure("code already used or expired")
+    return {**payload, 'message': payload['message'].replace('{code}', code)}
+
+
+def handle_final_failure(notification):
+    # تسجيل حساب جديد: إذا لم يصل كود التفعيل أبداً نحذف الحساب غير المفعل ليعيد الزبون التسجيل
+    if notification.payload.get('on_failure') == 'delete_inactive_user':
+        User.objects.filter(pk=notification.payload.get('user_id'), is_active=False).delete()
+
+
+def retry_delay(attempts, retry_after=None):
+    if retry_after:
+        return timedelta(seconds=retry_after)
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def due_notifications(limit, channels):
+    return list(Notification.objects.filter(
+        status='pending', next_attempt_at__lte=timezone.now(), channel__in=channels,
+    ).order_by('next_attempt_at', 'id')[:limit])
+
+
+def claim(notification):
+    """حجز الإشعار لهذا العامل بجملة UPDATE مشروطة: عاملان قرآ نفس الدفعة لا يرسلان نفس الرسالة مرتين"""
+    lease = timezone.now() + timedelta(seconds=CLAIM_SECONDS)
+    claimed = Notification.objects.filter(
+        pk=notification.pk, status='pending', next_attempt_at=notification.next_attempt_at,
+    ).update(next_attempt_at=lease)
+    notification.next_attempt_at = lease
+    return bool(claimed)
+
+
+def deliver(notification, sender):
+    """محاولة إرسال إشعار واحد وتحديث حالته حسب النتيجة"""
+    notification.attempts += 1
+    try:
+        sender.send(notification.payload)
+    except RetryLater as e:
+        notification.last_error = str(e)
+        if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            notification.status = 'failed'
+        else:
+            notification.next_attempt_at = timezone.now() + retry_delay(notification.attempts, e.retry_after)
+    except PermanentFailure as e:
+        notification.last_error = str(e)
+        notification.status = 'failed'
+    else:
+        notification.status = 'sent'
+        notification.sent_at = timezone.now()
+        notification.last_error = ''
+    notification.save(update_fields=['attempts', 'status', 'next_attempt_at', 'last_error', 'sent_at'])
+    if notification.status == 'failed':
+        handle_final_failure(notification)
+    return notification.status
+
+
+def process_batch(senders, limit=50):
+    """إرسال دفعة من الإشعارات المستحقة، senders قاموس (القناة -> المرسل). يرجع عدد كل نتيجة"""
+    results = {'sent': 0, 'pending': 0, 'failed': 0}
+    for notification in due_notifications(limit, list(senders)):
+        sender = senders[notification.channel]
+        if sender.blocked_until > time.monotonic():
+            # القناة متوقفة مؤقتاً (429 من تلجرام)، الإشعار يبقى للدفعة القادمة
+            continue
+        if not claim(notification):
+            # حجزه عامل آخر (أو أُرسل) بعد قراءة الدفعة
+            continue
+        results[deliver(notification, sender)] += 1
+    return results
+
+
+def backlog():
+    """حجم الطابور: عدد الإشعارات المنتظرة وعمر أقدمها بالثواني"""
+    stats = Notification.objects.filter(status='pending').aggregate(count=Count('id'), oldest=Min('created_at'))
+    age = (timezone.now() - stats['oldest']).total_seconds() if stats['oldest'] else 0
+    return stats['count'], age
+
@@ -0,0 +1,96 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .catalog_cache import cached_count
+
+
+# --- الترقيم بالمؤشر (Keyset Pagination) ---
+# بدلاً من OFFSET (الذي يقرأ ويتجاهل كل الصفوف السابقة) نحفظ قيم آخر منتج في الصفحة
+# ونطلب "ما بعده" مباشرة عبر الفهرس، فتكلفة الصفحة 400 مثل تكلفة الصفحة الأولى
+class KeysetPage:
+    def __init__(self, queryset, ordering, cursor=None, per_page=24):
+        # ordering مثل ('-created_at', '-id') ويجب أن ينتهي بحقل فريد
+        self.base_queryset = queryset
+        self.queryset = queryset.order_by(*ordering)
+        self.ordering = ordering
+        self.per_page = per_page
+        self.cursor = cursor
+        self.is_first = True
+
+        values = self.decode_cursor(cursor)
+        if values is not None:
+            self.queryset = self.queryset.filter(self.after(values))
+            self.is_first = False
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            if not isinstance(raw, list) or len(raw) != len(self.ordering):
+                return None
+            return [self.to_python(name.lstrip('-'), value) for name, value in zip(self.ordering, raw)]
+        except Exception:
+            # مؤشر تالف أو معدّل يدوياً: نرجع للصفحة الأولى بدلاً من الخطأ
+            return None
+
+    def to_python(self, name, value):
+        try:
+            return self.queryset.model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            # حقل محسوب (annotate) مثل ترتيب الصلة في البحث: نحفظه كرقم كما هو
+            return value
+
+    def encode_cursor(self, obj):
+        raw = []
+        for name in self.ordering:
+            value = getattr(obj, name.lstrip('-'))
+            raw.append(value if isinstance(value, (int, float)) else str(value))
+        return base64.urlsafe_b64encode(json.dumps(raw).encode()).decode()
+
+    def after(self, values):
+        # (a, b, c) بعد (va, vb, vc) = a بعد va، أو a = va و b بعد vb، ...
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    @cached_property
+    def object_list(self):
+        # نجلب عنصراً إضافياً لنعرف هل توجد صفحة تالية بدون استعلام COUNT
+        items = list(self.queryset[:self.per_page + 1])
+        self._has_next = len(items) > self.per_page
+        return items[:self.per_page]
+
+    @property
+    def has_next(self):
+        self.object_list
+        return self._has_next
+
+    @cached_property
+    def next_cursor(self):
+        if self.has_next:
+            return self.encode_cursor(self.object_list[-1])
+        return None
+
+    @cached_property
+    def total_count(self):
+        # العدد الكلي بدون فلتر المؤشر، مخزن في الكاش حتى يتغير الكتالوج
+        return cached_count(self.base_queryset)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
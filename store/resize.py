@@ -0,0 +1,102 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .images import IMAGE_FIELDS, encode, load_image, modern_formats
+from .storage import BLOB_DIR
+
+# --- تصغير الصور عند الطلب ---
+# الرابط يحدد الصورة والمقاس وطريقة الملاءمة والصيغة؛ الناتج يُولّد مرة واحدة ويُحفظ في مجلد كاش محدود الحجم
+# باسم محسوب من المعطيات ووقت تعديل الأصل، فالطلبات التالية تُقرأ من القرص مباشرة.
+# ترتيب LRU يعتمد على وقت تعديل الملف: كل استخدام يحدّثه، وعند تجاوز الحد يُحذف الأقدم
+FITS = ('contain', 'cover')  # contain: داخل الإطار بدون قص، cover: يملأ الإطار مع قص الأطراف
+CACHE_MAX_AGE = 60 * 60 * 24 * 30
+# بعد الحذف ننزل إلى 90% من الحد حتى لا يتكرر المسح مع كل ملف جديد
+EVICT_TO = 0.9
+# الصور الأصلية المسموحة: التخزين حسب المحتوى ومجلدات الرفع القديمة فقط (وليس أي ملف في media)
+SOURCE_DIRS = (f'{BLOB_DIR}/',) + tuple(sorted(
+    {model._meta.get_field(field_name).upload_to for model, field_name in IMAGE_FIELDS}
+))
+
+
+class ResizeError(Exception):
+    pass
+
+
+def output_formats():
+    return modern_formats() + ['jpg']
+
+
+def resized_image(name, width, height, fit='contain', fmt='webp'):
+    """مسار الصورة المصغرة في الكاش ومفتاحها (يُستخدم ETag)، مع توليدها إن لم تكن موجودة"""
+    if (width, height) not in set(map(tuple, settings.RESIZE_SIZES)):
+        raise ResizeError(f"مقاس غير مسموح: {width}x{height}")
+    if fit not in FITS or fmt not in output_formats():
+        raise ResizeError(f"معطيات غير صحيحة: {fit}, {fmt}")
+    # المسار يُوحّد قبل فحص المجلد: products/../private/x.png يبدأ بـ products/ لكنه يقرأ من خارجه
+    if posixpath.normpath(name) != name or '..' in name.split('/') or not name.startswith(SOURCE_DIRS):
+        raise ResizeError(f"مسار غير مسموح: {name}")
+    try:
+        modified = default_storage.get_modified_time(name).timestamp()
+    except (FileNotFoundError, SuspiciousFileOperation):
+        raise ResizeError(f"صورة غير موجودة: {name}")
+
+    key = hashlib.sha256(f'{name}|{modified}|{width}x{height}|{fit}'.encode()).hexdigest()[:32]
+    path = os.path.join(settings.RESIZE_CACHE_DIR, key[:2], f'{key}.{fmt}')
+    try:
+        os.utime(path)  # موجودة: تحديث وقت آخر استخدام
+    except FileNotFoundError:
+        render(name, width, height, fit, fmt, path)
+        evict(settings.RESIZE_CACHE_MAX_BYTES)
+    return path, f'{key}.{fmt}'
+
+
+def render(name, width, height, fit, fmt, path):
+    image = load_image(name)
+    if image is None:
+        raise ResizeError(f"صورة غير صالحة: {name}")
+    if fit == 'cover':
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    else:
+        image.thumbnail((width, height), Image.LANCZOS)
+
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    # الكتابة في ملف مؤقت ثم إعادة التسمية: طلب متزامن لنفس الصورة لا يقرأ ملفاً نصف مكتوب
+    with tempfile.NamedTemporaryFile(dir=folder, delete=False) as file:
+        file.write(encode(image, fmt))
+    os.replace(file.name, path)
+
+
+def evict(limit):
+    """حذف الأقدم استخداماً حتى يعود حجم الكاش تحت الحد. يرجع عدد الملفات المحذوفة"""
+    entries, total = [], 0
+    with os.scandir(settings.RESIZE_CACHE_DIR) as folders:
+        for folder in folders:
+            if not folder.is_dir():
+                continue
+            with os.scandir(folder.path) as files:
+                for entry in files:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+    if total <= limit:
+        return 0
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= limit * EVICT_TO:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
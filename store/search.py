@@ -0,0 +1,140 @@
+import re
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product, Category
+
+# --- البحث النصي الكامل (SQLite FTS5) ---
+# جدول افتراضي يحفظ نسخة "مُوحّدة" من اسم المنتج ووصفه واسم قسمه، رقم الصف فيه = رقم المنتج.
+# التوحيد يتم على النص المخزن وعلى نص البحث معاً، فتتطابق الكلمات رغم اختلاف الإملاء أو التشكيل
+SEARCH_TABLE = 'store_product_search'
+
+# أوزان bm25 للأعمدة بالترتيب: الاسم، الوصف، القسم
+SEARCH_WEIGHTS = (10.0, 1.0, 3.0)
+
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')  # التشكيل والتطويل
+ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    'ؤ': 'و',
+    'ئ': 'ي',
+})
+# "ال" التعريف وما يسبقها من حروف (وال، بال، فال، كال، لل) في بداية الكلمة
+ARABIC_ARTICLE = re.compile(r'^(?:[وفبك]?ال|لل)(?=\w{3})')
+WORD = re.compile(r'\w+')
+
+
+def normalize_arabic(text):
+    if not text:
+        return ''
+    text = ARABIC_DIACRITICS.sub('', text)
+    return text.translate(ARABIC_LETTERS).lower()
+
+
+def strip_article(word):
+    return ARABIC_ARTICLE.sub('', word)
+
+
+def index_text(text):
+    # كل كلمة معرّفة تُفهرس بصيغتين: "الالعاب" و "العاب"، حتى يجدها البحث بـ/بدون "ال"
+    words = []
+    for word in WORD.findall(normalize_arabic(text)):
+        words.append(word)
+        stripped = strip_article(word)
+        if stripped != word:
+            words.append(stripped)
+    return ' '.join(words)
+
+
+@receiver(connection_created)
+def register_normalize_function(sender, connection, **kwargs):
+    # نسجل دالة التوحيد داخل SQLite لنستطيع إعادة بناء الفهرس بجملة SQL واحدة
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('ar_normalize', 1, index_text, deterministic=True)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+INDEX_SQL = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, name, description, category)
+    SELECT p.id, ar_normalize(p.name), ar_normalize(p.description), ar_normalize(c.name)
+    FROM store_product p INNER JOIN store_category c ON c.id = p.category_id
+"""
+
+
+def index_products(where='', params=()):
+    with connection.cursor() as cursor:
+        if where:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT p.id FROM store_product p WHERE {where})", params)
+        else:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(INDEX_SQL + (f" WHERE {where}" if where else ''), params)
+
+
+def rebuild_index():
+    if is_available():
+        index_products()
+
+
+# --- التحديث التدريجي للفهرس ---
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if is_available() and not raw:
+        index_products('p.id = %s', [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created=False, raw=False, **kwargs):
+    # اسم القسم جزء من الفهرس، فنعيد فهرسة منتجاته عند تعديله
+    if is_available() and not created and not raw:
+        index_products('p.category_id = %s', [instance.pk])
+
+
+def build_match_expression(query):
+    # كل كلمة تُطابق كبداية كلمة ("لاب" تجد "لابتوب")، والكلمات مرتبطة بـ AND
+    # والكلمة المعرّفة تُبحث بصيغتيها: "الالعاب" أو "العاب"
+    terms = []
+    for word in WORD.findall(normalize_arabic(query)):
+        stripped = strip_article(word)
+        if stripped != word:
+            terms.append(f'("{word}"* OR "{stripped}"*)')
+        else:
+            terms.append(f'"{word}"*')
+    return ' AND '.join(terms)
+
+
+def search_products(queryset, query):
+    """فلترة المنتجات حسب نص البحث، مع حقل search_rank للترتيب حسب الصلة (الأصغر أفضل)"""
+    expression = build_match_expression(query)
+    if not expression:
+        return queryset, None
+
+    if not is_available():
+        # قواعد بيانات أخرى: بحث بسيط في الاسم والوصف
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query)), None
+
+    # المطابقة في جدول الفهرس مرة واحدة (id IN ...)، ودرجة bm25 لكل نتيجة من صفها في الفهرس مباشرة (rowid)
+    weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
+    matches = RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [expression])
+    rank = RawSQL(
+        f'SELECT bm25({SEARCH_TABLE}, {weights}) FROM {SEARCH_TABLE} '
+        f'WHERE {SEARCH_TABLE} MATCH %s AND {SEARCH_TABLE}.rowid = {Product._meta.db_table}.id',
+        [expression], output_field=FloatField(),
+    )
+    queryset = queryset.filter(id__in=matches).annotate(search_rank=rank)
+    return queryset, ('search_rank', '-id')
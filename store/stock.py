@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.dispatch import Signal
+
+from .catalog_cache import bump_catalog_version
+from .models import Order, OrderItem, Product
+
+
+# --- حجز المخزون عند إتمام الطلب ---
+# الخصم يتم بجملة UPDATE مشروطة لكل منتج (stock >= الكمية)، فقاعدة البيانات نفسها تمنع
+# بيع نفس القطعة لطلبين متزامنين، بدلاً من القراءة ثم الفحص في بايثون ثم الحفظ
+# أسطر الطلب تُنشأ بـ bulk_create الذي لا يرسل post_save، فنرسل هذه الإشارة بدلاً منه
+# (يستقبلها ملخص المبيعات اليومي في تطبيق dashboard لإضافة عدد القطع)
+order_items_created = Signal()  # الوسائط: order, items
+
+# تغيير حالة مجموعة طلبات بجملة UPDATE واحدة لا يرسل post_save، فتُرسل هذه الإشارة مرة واحدة للدفعة كلها
+# moved قاموس (الحالة السابقة -> أرقام الطلبات التي انتقلت منها)، status الحالة الجديدة
+orders_status_changed = Signal()  # الوسائط: moved, status
+
+
+class OutOfStock(Exception):
+    def __init__(self, products):
+        self.products = products
+        super().__init__("الكمية غير متوفرة: " + "، ".join(p.name for p in products))
+
+
+def reserve_stock(lines):
+    """خصم الكميات من المخزون، lines قائمة من (رقم المنتج، الكمية). يجب استدعاؤها داخل transaction.atomic"""
+    short = []
+    # ترتيب ثابت حسب رقم المنتج حتى لا يقفل طلبان نفس المنتجات بترتيب معاكس
+    for product_id, quantity in sorted(lines):
+        updated = Product.objects.filter(pk=product_id, stock_quantity__gte=quantity).update(
+            stock_quantity=F('stock_quantity') - quantity,
+        )
+        if not updated:
+            short.append(product_id)
+    if short:
+        raise OutOfStock(list(Product.objects.filter(pk__in=short)))
+    # التحديث المباشر لا يرسل إشارات الحفظ، فنرفع نسخة الكتالوج (داخل نفس المعاملة: تُلغى مع الطلب)
+    bump_catalog_version()
+
+
+def create_order_items(order, items):
+    """حجز المخزون وإنشاء أسطر الطلب دفعة واحدة؛ أي نقص يلغي الطلب كاملاً (OutOfStock)"""
+    with transaction.atomic():
+        reserve_stock([(item['product'].id, int(item['quantity'])) for item in items])
+        created = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=item['product'], price=item['price'], quantity=int(item['quantity']))
+            for item in items
+        ])
+        order_items_created.send(sender=OrderItem, order=order, items=created)
+        return created
+
+
+def order_lines(order_ids):
+    """مجموع الكميات لكل منتج في مجموعة طلبات: قائمة (رقم المنتج، الكمية)"""
+    # سطر منتج حُذف بعد الطلب (product_id فارغ) لا مخزون له يُحجز
+    return list(
+        OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False).order_by().values('product_id')
+        .annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+
+
+def restore_stock(order_ids):
+    """إرجاع كميات الطلبات الملغاة للمخزون: جملة UPDATE واحدة لكل المنتجات (استعلام فرعي بمجموع كل منتج)"""
+    items = OrderItem.objects.filter(order_id__in=order_ids)
+    returned = items.filter(product=OuterRef('pk')).order_by().values('product').annotate(total=Sum('quantity'))
+    updated = Product.objects.filter(pk__in=items.values('product_id')).update(
+        stock_quantity=F('stock_quantity') + Subquery(returned.values('total')),
+    )
+    bump_catalog_version()
+    return updated
+
+
+def move_orders(order_ids, previous, status):
+    """نقل الطلبات التي حالتها previous إلى status، ويرجع أرقام ما انتقل فعلاً. يجب استدعاؤها داخل transaction.atomic"""
+    while True:
+        ids = list(
+            Order.objects.select_for_update().filter(pk__in=order_ids, status=previous).values_list('id', flat=True)
+        )
+        if not ids:
+            return []
+        savepoint = transaction.savepoint()
+        if Order.objects.filter(pk__in=ids, status=previous).update(status=status) == len(ids):
+            transaction.savepoint_commit(savepoint)
+            return ids
+        # SQLite يتجاهل select_for_update، فقد يغيّر غيرنا حالة طلب بين القراءة والتحديث ولا نعرف أي الصفوف
+        # حدّثناها نحن: نتراجع ونعيد القراءة. كتابتنا الأولى حجزت القاعدة حتى نهاية المعاملة فالقراءة الثانية ثابتة
+        transaction.savepoint_rollback(savepoint)
+
+
+def change_order_status(order_ids, status):
+    """نقل مجموعة طلبات إلى حالة جديدة. يرجع عدد الطلبات التي تغيرت فعلاً
+
+    كل حالة سابقة تُحدّث بجملة UPDATE مشروطة بها، فتكرار نفس العملية لا يغير شيئاً. الإلغاء يعيد
+    الكميات للمخزون، والخروج من الإلغاء يحجزها من جديد (OutOfStock يلغي الدفعة كاملة)
+    """
+    moved = {}
+    with transaction.atomic():
+        for previous, _ in Order.STATUS_CHOICES:
+            if previous == status:
+                continue
+            ids = move_orders(order_ids, previous, status)
+            if ids:
+                moved[previous] = ids
+
+        if status == 'cancelled':
+            active = [pk for ids in moved.values() for pk in ids]
+            if active:
+                restore_stock(active)
+        elif moved.get('cancelled'):
+            reserve_stock(order_lines(moved['cancelled']))
+
+        if moved:
+            orders_status_changed.send(sender=Order, moved=moved, status=status)
+    return sum(len(ids) for ids in moved.values())
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+# --- تخزين الصور حسب المحتوى ---
+# اسم الملف هو بصمة SHA-256 لمحتواه: blobs/<أول حرفين>/<البصمة>.<الامتداد>
+# فرفع نفس الصورة مرة ثانية (لمنتج آخر أو لقسم) يرجع نفس الملف بدلاً من نسخة جديدة باسم مختلف،
+# ومحتوى الرابط لا يتغير أبداً. عدد السجلات التي تشير لكل ملف في MediaFile (انظر store/media_refs.py)
+BLOB_DIR = 'blobs'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_DIR}/')
+
+
+def blob_name(digest, ext):
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}{ext.lower()}'
+
+
+def content_digest(content):
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # الاسم بصمة المحتوى: ملف موجود بنفس الاسم هو نفس المحتوى، فلا نبحث عن اسم بديل
+        return name
+
+    def save(self, name, content, max_length=None):
+        """الاسم المرفوع يُستخدم لامتداده فقط؛ إذا كان المحتوى موجوداً لا يُكتب شيء"""
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = blob_name(content_digest(content), os.path.splitext(name)[1])
+        return super().save(name, content, max_length)
+
+    def _save(self, name, content):
+        path = self.path(name)
+        try:
+            # ملف قديم عاد للاستخدام: تحديث وقته حتى لا يحذفه collect قبل حفظ السجل (فترة السماح)
+            os.utime(path)
+            return name
+        except FileNotFoundError:
+            pass
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        # الكتابة في ملف مؤقت ثم ربطه بالاسم النهائي: os.link يفشل إذا سبقنا رفع متزامن لنفس المحتوى
+        # (بدلاً من فحص exists ثم الكتابة)، ولا يُقرأ ملف نصف مكتوب أبداً
+        with tempfile.NamedTemporaryFile(dir=folder, delete=False) as file:
+            for chunk in content.chunks():
+                file.write(chunk)
+        try:
+            os.chmod(file.name, self.file_permissions_mode or 0o644)
+            os.link(file.name, path)
+        except FileExistsError:
+            os.utime(path)
+        finally:
+            os.remove(file.name)
+        return name
+
+    def delete(self, name):
+        # الملف المشترك لا يُحذف ما دام سجل يشير إليه؛ الحذف الفعلي عند وصول العدد للصفر
+        if is_blob(name):
+            from .media_refs import collect
+            collect(name)
+            return
+        super().delete(name)
+
+    def remove(self, name):
+        """حذف فعلي بدون فحص المراجع (يستدعيه collect بعد التأكد)"""
+        super().delete(name)
@@ -1,14 +1,9 @@
-import requests
+from django.conf import settings
 
-def send_telegram_order(order):
-    # -------------------------------------------------------
-    # استبدل القيم التالية بالتي حصلت عليها من تلجرام
-    BOT_TOKEN = '7846123604:AAG3hHxQMp8be71opByo6v5rKNiAqdsL7Us'
-    CHAT_ID = '6656634781'
-    # -------------------------------------------------------
+from .models import Notification
 
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    
+
+def build_order_message(order):
     # حساب مجموع المنتجات فقط (بدون توصيل وخصم) للعرض
     # الإجمالي النهائي = (مجموع المنتجات - الخصم) + التوصيل
     # إذن مجموع المنتجات = الإجمالي النهائي - التوصيل + الخصم
@@ -36,13 +31,13 @@ def send_telegram_order(order):
 🔗 <a href="http://172.16.0.21:8000/dashboard/orders/{order.id}/">عرض التفاصيل في اللوحة</a>
 """
 
-    data = {
-        'chat_id': CHAT_ID,
-        'text': message,
-        'parse_mode': 'HTML'
-    }
+    return message
+
 
-    try:
-        requests.post(url, data=data)
-    except Exception as e:
-        print(f"Telegram Error: {e}")
\ No newline at end of file
+def queue_telegram_order(order):
+    """إضافة إشعار الطلب لطابور الإشعارات (يُستدعى داخل معاملة إنشاء الطلب)"""
+    return Notification.objects.create(channel='telegram', payload={
+        'chat_id': settings.TELEGRAM_CHAT_ID,
+        'text': build_order_message(order),
+        'parse_mode': 'HTML',
+    })
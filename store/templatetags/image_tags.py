@@ -0,0 +1,84 @@
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django import template
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
+
+from store.images import CONTENT_TYPES, PRESETS, has_variants, modern_formats, variant_name
+
+register = template.Library()
+
+# صورة مؤقتة خفيفة (SVG رمادي) تُعرض حتى ينتهي توليد نسخ الصورة في الخلفية (للصور المرفوعة للتو فقط)
+PLACEHOLDER = (
+    "data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 4 3'%3E"
+    "%3Crect width='4' height='3' fill='%23eef0f3'/%3E%3C/svg%3E"
+)
+
+
+def variant_srcset(name, fmt):
+    # العرض في الوصف هو أقصى مقاس النسخة، فيختار المتصفح الأصغر الكافي لعرض العنصر وكثافة الشاشة
+    return ', '.join(
+        f"{default_storage.url(variant_name(name, preset, fmt))} {size}w"
+        for preset, size in sorted(PRESETS.items(), key=lambda item: item[1])
+    )
+
+
+def is_pending(name):
+    # رُفعت للتو فتوليد نسخها ما زال جارياً؛ الأقدم بدون نسخ لن تكتمل نسخها وحدها
+    try:
+        modified = default_storage.get_modified_time(name)
+    except (FileNotFoundError, SuspiciousFileOperation):
+        return False
+    return timezone.now() - modified < timedelta(seconds=settings.IMAGE_PENDING_SECONDS)
+
+
+@register.filter
+def variant_url(image, preset):
+    """رابط نسخة JPEG بالمقاس المطلوب؛ قبل جاهزية النسخ: الصورة المؤقتة لصورة رُفعت للتو، وإلا الأصلية"""
+    if not image:
+        return ''
+    if has_variants(image.name):
+        return default_storage.url(variant_name(image.name, preset, 'jpg'))
+    return PLACEHOLDER if is_pending(image.name) else image.url
+
+
+@register.simple_tag
+def picture(image, preset='card', alt='', **attrs):
+    """
+    <picture> بصيغ حديثة ومقاسات متعددة مع <img> بصيغة JPEG احتياطياً.
+    مثال: {% picture product.main_image 'card' alt=product.name class='img-fluid' %}
+    """
+    if not image:
+        return ''
+    extra = format_html_join('', ' {}="{}"', ((key.replace('_', '-'), value) for key, value in attrs.items()))
+    if not has_variants(image.name):
+        if is_pending(image.name):
+            return format_html('<img src="{}" alt="{}" data-pending="1"{}>', PLACEHOLDER, alt, extra)
+        return format_html('<img src="{}" alt="{}" loading="lazy"{}>', image.url, alt, extra)
+
+    name = image.name
+    sizes = f"{PRESETS[preset]}px"
+    sources = format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+        (CONTENT_TYPES[fmt], variant_srcset(name, fmt), sizes) for fmt in modern_formats()
+    ))
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="lazy" decoding="async"{}></picture>',
+        sources, default_storage.url(variant_name(name, preset, 'jpg')), variant_srcset(name, 'jpg'), sizes, alt, extra,
+    )
+
+
+@register.simple_tag
+def resized_url(image, width, height, fit='contain', fmt='webp'):
+    """
+    رابط الصورة بمقاس من RESIZE_SIZES (تُولّد عند أول طلب ثم تُقرأ من الكاش).
+    مثال: {% resized_url product.main_image 1200 630 'cover' 'jpg' as og_image %}
+    """
+    if not image:
+        return ''
+    query = urlencode({'w': width, 'h': height, 'fit': fit, 'fmt': fmt})
+    return f"{reverse('resize_image', args=[image.name])}?{query}"
@@ -1,3 +1,1078 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import shutil
+import smtplib
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .catalog_cache import bump_catalog_version, catalog_cache_context, get_catalog_version
+from .fuzzy import RECONCILE_SECONDS, ProductNameIndex
+from .images import (
+    PRESETS, generate_variants, has_variants, modern_formats, schedule_variants, shutdown_pool, variant_name,
+    variants_ready,
+)
+from .media_gc import collect_media
+from .media_refs import UPLOAD_GRACE_SECONDS, collect
+from .models import (
+    CacheVersion, CartItem, Category, CategoryClosure, Coupon, HomeSection, MediaFile, Notification, Order, OrderItem,
+    Product, ProductImage, Review, media_storage,
+)
+from .notifications import (
+    EmailSender, TelegramSender, backlog, claim, due_notifications, process_batch, queue_email,
+)
+from .pagination import KeysetPage
+from .resize import EVICT_TO, ResizeError, evict, resized_image
+from .search import search_products
+from .stock import OutOfStock, create_order_items
+
+
+def cart_queries(queries):
+    return [q['sql'] for q in queries if 'store_cartitem' in q['sql']]
+
+
+def session_writes(queries):
+    return [
+        q['sql'] for q in queries
+        if 'django_session' in q['sql'] and q['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+    ]
+
+
+class LazyCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='هواتف', slug='phones')
+        cls.product = Product.objects.create(
+            category=category, name='هاتف', slug='phone', description='-', price=1000, stock_quantity=5,
+        )
+        cls.user = User.objects.create_user('buyer', password='secret-pass')
+        CartItem.objects.create(user=cls.user, product=cls.product, quantity=2)
+
+    def test_anonymous_page_view_does_no_cart_work(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('about'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cart_queries(ctx.captured_queries), [])
+        self.assertEqual(session_writes(ctx.captured_queries), [])
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_authenticated_page_view_does_no_cart_work(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('about'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cart_queries(ctx.captured_queries), [])
+        self.assertEqual(session_writes(ctx.captured_queries), [])
+
+    def test_login_merges_saved_cart_once(self):
+        self.client.login(username='buyer', password='secret-pass')
+        cart = self.client.session['cart_session_id']
+        self.assertEqual(cart[str(self.product.id)]['quantity'], 2)
+
+
+class CartSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='هواتف', slug='phones')
+        cls.products = Product.objects.bulk_create([
+            Product(category=category, name=f'هاتف {i}', slug=f'phone-{i}', description='-', price=1000, stock_quantity=5)
+            for i in range(21)
+        ])
+        cls.user = User.objects.create_user('buyer', password='secret-pass')
+
+    def add_to_cart(self, product):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('cart_add', args=[product.id]))
+        return len(cart_queries(ctx.captured_queries))
+
+    def test_cart_mutation_query_count_is_constant(self):
+        self.client.force_login(self.user)
+        small = self.add_to_cart(self.products[0])
+        for product in self.products[1:20]:
+            self.client.get(reverse('cart_add', args=[product.id]))
+        large = self.add_to_cart(self.products[20])
+        self.assertEqual(small, large)
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 21)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('cart_remove', args=[self.products[0].id]))
+        self.assertLessEqual(len(cart_queries(ctx.captured_queries)), small)
+        self.assertFalse(CartItem.objects.filter(user=self.user, product=self.products[0]).exists())
+
+
+class StockReservationTests(TransactionTestCase):
+    buyers = 50
+
+    def setUp(self):
+        category = Category.objects.create(name='هواتف', slug='phones')
+        self.product = Product.objects.create(
+            category=category, name='آخر قطعة', slug='last-one', description='-', price=1000, stock_quantity=1,
+        )
+
+    def buy(self, results):
+        product = self.product
+        try:
+            # SQLite يرفض الكتابة المتزامنة بخطأ "locked" بدلاً من الانتظار، فنعيد المحاولة كما يفعل الزبون
+            while True:
+                try:
+                    with transaction.atomic():
+                        order = Order.objects.create(full_name='زبون', phone='0770', address='-', total_amount=1000)
+                        create_order_items(order, [{'product': product, 'quantity': 1, 'price': product.price}])
+                    results.append('ok')
+                    return
+                except OutOfStock:
+                    results.append('out')
+                    return
+                except OperationalError:
+                    time.sleep(0.001)
+        finally:
+            connection.close()
+
+    def test_concurrent_buyers_never_oversell(self):
+        results = []
+        start = threading.Barrier(self.buyers)
+
+        def buyer():
+            start.wait()
+            self.buy(results)
+
+        threads = [threading.Thread(target=buyer) for _ in range(self.buyers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count('ok'), 1)
+        self.assertEqual(results.count('out'), self.buyers - 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 0)
+        # الطلبات الفاشلة لا تترك طلباً نصف مكتمل
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 1)
+
+
+class CartMemoizationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='هواتف', slug='phones')
+        cls.products = Product.objects.bulk_create([
+            Product(category=category, name=f'هاتف {i}', slug=f'phone-{i}', description='-', price=1000, stock_quantity=5)
+            for i in range(5)
+        ])
+        now = timezone.now()
+        cls.coupon = Coupon.objects.create(
+            code='SAVE10', discount=10, valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+        )
+
+    def test_checkout_render_loads_products_and_coupon_once(self):
+        for product in self.products:
+            self.client.get(reverse('cart_add', args=[product.id]))
+        self.client.post(reverse('coupon_apply'), {'code': 'SAVE10'})
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('checkout'))
+        self.assertEqual(response.status_code, 200)
+        tables = [q['sql'] for q in ctx.captured_queries if '"store_product"' in q['sql'] or '"store_coupon"' in q['sql']]
+        self.assertEqual(len(tables), 2)
+        summary = response.context['cart'].summary
+        self.assertEqual(summary.subtotal, 5000)
+        self.assertEqual(summary.discount, 500)
+        self.assertEqual(summary.total, 4500)
+
+    def test_deleted_product_leaves_totals_and_session(self):
+        for product in self.products[:3]:
+            self.client.get(reverse('cart_add', args=[product.id]))
+        Product.objects.filter(id=self.products[0].id).delete()
+
+        response = self.client.get(reverse('checkout'))
+        summary = response.context['cart'].summary
+        self.assertEqual((summary.count, summary.subtotal, summary.total), (2, 2000, 2000))
+        self.assertEqual(len(response.context['cart'].items), 2)
+        # رقم المنتج المحذوف لم يعد في الجلسة
+        self.assertEqual(set(self.client.session['cart_session_id']), {str(p.id) for p in self.products[1:3]})
+
+
+class StubTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # يسمح بإعادة استخدام الاتصال (keep-alive)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        server.requests.append((self.client_address, parse_qs(body.decode())))
+        status, payload = server.responses.pop(0) if server.responses else (200, {'ok': True})
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(TELEGRAM_CHAT_INTERVAL=0, TELEGRAM_GLOBAL_INTERVAL=0)
+class NotificationWorkerTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubTelegramHandler)
+        self.server.requests, self.server.responses = [], []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        settings_override = override_settings(TELEGRAM_API_URL=url, TELEGRAM_BOT_TOKEN='token')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.sender = TelegramSender()
+        self.addCleanup(self.sender.close)
+
+    def queue(self, text):
+        return Notification.objects.create(payload={'chat_id': '1', 'text': text, 'parse_mode': 'HTML'})
+
+    def test_batch_is_sent_over_one_connection(self):
+        for i in range(3):
+            self.queue(f'طلب {i}')
+        self.assertEqual(process_batch({'telegram': self.sender}), {'sent': 3, 'pending': 0, 'failed': 0})
+        self.assertEqual([r[1]['text'][0] for r in self.server.requests], ['طلب 0', 'طلب 1', 'طلب 2'])
+        self.assertEqual(len({r[0] for r in self.server.requests}), 1)
+        self.assertEqual(backlog()[0], 0)
+
+    def test_server_errors_are_retried_with_backoff(self):
+        notification = self.queue('طلب')
+        self.server.responses = [(500, {'ok': False})]
+        self.assertEqual(process_batch({'telegram': self.sender})['pending'], 1)
+        notification.refresh_from_db()
+        self.assertEqual(notification.attempts, 1)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        self.assertEqual(backlog()[0], 1)
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_batch({'telegram': self.sender})['sent'], 1)
+
+    def test_rate_limit_pauses_the_batch(self):
+        first, second = self.queue('1'), self.queue('2')
+        self.server.responses = [(429, {'ok': False, 'parameters': {'retry_after': 30}})]
+        self.assertEqual(process_batch({'telegram': self.sender}), {'sent': 0, 'pending': 1, 'failed': 0})
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertGreaterEqual(first.next_attempt_at, timezone.now() + timedelta(seconds=29))
+        self.assertEqual(len(self.server.requests), 1)
+        # الثاني لم يُحجز ولم يُرسل، يبقى مستحقاً للدفعة القادمة
+        self.assertEqual(second.attempts, 0)
+        self.assertLessEqual(second.next_attempt_at, timezone.now())
+
+    def test_batch_read_by_two_workers_is_sent_once(self):
+        for text in ('1', '2'):
+            self.queue(text)
+        stale = due_notifications(50, ['telegram'])  # عامل آخر قرأ نفس الدفعة
+        self.assertEqual(process_batch({'telegram': self.sender})['sent'], 2)
+        with patch('store.notifications.due_notifications', return_value=stale):
+            self.assertEqual(process_batch({'telegram': self.sender}), {'sent': 0, 'pending': 0, 'failed': 0})
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_claimed_notification_returns_after_lease(self):
+        notification = self.queue('1')
+        self.assertTrue(claim(notification))  # عامل توقف بعد الحجز
+        self.assertEqual(due_notifications(50, ['telegram']), [])
+        Notification.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(process_batch({'telegram': self.sender})['sent'], 1)
+
+    def test_bad_request_fails_without_retry(self):
+        notification = self.queue('طلب')
+        self.server.responses = [(400, {'ok': False, 'description': 'chat not found'})]
+        self.assertEqual(process_batch({'telegram': self.sender})['failed'], 1)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'failed')
+        self.assertIn('chat not found', notification.last_error)
+
+
+class CountingEmailBackend(EmailBackend):
+    connections = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        CountingEmailBackend.connections += 1
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise smtplib.SMTPServerDisconnected("relay down")
+
+
+class UnreachableEmailBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        UnreachableEmailBackend.opened += 1
+        raise ConnectionRefusedError("relay unreachable")
+
+
+class EmailQueueTests(TestCase):
+    def register(self, username):
+        return self.client.post(reverse('register'), {
+            'username': username, 'first_name': 'زبون', 'last_name': 'محمد', 'email': f'{username}@example.com', 'phone': '07700000000',
+            'password1': 'Very-secret-42', 'password2': 'Very-secret-42',
+        })
+
+    @override_settings(EMAIL_BACKEND='store.tests.CountingEmailBackend')
+    def test_register_returns_before_sending_and_worker_reuses_one_connection(self):
+        for name in ('ali', 'sara', 'omar'):
+            self.assertRedirects(self.register(name), reverse('verify_email'), fetch_redirect_response=False)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Notification.objects.filter(channel='email', status='pending').count(), 3)
+
+        CountingEmailBackend.connections = 0
+        sender = EmailSender()
+        self.assertEqual(process_batch({'email': sender})['sent'], 3)
+        sender.close()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(CountingEmailBackend.connections, 1)
+        self.assertIn(User.objects.get(username='ali').profile.otp_code, mail.outbox[0].body)
+
+    @override_settings(EMAIL_BACKEND='store.tests.UnreachableEmailBackend')
+    def test_unreachable_relay_is_retried_with_backoff(self):
+        queue_email("موضوع", "نص", ['a@example.com'])
+        sender = EmailSender()
+        UnreachableEmailBackend.opened = 0
+        self.assertEqual(process_batch({'email': sender}), {'sent': 0, 'pending': 1, 'failed': 0})
+        notification = Notification.objects.get()
+        self.assertEqual(notification.attempts, 1)
+        self.assertIn('relay unreachable', notification.last_error)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        self.assertIsNone(sender.connection)
+
+        # المحاولة التالية تفتح اتصالاً جديداً
+        Notification.objects.update(next_attempt_at=timezone.now())
+        process_batch({'email': sender})
+        self.assertEqual(UnreachableEmailBackend.opened, 2)
+
+    def test_codes_are_not_stored_in_the_queue(self):
+        self.register('ali')
+        profile = User.objects.get(username='ali').profile
+        notification = Notification.objects.get()
+        self.assertNotIn(profile.otp_code, json.dumps(notification.payload, ensure_ascii=False))
+
+        staff = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass')
+        self.client.force_login(staff)
+        response = self.client.get(reverse('admin:store_notification_change', args=[notification.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'field-payload')
+        self.assertNotContains(response, 'كود التحقق الخاص بك')
+
+        # كود جديد قبل الإرسال: يصل الأحدث، وبعد استخدامه لا تُرسل الرسالة القديمة
+        profile.otp_code = '123456'
+        profile.save()
+        sender = EmailSender()
+        self.assertEqual(process_batch({'email': sender})['sent'], 1)
+        self.assertIn('123456', mail.outbox[0].body)
+        profile.otp_code = None
+        profile.save()
+        Notification.objects.update(status='pending', next_attempt_at=timezone.now())
+        self.assertEqual(process_batch({'email': sender})['failed'], 1)
+        sender.close()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_reset_code_is_rendered_at_send_time(self):
+        user = User.objects.create_user('sara', 'sara@example.com', 'Very-secret-42')
+        response = self.client.post(reverse('forgot_password'), {'email': 'sara@example.com'})
+        self.assertRedirects(response, reverse('verify_reset_code'), fetch_redirect_response=False)
+        code = User.objects.get(pk=user.pk).profile.otp_code
+        self.assertNotIn(code, json.dumps(Notification.objects.get().payload, ensure_ascii=False))
+        sender = EmailSender()
+        process_batch({'email': sender})
+        sender.close()
+        self.assertIn(f'كود استعادة الحساب هو: {code}', mail.outbox[0].body)
+
+    @override_settings(EMAIL_BACKEND='store.tests.FailingEmailBackend', NOTIFICATION_MAX_ATTEMPTS=2)
+    def test_undeliverable_activation_code_removes_inactive_user(self):
+        self.register('ali')
+        sender = EmailSender()
+        self.assertEqual(process_batch({'email': sender})['pending'], 1)
+        self.assertTrue(User.objects.filter(username='ali').exists())
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_batch({'email': sender})['failed'], 1)
+        self.assertFalse(User.objects.filter(username='ali').exists())
+
+
+def png_upload(name, size=(1600, 1200)):
+    buffer = BytesIO()
+    Image.new('RGBA', size, (200, 30, 30, 128)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+def age_file(name, seconds):
+    # ملف مرفوع قبل فترة السماح (الحذف الفوري لا يلمس الملفات الأحدث منها)
+    old = time.time() - seconds
+    os.utime(default_storage.path(name), (old, old))
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        # بدون عمليات خلفية: النسخ تُولّد داخل الحفظ نفسه
+        settings = override_settings(MEDIA_ROOT=media, IMAGE_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_variants_generated_on_save(self):
+        category = Category.objects.create(name="شاشات", slug='screens', image=png_upload('screens.png'))
+        name = category.image.name
+        for preset, size in PRESETS.items():
+            for fmt in modern_formats() + ['jpg']:
+                path = variant_name(name, preset, fmt)
+                self.assertTrue(default_storage.exists(path), path)
+                with default_storage.open(path) as file:
+                    self.assertEqual(max(Image.open(file).size), size)
+
+    def test_picture_tag_uses_variants(self):
+        category = Category.objects.create(name="شاشات", slug='screens')
+        product = Product.objects.create(
+            category=category, name="شاشة", slug='screen', description='-', price=100,
+            stock_quantity=1, main_image=png_upload('screen.png'),
+        )
+        html = self.client.get(reverse('product_detail', args=[product.slug])).content.decode()
+        self.assertIn(variant_name(product.main_image.name, 'large', 'jpg'), html)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertNotIn(f'src="{product.main_image.url}"', html)
+
+    def test_failed_version_bump_is_logged(self):
+        future = Future()
+        future.set_result(True)
+        with patch('store.images.bump_catalog_version', side_effect=OperationalError("database is locked")), \
+                patch('store.images.close_old_connections') as close:
+            with self.assertLogs('store.images', 'ERROR') as logs:
+                variants_ready(future)
+        self.assertIn("database is locked", logs.output[0])
+        close.assert_called_once()
+
+    def test_failure_after_first_preset_is_not_ready(self):
+        name = default_storage.save('products/partial.png', png_upload('partial.png'))
+        save = default_storage.save
+
+        def failing(path, content, *args, **kwargs):
+            if '/card.' in path:
+                raise OSError("disk full")
+            return save(path, content, *args, **kwargs)
+
+        with patch.object(default_storage, 'save', side_effect=failing), self.assertRaises(OSError):
+            generate_variants(name)
+        # ملفات المقاس الأكبر (عدا العلامة) كُتبت، لكن الصورة لا تُعتبر جاهزة
+        self.assertTrue(default_storage.exists(variant_name(name, 'large', 'webp')))
+        self.assertFalse(default_storage.exists(variant_name(name, 'thumb', 'jpg')))
+        self.assertFalse(has_variants(name))
+        category = Category.objects.create(name="شاشات", slug='screens')
+        with patch('store.images.schedule_variants'):
+            product = Product.objects.create(
+                category=category, name="شاشة", slug='screen', description='-', price=100, main_image=name,
+            )
+        html = Template("{% load image_tags %}{% picture image %}").render(Context({'image': product.main_image}))
+        self.assertNotIn('srcset', html)
+
+        self.assertEqual(generate_variants(name), len(PRESETS) * (len(modern_formats()) + 1))
+        self.assertTrue(has_variants(name))
+
+    def test_original_image_when_variants_are_missing(self):
+        category = Category.objects.create(name="شاشات", slug='screens')
+        name = default_storage.save('products/old.png', png_upload('old.png'))
+        with patch('store.images.schedule_variants'):  # التوليد لم ينته (أو فشل)
+            product = Product.objects.create(
+                category=category, name="شاشة", slug='screen', description='-', price=100, main_image=name,
+            )
+        self.assertFalse(has_variants(name))
+        template = Template("{% load image_tags %}{% picture image 'card' %}|{{ image|variant_url:'thumb' }}")
+        context = Context({'image': product.main_image})
+
+        # رُفعت للتو: صورة مؤقتة حتى يكتمل التوليد
+        self.assertEqual(template.render(context).count('data:image/svg+xml'), 2)
+        # توليد فشل أو صورة قديمة: الأصلية بدلاً من مربع رمادي دائم
+        old = time.time() - 3600
+        os.utime(default_storage.path(name), (old, old))
+        html = template.render(context)
+        self.assertNotIn('data:image/svg+xml', html)
+        self.assertEqual(html.count(product.main_image.url), 2)
+
+
+class ImageWorkerPoolTests(TransactionTestCase):
+    # الاستدعاء الراجع يكتب من خيط آخر، فلا نغلف الاختبار بمعاملة تقفل الجداول عنه
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media, IMAGE_WORKERS=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(shutdown_pool)
+
+    def test_placeholder_until_pool_finishes(self):
+        category = Category.objects.create(name="شاشات", slug='screens')
+        product = Product.objects.create(
+            category=category, name="شاشة", slug='screen', description='-', price=100,
+            stock_quantity=1, main_image='products/screen.png',
+        )
+        name = default_storage.save('products/screen.png', png_upload('screen.png'))
+        url = reverse('product_detail', args=[product.slug])
+        self.assertIn('data-pending="1"', self.client.get(url).content.decode())
+        version = get_catalog_version()
+
+        # الاستدعاءات الراجعة تعمل بترتيب إضافتها، فانتهاء هذا يعني انتهاء variants_ready
+        done = threading.Event()
+        with self.assertNoLogs('store.images', 'ERROR'):
+            schedule_variants(name).add_done_callback(lambda future: done.set())
+            self.assertTrue(done.wait(timeout=60))
+        self.assertTrue(has_variants(name))
+        self.assertGreater(get_catalog_version(), version)
+        self.assertIn(variant_name(name, 'thumb', 'jpg'), self.client.get(url).content.decode())
+
+
+class ResizeImageTests(TestCase):
+    def setUp(self):
+        media, cache = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, cache, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media, RESIZE_CACHE_DIR=cache, IMAGE_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.name = default_storage.save('products/photo.png', png_upload('photo.png'))
+        self.url = reverse('resize_image', args=[self.name])
+
+    def test_resized_once_then_served_from_cache(self):
+        response = self.client.get(self.url, {'w': 400, 'h': 400, 'fit': 'cover', 'fmt': 'jpg'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertEqual(Image.open(BytesIO(b''.join(response.streaming_content))).size, (400, 400))
+
+        with patch('store.resize.render') as render:
+            response = self.client.get(
+                self.url, {'w': 400, 'h': 400, 'fit': 'cover', 'fmt': 'jpg'}, HTTP_IF_NONE_MATCH=response['ETag'],
+            )
+        self.assertEqual(response.status_code, 304)
+        render.assert_not_called()
+
+    def test_only_whitelisted_sizes_and_sources(self):
+        self.assertEqual(self.client.get(self.url, {'w': 401, 'h': 400}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'w': 'x', 'h': 400}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'w': 400, 'h': 400, 'fit': 'stretch'}).status_code, 404)
+        other = reverse('resize_image', args=['variants/products/photo/card.jpg'])
+        self.assertEqual(self.client.get(other, {'w': 400, 'h': 400}).status_code, 404)
+
+    def test_paths_outside_source_dirs_are_rejected(self):
+        # ملف صالح خارج مجلدات الصور، يُطلب عبر مسار يبدأ بمجلد مسموح
+        default_storage.save('private/secret.png', png_upload('secret.png'))
+        for url in [
+            '/image/products/%2e%2e/private/secret.png', '/image/products/../private/secret.png',
+            '/image/products/./../private/secret.png', '/image/products//../private/secret.png',
+        ]:
+            self.assertEqual(self.client.get(url, {'w': 400, 'h': 400}).status_code, 404, url)
+        for name in ['products/../private/secret.png', 'products/./photo.png', 'products//photo.png']:
+            with self.assertRaises(ResizeError):
+                resized_image(name, 400, 400)
+        self.assertEqual(self.client.get(self.url, {'w': 400, 'h': 400}).status_code, 200)
+
+    def test_least_recently_used_evicted(self):
+        paths = [resized_image(self.name, width, width, 'contain', 'jpg')[0] for width in (96, 200, 400)]
+        for age, path in enumerate(reversed(paths)):
+            os.utime(path, (time.time() - 100 * (age + 1),) * 2)
+        resized_image(self.name, 96, 96, 'contain', 'jpg')  # استخدام الأقدم يعيده لأول القائمة
+
+        sizes = {path: os.path.getsize(path) for path in paths}
+        self.assertEqual(evict(int((sizes[paths[0]] + sizes[paths[2]]) / EVICT_TO) + 1), 1)
+        self.assertEqual([os.path.exists(path) for path in paths], [True, False, True])
+
+
+class MediaStorageTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media, IMAGE_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.category = Category.objects.create(name="شاشات", slug='screens')
+
+    def make_product(self, slug, image):
+        return Product.objects.create(
+            category=self.category, name=slug, slug=slug, description='-', price=100, main_image=image,
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.make_product('a', png_upload('a.png', (50, 50)))
+        second = self.make_product('b', png_upload('other-name.png', (50, 50)))
+        gallery = ProductImage.objects.create(product=first, image=png_upload('gallery.png', (50, 50)))
+        name = first.main_image.name
+        self.assertTrue(name.startswith('blobs/'))
+        self.assertEqual({second.main_image.name, gallery.image.name}, {name})
+        self.assertEqual(MediaFile.objects.get(name=name).references, 3)
+
+        # الملف المشترك يبقى ما دام سجل يشير إليه
+        age_file(name, UPLOAD_GRACE_SECONDS + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()  # يحذف صورة المعرض معه
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).references, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.main_image = png_upload('new.png', (60, 60))
+            second.save()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_reused_file_survives_release_until_its_record_is_saved(self):
+        product = self.make_product('a', png_upload('a.png', (50, 50)))
+        name = product.main_image.name
+        age_file(name, UPLOAD_GRACE_SECONDS + 1)
+
+        # رفع جارٍ لنفس المحتوى (سجله لم يُحفظ بعد) بينما يُحذف آخر سجل يشير للملف
+        self.assertEqual(media_storage().save('again.png', png_upload('again.png', (50, 50))), name)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(MediaFile.objects.get(name=name).references, 0)
+        self.assertTrue(default_storage.exists(name))
+        self.assertFalse(collect(name))
+
+        self.make_product('b', name)
+        self.assertEqual(MediaFile.objects.get(name=name).references, 1)
+
+    def test_concurrent_identical_uploads(self):
+        storage = media_storage()
+        self.assertEqual(storage.get_available_name('blobs/ab/abc.png'), 'blobs/ab/abc.png')
+        content = png_upload('a.png', (70, 70)).read()
+        names, start = [], threading.Barrier(4)
+
+        def upload():
+            start.wait()
+            names.append(storage.save('x.png', SimpleUploadedFile('x.png', content)))
+
+        threads = [threading.Thread(target=upload) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(len(set(names)), 1)
+        self.assertEqual(len(names), 4)
+        with storage.open(names[0]) as file:
+            self.assertEqual(file.read(), content)
+        # لا ملفات مؤقتة متبقية بجانب الملف
+        self.assertEqual(os.listdir(os.path.dirname(storage.path(names[0]))), [os.path.basename(names[0])])
+
+    def test_dedupe_media_moves_legacy_files(self):
+        content = png_upload('x.png', (50, 50)).read()
+        old = [default_storage.save(path, SimpleUploadedFile('x.png', content)) for path in
+               ('products/x.png', 'categories/x.png')]
+        self.make_product('a', old[0])
+        Category.objects.filter(pk=self.category.pk).update(image=old[1])
+
+        call_command('dedupe_media', stdout=StringIO())
+        name = Product.objects.get(slug='a').main_image.name
+        self.assertTrue(name.startswith('blobs/'))
+        self.assertEqual(Category.objects.get(pk=self.category.pk).image.name, name)
+        self.assertEqual(MediaFile.objects.get(name=name).references, 2)
+        self.assertFalse(any(default_storage.exists(path) for path in old))
+
+
+class CollectMediaTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media, IMAGE_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def save_file(self, name, age_hours):
+        name = default_storage.save(name, SimpleUploadedFile(name, b'x' * 100))
+        old = time.time() - age_hours * 3600
+        os.utime(default_storage.path(name), (old, old))
+        return name
+
+    def test_orphans_reported_then_removed(self):
+        category = Category.objects.create(name="شاشات", slug='screens')
+        used = self.save_file('products/used.jpg', 48)
+        Product.objects.create(category=category, name="a", slug='a', description='-', price=1, main_image=used)
+        orphan = self.save_file('products/gallery/deleted.jpg', 48)
+        orphan_variant = self.save_file(variant_name(orphan, 'card', 'jpg'), 48)
+        fresh = self.save_file('categories/uploading.jpg', 1)  # داخل فترة السماح
+        stale_variant = self.save_file(variant_name('products/gone.jpg', 'thumb', 'jpg'), 48)
+
+        # نسخ الصورة اليتيمة تُحذف معها، والمجلد الآخر أصله محذوف سابقاً
+        stats = collect_media(24 * 3600)
+        self.assertEqual((stats['orphans'], stats['variant_dirs'], stats['removed']), (1, 1, 0))
+        self.assertTrue(default_storage.exists(orphan))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            collect_media(24 * 3600, delete=True)
+        exists = [default_storage.exists(name) for name in (used, fresh, orphan, orphan_variant, stale_variant)]
+        self.assertEqual(exists, [True, True, False, False, False])
+
+    def test_main_image_removed_from_product(self):
+        staff = User.objects.create_superuser('admin', password='secret-pass')
+        self.client.force_login(staff)
+        category = Category.objects.create(name="شاشات", slug='screens')
+        product = Product.objects.create(
+            category=category, name="a", slug='a', description='-', price=1, main_image=png_upload('a.png', (20, 20)),
+        )
+        name = product.main_image.name
+        age_file(name, UPLOAD_GRACE_SECONDS + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('dashboard_main_image_delete', args=[product.pk]))
+        product.refresh_from_db()
+        self.assertEqual(product.main_image.name, '')
+        self.assertFalse(default_storage.exists(name))
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name="إلكترونيات", slug='electronics')
+        self.phones = Category.objects.create(name="هواتف", slug='phones', parent=self.root)
+        self.android = Category.objects.create(name="أندرويد", slug='android', parent=self.phones)
+        self.laptops = Category.objects.create(name="لابتوبات", slug='laptops', parent=self.root)
+
+    def links(self, category):
+        return set(CategoryClosure.objects.filter(descendant=category).values_list('ancestor__slug', 'depth'))
+
+    def test_insert_links_all_ancestors(self):
+        self.assertEqual(self.links(self.android), {('android', 0), ('phones', 1), ('electronics', 2)})
+        self.assertEqual(
+            set(self.root.get_descendants().values_list('slug', flat=True)),
+            {'electronics', 'phones', 'android', 'laptops'},
+        )
+        self.assertEqual(set(self.phones.get_descendants(include_self=False).values_list('slug', flat=True)), {'android'})
+
+    def test_move_subtree(self):
+        self.phones.parent = self.laptops
+        self.phones.save()
+        self.assertEqual(
+            self.links(self.android), {('android', 0), ('phones', 1), ('laptops', 2), ('electronics', 3)},
+        )
+        self.assertEqual(set(self.laptops.get_descendants().values_list('slug', flat=True)), {'laptops', 'phones', 'android'})
+
+        self.phones.parent = None
+        self.phones.save()
+        self.assertEqual(self.links(self.android), {('android', 0), ('phones', 1)})
+
+    def test_failed_move_rolls_back_parent(self):
+        self.phones.parent = self.laptops
+        with patch.object(CategoryClosure, 'move_subtree', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.phones.save()
+        self.phones.refresh_from_db()
+        self.assertEqual(self.phones.parent, self.root)
+        self.assertIn(('electronics', 1), self.links(self.phones))
+
+
+class HomeSectionsTests(TestCase):
+    def test_each_section_gets_its_newest_products(self):
+        from .views import load_home_sections
+
+        root = Category.objects.create(name="إلكترونيات", slug='electronics')
+        child = Category.objects.create(name="هواتف", slug='phones', parent=root)
+        other = Category.objects.create(name="أثاث", slug='furniture')
+        now = timezone.now()
+        for slug, category, age, active in [
+            ('old', root, 5, True), ('child-new', child, 1, True), ('root-mid', root, 3, True),
+            ('hidden', root, 0, False), ('chair', other, 2, True), ('tie-a', other, 4, True), ('tie-b', other, 4, True),
+        ]:
+            Product.objects.create(category=category, name=slug, slug=slug, description='-', price=1, is_active=active)
+            Product.objects.filter(slug=slug).update(created_at=now - timedelta(days=age))
+
+        sections = [
+            HomeSection.objects.create(title="إلكترونيات", category=root, product_count=2),
+            HomeSection.objects.create(title="أثاث", category=other, product_count=3),
+            HomeSection.objects.create(title="الأحدث", product_count=3),
+            HomeSection.objects.create(title="فارغ", category=other, product_count=0),
+        ]
+        with self.assertNumQueries(1):
+            loaded = load_home_sections(sections)
+
+        result = {section['config'].title: [p.slug for p in section['products']] for section in loaded}
+        self.assertEqual(result, {
+            "إلكترونيات": ['child-new', 'root-mid'],  # الفئات الفرعية ضمن القسم، وغير النشط مستبعد
+            "أثاث": ['chair', 'tie-b', 'tie-a'],  # نفس التاريخ: الأحدث رقماً أولاً
+            "الأحدث": ['child-new', 'chair', 'root-mid'],
+        })
+
+
+class CatalogVersionTests(TestCase):
+    def test_version_shared_through_database(self):
+        version = get_catalog_version()
+        cache.clear()  # عامل آخر: كاش محلي فارغ
+        self.assertEqual(get_catalog_version(), version)
+
+        category = Category.objects.create(name="شاشات", slug='screens')
+        bumped = get_catalog_version()
+        self.assertGreater(bumped, version)
+        # تعديل من عملية أخرى يصل مباشرة (بدون المرور على الكاش)
+        CacheVersion.objects.filter(name='catalog').update(value=F('value') + 1)
+        self.assertEqual(get_catalog_version(), bumped + 1)
+        category.delete()
+        self.assertEqual(get_catalog_version(), bumped + 2)
+
+    def test_version_read_once_per_request(self):
+        get_catalog_version()
+        context = catalog_cache_context()
+        with self.assertNumQueries(1):
+            self.assertEqual(context['catalog_version'](), context['catalog_version']())
+
+
+class KeysetPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="شواحن", slug='chargers')
+        # أسعار متساوية بعد الخصم (100 و 200 بخصم 50%) لاختبار الفصل بالرقم
+        for slug, price, discount in [
+            ('a', 300, 0), ('b', 100, 0), ('c', 200, 50), ('d', 100, 0), ('e', 50, 0), ('f', 400, 25),
+        ]:
+            Product.objects.create(
+                category=category, name=f"شاحن سريع {slug}", slug=slug, description='-',
+                price=price, discount_percentage=discount,
+            )
+
+    def walk(self, queryset, ordering, per_page=2):
+        """كل الصفحات بالمؤشر التالي، مع مؤشر كل صفحة"""
+        pages, cursor = [], None
+        while True:
+            page = KeysetPage(queryset, ordering, cursor, per_page)
+            pages.append([p.slug for p in page])
+            self.assertEqual(page.is_first, cursor is None)
+            cursor = page.next_cursor
+            if cursor is None:
+                return pages
+
+    def expected(self, queryset, ordering):
+        return [p.slug for p in queryset.order_by(*ordering)]
+
+    def test_price_orderings_with_id_tie_break(self):
+        products = Product.objects.all()
+        for ordering in [('effective_price', 'id'), ('-effective_price', '-id')]:
+            pages = self.walk(products, ordering)
+            self.assertEqual(sum(pages, []), self.expected(products, ordering))
+            self.assertEqual([len(page) for page in pages], [2, 2, 2])
+        ascending = self.walk(products, ('effective_price', 'id'))
+        self.assertEqual(ascending[0], ['e', 'b'])
+        self.assertEqual(ascending[1], ['c', 'd'])  # نفس السعر (100): الأصغر رقماً أولاً
+        descending = self.walk(products, ('-effective_price', '-id'))
+        self.assertEqual(descending[:2], [['f', 'a'], ['d', 'c']])  # 300 و 100 متكرران: الأكبر رقماً أولاً
+
+    def test_cursor_resumes_after_the_previous_page(self):
+        products = Product.objects.all()
+        first = KeysetPage(products, ('effective_price', 'id'), per_page=3)
+        second = KeysetPage(products, ('effective_price', 'id'), first.next_cursor, per_page=3)
+        self.assertEqual([p.slug for p in second], ['d', 'a', 'f'])
+        self.assertFalse(second.has_next)
+        self.assertIsNone(second.next_cursor)
+        # نفس المؤشر يعطي نفس الصفحة (رابط الرجوع في المتصفح)
+        again = KeysetPage(products, ('effective_price', 'id'), first.next_cursor, per_page=3)
+        self.assertEqual([p.slug for p in again], ['d', 'a', 'f'])
+
+    def test_search_rank_ordering(self):
+        products, ordering = search_products(Product.objects.all(), "شاحن")
+        self.assertEqual(ordering, ('search_rank', '-id'))
+        pages = self.walk(products, ordering)
+        self.assertEqual(sum(pages, []), self.expected(products, ordering))
+        self.assertEqual(len(sum(pages, [])), 6)
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        products = Product.objects.all()
+        first = [p.slug for p in KeysetPage(products, ('effective_price', 'id'), per_page=2)]
+        wrong_length = base64.urlsafe_b64encode(json.dumps([1]).encode()).decode()
+        wrong_type = base64.urlsafe_b64encode(json.dumps(['abc', 'x']).encode()).decode()
+        for cursor in ['not-a-cursor', '!!!', wrong_length, wrong_type]:
+            page = KeysetPage(products, ('effective_price', 'id'), cursor, per_page=2)
+            self.assertTrue(page.is_first)
+            self.assertEqual([p.slug for p in page], first)
+
+    def test_listing_view_pages(self):
+        with self.settings(PRODUCTS_PER_PAGE=4):
+            response = self.client.get(reverse('shop'), {'sort': 'price_desc'})
+            page = response.context['products']
+            self.assertEqual([p.slug for p in page], ['f', 'a', 'd', 'c'])
+            response = self.client.get(reverse('shop'), {'sort': 'price_desc', 'after': page.next_cursor})
+            self.assertEqual([p.slug for p in response.context['products']], ['b', 'e'])
+            response = self.client.get(reverse('shop'), {'sort': 'price_desc', 'after': 'broken'})
+            self.assertEqual([p.slug for p in response.context['products']], ['f', 'a', 'd', 'c'])
+
+
+class ArabicSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="إكسسوارات", slug='accessories')
+        for slug, name, description in [
+            ('screen', "شاشة ألعاب", "دقة عالية"),
+            ('ac', "مُكَيِّف هواء", "موفر للطاقة"),
+            ('lamp', "إضاءة مكتب", "ضوء أبيض"),
+            ('mouse', "فأرة", "مناسبة لشاشة الألعاب"),
+        ]:
+            Product.objects.create(category=category, name=name, slug=slug, description=description, price=10)
+
+    def search(self, query):
+        products, ordering = search_products(Product.objects.all(), query)
+        return [p.slug for p in products.order_by(*ordering)]
+
+    def test_sql_function_normalizes_like_python(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT ar_normalize(%s), ar_normalize(%s)", ["الألعاب", "مُكَيِّف إضاءة"])
+            self.assertEqual(cursor.fetchone(), ("الالعاب العاب", "مكيف اضاءه"))
+
+    def test_spelling_variants_match(self):
+        self.assertEqual(self.search("مكيف"), ['ac'])  # بدون تشكيل
+        self.assertEqual(self.search("اضاءه"), ['lamp'])  # إ ← ا و ة ← ه
+        self.assertCountEqual(self.search("اكسسوارات"), ['screen', 'ac', 'lamp', 'mouse'])  # اسم القسم
+
+    def test_article_and_name_weight(self):
+        # "العاب" و "ألعاب" في الاسم أقوى من الوصف، وبحث بدون "ال" يجد الكلمة المعرّفة
+        self.assertEqual(self.search("شاشه الالعاب"), ['screen'])
+        self.assertEqual(self.search("العاب"), ['screen', 'mouse'])
+
+    def test_index_follows_category_rename(self):
+        category = Category.objects.get(slug='accessories')
+        category.name = "ملحقات"
+        category.save()
+        self.assertEqual(len(self.search("ملحقات")), 4)
+        self.assertEqual(self.search("اكسسوارات"), [])
+
+
+class ProductNameIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="هواتف", slug='phones')
+        for slug, name in [('s24', "سامسونج جالكسي S24"), ('iphone', "ايفون 15 برو"), ('dell', "لابتوب ديل")]:
+            Product.objects.create(category=cls.category, name=name, slug=slug, description='-', price=10)
+
+    def slugs(self, results):
+        return [item['slug'] for item in results]
+
+    def test_follows_catalog_changes(self):
+        index = ProductNameIndex()
+        self.assertEqual(self.slugs(index.autocomplete("سامس")), ['s24'])
+        self.assertEqual(index.suggest_ids("samsung"), [Product.objects.get(slug='s24').id])
+
+        Product.objects.filter(slug='s24').delete()
+        Product.objects.create(category=self.category, name="سامسونج نوت", slug='note', description='-', price=10)
+        self.assertEqual(self.slugs(index.autocomplete("سامس")), ['note'])
+
+    def test_deletions_are_reconciled_periodically(self):
+        index = ProductNameIndex()
+        index.sync()
+        s24 = Product.objects.get(slug='s24').id
+        Product.objects.filter(pk=s24).delete()
+
+        # رفع نسخة الكتالوج وحده يجلب المعدّل فقط، بدون قراءة كل الأرقام
+        bump_catalog_version()
+        with CaptureQueriesContext(connection) as ctx:
+            index.sync()
+        self.assertFalse([q for q in ctx.captured_queries if 'updated_at' not in q['sql'] and 'store_product' in q['sql']])
+        self.assertIn(s24, index.positions)
+        self.assertEqual(self.slugs(index.autocomplete("سامس")), [])
+
+        index.reconciled_at -= timedelta(seconds=RECONCILE_SECONDS)
+        bump_catalog_version()
+        index.sync()
+        self.assertNotIn(s24, index.positions)
+
+    def test_reads_wait_for_sync(self):
+        index = ProductNameIndex()
+        index.sync()
+        done, result = threading.Event(), []
+
+        def read():
+            result.extend(index.suggest_ids("ديل"))
+            done.set()
+
+        with patch.object(index, 'sync'):
+            with index.lock:  # مزامنة جارية
+                reader = threading.Thread(target=read)
+                reader.start()
+                self.assertFalse(done.wait(0.2))
+            reader.join(5)
+        self.assertTrue(done.is_set())
+        self.assertEqual(result, [Product.objects.get(slug='dell').id])
+
+
+class ReviewRatingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="سماعات", slug='headphones')
+        cls.product = Product.objects.create(category=category, name="سماعة", slug='headset', description='-', price=10)
+        cls.other = Product.objects.create(category=category, name="مكبر", slug='speaker', description='-', price=10)
+        cls.users = [User.objects.create_user(f'reviewer{i}') for i in range(3)]
+
+    def totals(self, product):
+        product.refresh_from_db()
+        return product.rating_sum, product.rating_count, product.average_rating
+
+    def test_create_edit_delete(self):
+        first = Review.objects.create(product=self.product, user=self.users[0], rating=5)
+        Review.objects.create(product=self.product, user=self.users[1], rating=4)
+        second = Review.objects.create(product=self.product, user=self.users[2], rating='4')  # قيمة النموذج نصية
+        self.assertEqual(self.totals(self.product), (13, 3, 4.3))
+
+        first.rating = 2
+        first.save()
+        self.assertEqual(self.totals(self.product), (10, 3, 3.3))
+
+        # نقل التقييم لمنتج آخر ينقص الأول ويزيد الثاني
+        second.product = self.other
+        second.save()
+        self.assertEqual(self.totals(self.product), (6, 2, 3.0))
+        self.assertEqual(self.totals(self.other), (4, 1, 4.0))
+
+        first.delete()
+        self.assertEqual(self.totals(self.product), (4, 1, 4.0))
+        Review.objects.all().delete()
+        self.assertEqual(self.totals(self.product), (0, 0, 0))
+        self.assertEqual(self.totals(self.other), (0, 0, 0))
+
+    def test_rebuild_matches_reviews(self):
+        Review.objects.create(product=self.product, user=self.users[0], rating=3)
+        Review.objects.create(product=self.product, user=self.users[1], rating=4)
+        Product.objects.update(rating_sum=99, rating_count=7)  # أعداد فاسدة (كتابة مباشرة)
+        Product.rebuild_ratings()
+        self.assertEqual(self.totals(self.product), (7, 2, 3.5))
+        self.assertEqual(self.totals(self.other), (0, 0, 0))
+
+
+class EffectivePriceTests(TestCase):
+    def test_non_round_prices(self):
+        category = Category.objects.create(name="كابلات", slug='cables')
+        cases = [
+            ('999', 15, Decimal('849.15')), ('7', 50, Decimal('3.50')), ('1001', 33, Decimal('670.67')),
+            ('19.99', 10, Decimal('17.99')), ('250', 0, Decimal('250.00')), ('80', 100, Decimal('0.00')),
+        ]
+        for i, (price, discount, _) in enumerate(cases):
+            Product.objects.create(
+                category=category, name=f"كابل {i}", slug=f'cable-{i}', description='-',
+                price=Decimal(price), discount_percentage=discount,
+            )
+        prices = list(Product.objects.order_by('id').values_list('effective_price', flat=True))
+        self.assertEqual(prices, [expected for _, _, expected in cases])
+        for product in Product.objects.order_by('id'):
+            self.assertEqual(product.effective_price, round(product.final_price, 2))
+
+        # الفلترة والترتيب على العمود نفسه
+        cheap = Product.objects.price_between(Decimal('3.50'), Decimal('17.99')).by_price()
+        self.assertEqual([p.slug for p in cheap], ['cable-1', 'cable-3'])
+        Product.objects.filter(slug='cable-0').update(discount_percentage=12)
+        self.assertEqual(Product.objects.get(slug='cable-0').effective_price, Decimal('879.12'))
@@ -7,6 +7,8 @@ urlpatterns = [
     path('shop/', views.product_list, name='shop'),
     path('category/<slug:category_slug>/', views.product_list, name='category_list'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('search/autocomplete/', views.search_autocomplete, name='search_autocomplete'),
+    path('image/<path:name>', views.resize_image, name='resize_image'),
     
     path('cart/', views.cart_detail, name='cart_detail'),
     path('cart/add/<int:product_id>/', views.cart_add, name='cart_add'),
@@ -2,34 +2,87 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction, models
+from django.db.models import F, Value, Window, Case, When
+from django.db.models.functions import RowNumber
 from django.utils import timezone
 from django.views.decorators.http import require_POST
+from django.http import FileResponse, Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.urls import reverse
 import urllib.parse
-import threading
+from decimal import Decimal
 import random
-from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.models import User
 
 # استيراد المودلز
-from .models import Product, Category, Order, OrderItem, Coupon, Review, Profile, HomeSection, Wishlist
+from .models import Product, Category, Order, Coupon, Review, Profile, HomeSection, Wishlist
 
 # استيراد الكارت والفورم
 from .cart import Cart
+from .pagination import KeysetPage
+from .resize import CACHE_MAX_AGE, ResizeError, resized_image
+from .search import search_products
+from .images import CONTENT_TYPES
+from .storage import is_blob
+from .stock import OutOfStock, create_order_items
+from .fuzzy import product_names
 from .forms import (
     OrderCreateForm, UserRegisterForm, OTPVerificationForm, 
     UserUpdateForm, ProfileUpdateForm, PasswordResetRequestForm, SetNewPasswordForm
 )
-from .telegram_utils import send_telegram_order
+from .telegram_utils import queue_telegram_order
+from .notifications import queue_email
 
 # --- دالة مساعدة لجلب الفئة وجميع أبنائها ---
+# تعتمد على جدول الإغلاق CategoryClosure بدلاً من التكرار (استعلام واحد لأي عمق)
 def get_all_category_children(category):
-    categories = [category]
-    for child in category.children.all():
-        categories.extend(get_all_category_children(child))
-    return categories
+    return category.get_descendants()
+
+# --- تحميل منتجات سكشنات الصفحة الرئيسية دفعة واحدة ---
+# بدلاً من استعلامين أو أكثر لكل سكشن: نرقّم المنتجات (ROW_NUMBER) داخل كل قسم
+# ونأخذ أحدث N من كل قسم في استعلام واحد، ثم نوزعها على السكشنات في بايثون
+def load_home_sections(sections):
+    sections = [sec for sec in sections if sec.product_count > 0]
+    if not sections:
+        return []
+
+    limit = max(sec.product_count for sec in sections)
+    category_ids = {sec.category_id for sec in sections if sec.category_id}
+    base = Product.objects.filter(is_active=True).select_related('category').order_by()
+    newest_first = [F('created_at').desc(), F('id').desc()]
+
+    parts = []
+    if category_ids:
+        # المنتج يتبع القسم إذا كانت فئته من أحفاد فئة السكشن (عبر جدول الإغلاق)
+        ancestor = F('category__ancestor_links__ancestor_id')
+        parts.append(base.filter(category__ancestor_links__ancestor_id__in=category_ids).annotate(
+            partition=ancestor,
+            rank=Window(RowNumber(), partition_by=ancestor, order_by=newest_first),
+        ).filter(rank__lte=limit))
+    if any(sec.category_id is None for sec in sections):
+        # سكشن بدون قسم = أحدث المنتجات من كل المتجر (نرمز له بالقسم 0)
+        parts.append(base.annotate(
+            partition=Value(0, output_field=models.IntegerField()),
+            rank=Window(RowNumber(), order_by=newest_first),
+        ).filter(rank__lte=limit))
+
+    rows = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+    grouped = {}
+    for product in sorted(rows, key=lambda p: (p.partition, p.rank)):
+        grouped.setdefault(product.partition, []).append(product)
+
+    dynamic_sections = []
+    for sec in sections:
+        products = grouped.get(sec.category_id or 0, [])[:sec.product_count]
+        if products:
+            dynamic_sections.append({
+                'config': sec,
+                'products': products
+            })
+    return dynamic_sections
 
 # --- الصفحة الرئيسية ---
 def home(request):
@@ -40,24 +93,10 @@ def home(request):
     # هذا هو السطر الذي كان ناقصاً لديك وتسبب في اختفاء الفئات
     categories = Category.objects.filter(parent=None)
 
-    # 3. السكشنات الديناميكية
-    dynamic_sections = []
-    sections_db = HomeSection.objects.filter(is_active=True)
-    
-    for sec in sections_db:
-        products = Product.objects.filter(is_active=True)
-        
-        if sec.category:
-            cats = get_all_category_children(sec.category)
-            products = products.filter(category__in=cats)
-        
-        products = products.order_by('-created_at')[:sec.product_count]
-        
-        if products.exists():
-            dynamic_sections.append({
-                'config': sec,
-                'products': products
-            })
+    # 3. السكشنات الديناميكية (استعلام للسكشنات + استعلام واحد لكل منتجاتها)
+    # نمررها كدالة حتى لا تُنفذ إلا إذا لم يكن المقطع موجوداً في الكاش
+    sections_db = HomeSection.objects.filter(is_active=True).select_related('category')
+    dynamic_sections = lambda: load_home_sections(sections_db)
 
     return render(request, 'store/home.html', {
         'sliders': main_sliders,
@@ -65,27 +104,104 @@ def home(request):
         'dynamic_sections': dynamic_sections,
     })
 
+PRICE_ORDERINGS = {
+    'price_asc': ('effective_price', 'id'),
+    'price_desc': ('-effective_price', '-id'),
+}
+
+
+def parse_price(value):
+    try:
+        price = Decimal(value)
+    except (TypeError, ArithmeticError):
+        return None
+    return price if price.is_finite() and price >= 0 else None
+
+
 # --- قائمة المنتجات ---
 def product_list(request, category_slug=None):
     category = None
     categories = Category.objects.filter(parent=None)
-    products = Product.objects.filter(is_active=True)
+    products = Product.objects.filter(is_active=True).select_related('category')
     
     if category_slug:
         category = get_object_or_404(Category, slug=category_slug)
         all_related_categories = get_all_category_children(category)
         products = products.filter(category__in=all_related_categories)
     
+    # البحث النصي: عند وجود نص بحث نرتب حسب الصلة بدلاً من الأحدث
+    ordering = ('-created_at', '-id')
+    is_fuzzy = False
     query = request.GET.get('q')
     if query:
-        products = products.filter(name__icontains=query)
+        matches, search_ordering = search_products(products, query)
+        if matches.exists():
+            products, ordering = matches, search_ordering or ordering
+        else:
+            # لا توجد نتيجة مطابقة (خطأ إملائي مثلاً): نعرض أقرب الأسماء من الفهرس التقريبي
+            suggested = product_names.suggest_ids(query)
+            products = products.filter(id__in=suggested).annotate(search_rank=Case(
+                *[When(id=product_id, then=Value(i)) for i, product_id in enumerate(suggested)],
+                output_field=models.IntegerField(),
+            ))
+            ordering = ('search_rank', '-id')
+            is_fuzzy = True
+
+    # فلتر السعر والترتيب حسب السعر الفعلي (بعد الخصم)، عبر الفهرس مباشرة
+    products = products.price_between(parse_price(request.GET.get('min_price')), parse_price(request.GET.get('max_price')))
+    sort = request.GET.get('sort')
+    if sort in PRICE_ORDERINGS:
+        ordering = PRICE_ORDERINGS[sort]
+
+    # ترقيم بالمؤشر: ?after=<آخر منتج في الصفحة السابقة>
+    products = KeysetPage(products, ordering, request.GET.get('after'), settings.PRODUCTS_PER_PAGE)
+
+    # باقي معاملات الرابط (بحث، سعر، ترتيب) لروابط الصفحات ولمفتاح المقطع المخزن
+    filters = request.GET.copy()
+    filters.pop('after', None)
 
     return render(request, 'store/product_list.html', {
         'category': category, 
         'categories': categories, 
-        'products': products
+        'products': products,
+        'is_fuzzy': is_fuzzy,
+        'filter_query': filters.urlencode(),
     })
 
+# --- الإكمال التلقائي لمربع البحث ---
+def search_autocomplete(request):
+    query = request.GET.get('q', '').strip()
+    results = []
+    if len(query) >= 2:
+        results = [
+            {'name': item['name'], 'url': reverse('product_detail', args=[item['slug']])}
+            for item in product_names.autocomplete(query)
+        ]
+    return JsonResponse({'results': results})
+
+# --- تصغير الصور عند الطلب ---
+# مثال: /image/products/x.jpg?w=400&h=400&fit=cover&fmt=webp (المقاسات من RESIZE_SIZES فقط)
+def resize_image(request, name):
+    try:
+        width, height = int(request.GET.get('w', '')), int(request.GET.get('h', ''))
+        path, key = resized_image(
+            name, width, height, request.GET.get('fit', 'contain'), request.GET.get('fmt', 'webp'),
+        )
+    except (ValueError, ResizeError):
+        raise Http404("صورة غير متاحة")
+
+    etag = f'"{key}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(open(path, 'rb'), content_type=CONTENT_TYPES[key.rsplit('.', 1)[1]])
+    response['ETag'] = etag
+    if is_blob(name):
+        # اسم الملف بصمة محتواه، فالناتج لنفس الرابط لا يتغير أبداً
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}'
+    return response
+
 # --- تفاصيل المنتج ---
 def product_detail(request, slug):
     product = get_object_or_404(Product, slug=slug, is_active=True)
@@ -101,6 +217,9 @@ def product_detail(request, slug):
             
         rating = request.POST.get('rating')
         comment = request.POST.get('comment')
+        if rating not in {'1', '2', '3', '4', '5'}:
+            messages.error(request, "التقييم غير صالح.")
+            return redirect('product_detail', slug=slug)
         
         Review.objects.create(
             product=product,
@@ -111,14 +230,14 @@ def product_detail(request, slug):
         messages.success(request, "شكراً لك! تم إضافة تقييمك بنجاح.")
         return redirect('product_detail', slug=slug)
 
-    avg_rating = product.reviews.aggregate(models.Avg('rating'))['rating__avg'] or 0
-    reviews = product.reviews.all()
+    # متوسط وعدد التقييمات محفوظان مع المنتج، والتقييمات نفسها تُعرض صفحة صفحة
+    reviews = KeysetPage(product.reviews.select_related('user'), ('-created_at', '-id'), request.GET.get('reviews_after'), settings.REVIEWS_PER_PAGE)
 
     context = {
         'product': product,
         'reviews': reviews,
-        'avg_rating': round(avg_rating, 1),
-        'review_count': reviews.count(),
+        'avg_rating': product.average_rating,
+        'review_count': product.rating_count,
         'is_in_wishlist': is_in_wishlist,
     }
     return render(request, 'store/product_detail.html', context)
@@ -173,6 +292,7 @@ def checkout(request):
         form = OrderCreateForm(request.POST)
         if form.is_valid():
             try:
+                # الطلب وأسطره وخصم المخزون في معاملة واحدة: أي نقص يلغي كل شيء
                 with transaction.atomic():
                     order = form.save(commit=False)
                     if request.user.is_authenticated:
@@ -188,29 +308,16 @@ def checkout(request):
                     
                     order.total_amount = cart.get_total_price_after_discount() + DELIVERY_FEE
                     order.save()
-                    
-                    for item in cart:
-                        product = item['product']
-                        quantity = int(item['quantity'])
-                        
-                        if product.stock_quantity < quantity:
-                            messages.error(request, f"الكمية غير متوفرة للمنتج {product.name}")
-                            return redirect('cart_detail')
-                            
-                        product.stock_quantity -= quantity
-                        product.save()
-
-                        OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            price=item['price'],
-                            quantity=quantity
-                        )
-                    
-                    threading.Thread(target=send_telegram_order, args=(order,)).start()
-                    cart.clear()
-                    return redirect('order_success', order_id=order.id)
-            
+                    create_order_items(order, list(cart))
+                    queue_telegram_order(order)
+
+                cart.clear()
+                return redirect('order_success', order_id=order.id)
+
+            except OutOfStock as e:
+                for product in e.products:
+                    messages.error(request, f"الكمية غير متوفرة للمنتج {product.name}")
+                return redirect('cart_detail')
             except Exception as e:
                 print(f"Checkout Error: {e}") 
                 messages.error(request, "حدث خطأ أثناء معالجة الطلب.")
@@ -239,7 +346,8 @@ def order_success(request, order_id):
 
 # --- العروض والكوبونات ---
 def offers(request):
-    products = Product.objects.filter(is_active=True, discount_percentage__gt=0).order_by('-discount_percentage')
+    products = Product.objects.filter(is_active=True, discount_percentage__gt=0).select_related('category')
+    products = KeysetPage(products, ('-discount_percentage', '-id'), request.GET.get('after'), settings.PRODUCTS_PER_PAGE)
     return render(request, 'store/offers.html', {'products': products, 'page_title': 'العروض المميزة'})
 
 @require_POST
@@ -266,32 +374,31 @@ def register(request):
     if request.method == 'POST':
         form = UserRegisterForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=False)
-            user.is_active = False
-            user.save()
-            
-            otp = str(random.randint(100000, 999999))
-            
-            if not hasattr(user, 'profile'):
-                Profile.objects.create(user=user, phone=form.cleaned_data.get('phone'))
-            
-            user.profile.otp_code = otp
-            user.profile.save()
+            # الحساب وكود التحقق ورسالة البريد في معاملة واحدة؛ الإرسال نفسه يتم من طابور الإشعارات
+            # وإذا فشل نهائياً يُحذف الحساب غير المفعل ليتمكن الزبون من التسجيل مجدداً
+            with transaction.atomic():
+                user = form.save(commit=False)
+                user.is_active = False
+                user.save()
+                
+                otp = str(random.randint(100000, 999999))
+                
+                if not hasattr(user, 'profile'):
+                    Profile.objects.create(user=user, phone=form.cleaned_data.get('phone'))
+                
+                user.profile.otp_code = otp
+                user.profile.save()
 
-            subject = 'كود تفعيل حسابك - عشتار ستور'
-            message = f'مرحباً {user.first_name}،\n\nكود التحقق الخاص بك هو: {otp}'
-            from_email = settings.EMAIL_HOST_USER
-            recipient_list = [user.email]
-            
-            try:
-                send_mail(subject, message, from_email, recipient_list)
-                request.session['auth_user_id'] = user.id
-                request.session['auth_email'] = user.email
-                messages.info(request, f'تم إرسال كود التحقق إلى {user.email}')
-                return redirect('verify_email')
-            except Exception as e:
-                user.delete()
-                messages.error(request, "فشل إرسال البريد الإلكتروني.")
+                subject = 'كود تفعيل حسابك - عشتار ستور'
+                message = f'مرحباً {user.first_name}،\n\nكود التحقق الخاص بك هو: {{code}}'
+                queue_email(
+                    subject, message, [user.email], on_failure='delete_inactive_user', code_user_id=user.id, user_id=user.id,
+                )
+
+            request.session['auth_user_id'] = user.id
+            request.session['auth_email'] = user.email
+            messages.info(request, f'تم إرسال كود التحقق إلى {user.email}')
+            return redirect('verify_email')
     else:
         form = UserRegisterForm()
     return render(request, 'store/register.html', {'form': form})
@@ -326,6 +433,8 @@ def verify_email(request):
                 else:
                     messages.error(request, "كود التحقق غير صحيح.")
             except User.DoesNotExist:
+                # الحساب حُذف لأن رسالة كود التفعيل لم تصل
+                messages.error(request, "تعذر إرسال كود التفعيل، يرجى التسجيل مرة أخرى.")
                 return redirect('register')
     else:
         form = OTPVerificationForm()
@@ -389,15 +498,12 @@ def forgot_password(request):
                 user.profile.save()
                 
                 subject = 'استعادة كلمة المرور - عشتار ستور'
-                message = f'كود استعادة الحساب هو: {otp}'
-                
-                try:
-                    send_mail(subject, message, settings.EMAIL_HOST_USER, [email])
-                    request.session['reset_user_id'] = user.id
-                    messages.info(request, f"تم إرسال رمز التحقق إلى {email}")
-                    return redirect('verify_reset_code')
-                except Exception as e:
-                    messages.error(request, "حدث خطأ أثناء إرسال الإيميل.")
+                message = 'كود استعادة الحساب هو: {code}'
+                queue_email(subject, message, [email], code_user_id=user.id)
+
+                request.session['reset_user_id'] = user.id
+                messages.info(request, f"تم إرسال رمز التحقق إلى {email}")
+                return redirect('verify_reset_code')
             else:
                 messages.error(request, "هذا البريد غير مسجل.")
     else: